@@ -0,0 +1,127 @@
+# bulk_generate.py against filling the same shelves one question at a time through deduplicate_question
+# (the way question banks got built before), on the synthetic model with a quota that answers 429 once it's
+# used up, the way Gemini's does (per --window seconds instead of per minute, so a run takes seconds)
+# reports questions/min, model calls per question kept and, for the bulk run, the rejections at each stage
+# run from the repo root: python benchmarks/bench_bulk.py
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tutor_ai
+from bulk_generate import BulkGenerator
+from fake_model import FakeAPIError
+from model_backends import SyntheticModel
+
+TOPICS = ("Biology", "World History")
+DIFFICULTIES = ("easy", "moderate", "hard")
+
+
+class QuotaModel(SyntheticModel):
+    # the synthetic model with a quota: more than `quota` calls in any `window` seconds get a 429
+    def __init__(self, quota, window=60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.quota = quota
+        self.window = window
+        self.recent = deque()
+        self.quota_lock = threading.Lock()
+        self.refused = 0
+
+    def _over_quota(self):
+        now = time.monotonic()
+        with self.quota_lock:
+            while self.recent and now - self.recent[0] >= self.window:
+                self.recent.popleft()
+            if len(self.recent) >= self.quota:
+                self.refused += 1
+                return True
+            self.recent.append(now)
+            return False
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if self._over_quota():
+            raise FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+        return super().generate_content(prompt, stream=stream, **kwargs)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        if self._over_quota():
+            raise FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+        return await super().generate_content_async(prompt, stream=stream, **kwargs)
+
+
+def make_model(args, seed):
+    return QuotaModel(args.quota, args.window, latency=args.latency, malformed_rate=args.malformed_rate,
+                      repeat_rate=0.1, seed=seed)
+
+
+def sequential(args):
+    tutor_ai.model = model = make_model(args, 1)
+    kept = 0
+    started = time.monotonic()
+    for topic in TOPICS:
+        for difficulty in DIFFICULTIES:
+            seen = []
+            while len(seen) < args.count:
+                question = tutor_ai.deduplicate_question(topic, seen, difficulty)
+                if question is None:
+                    # out of quota even after the client's retries: wait a bit, like someone running it would
+                    time.sleep(1.0)
+                    continue
+                if question['question_text'] not in seen:
+                    seen.append(question['question_text'])
+            kept += len(seen)
+    return kept, time.monotonic() - started, model
+
+
+def bulk(args):
+    tutor_ai.model = model = make_model(args, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = BulkGenerator(os.path.join(tmp, "out.jsonl"), TOPICS, DIFFICULTIES, args.count, args.batch,
+                                  args.workers, args.rpm)
+        elapsed = asyncio.run(generator.run(report_every=0))
+    return generator, elapsed, model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=10, help="questions per topic and difficulty")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--malformed-rate", type=float, default=0.1)
+    parser.add_argument("--quota", type=int, default=10, help="model calls allowed per window")
+    parser.add_argument("--window", type=float, default=10.0, help="seconds the quota covers")
+    parser.add_argument("--rpm", type=float, default=240, help="bulk run's starting rate (over quota on purpose)")
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+    tutor_ai.MOCK_MODE = False
+    target = args.count * len(TOPICS) * len(DIFFICULTIES)
+    print(f"{target} questions ({args.count} per shelf), {args.latency * 1000:.0f} ms per call, "
+          f"quota {args.quota} calls per {args.window:.0f}s\n")
+
+    if not args.skip_sequential:
+        logging.disable(logging.WARNING)
+        with contextlib.redirect_stdout(io.StringIO()):
+            kept, elapsed, model = sequential(args)
+        logging.disable(logging.NOTSET)
+        print(f"one at a time: {kept} questions in {elapsed:6.1f}s = {kept / elapsed * 60:7.1f}/min, "
+              f"{model.calls / max(kept, 1):.2f} calls per question, {model.refused} rate limited")
+
+    generator, elapsed, model = bulk(args)
+    kept = generator.stats['written']
+    print(f"bulk:          {kept} questions in {elapsed:6.1f}s = {kept / elapsed * 60:7.1f}/min, "
+          f"{model.calls / max(kept, 1):.2f} calls per question, {model.refused} rate limited\n")
+    print(generator.report(elapsed))
+
+
+if __name__ == "__main__":
+    main()
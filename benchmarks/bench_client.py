@@ -0,0 +1,61 @@
+# throughput and retry behavior of the shared GeminiClient against a fake model that injects
+# latency, 429/503 errors and hangs; runs fully offline
+# run from the repo root: python benchmarks/bench_client.py --requests 200 --error-rate 0.2
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_model import FakeModel
+from gemini_client import CircuitBreaker, GeminiClient, ModelUnavailableError
+
+
+async def run(client, requests):
+    latencies = []
+    failed = 0
+
+    async def one(i):
+        nonlocal failed
+        start = time.perf_counter()
+        try:
+            await client.generate_async(f"Provide a helpful hint for question {i}", deadline=10)
+            latencies.append(time.perf_counter() - start)
+        except ModelUnavailableError:
+            failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start, latencies, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--hang-rate", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    model = FakeModel(latency=args.latency, error_rate=args.error_rate, hang_rate=args.hang_rate,
+                      hang_time=30, seed=1)
+    client = GeminiClient(lambda: model, max_concurrency=args.concurrency, timeout=args.latency * 5,
+                          base_delay=0.05, max_delay=1.0, breaker=CircuitBreaker(threshold=20, reset_after=2))
+    elapsed, latencies, failed = asyncio.run(run(client, args.requests))
+
+    ms = sorted(t * 1000 for t in latencies)
+    p99 = ms[int(len(ms) * 0.99) - 1] if ms else 0
+    print(f"{args.requests} requests, error rate {args.error_rate:.0%}, hang rate {args.hang_rate:.0%}, "
+          f"concurrency {args.concurrency}")
+    print(f"  throughput {args.requests / elapsed:7.1f} req/s | ok {len(latencies)} | failed {failed}")
+    if ms:
+        print(f"  latency p50 {statistics.median(ms):7.1f} ms | p99 {p99:7.1f} ms")
+    print(f"  client stats {client.stats} | model errors injected {model.errors}")
+
+
+if __name__ == "__main__":
+    main()
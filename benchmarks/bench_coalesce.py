@@ -0,0 +1,56 @@
+# how many model calls a burst of students asking for hints costs, with and without single-flight + the hint cache
+# every student is on one of a few questions, like a class working through the same quiz
+# run from the repo root: python benchmarks/bench_coalesce.py --students 200 --questions 5
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tutor_ai
+from fake_model import FakeModel
+from question_format import Question
+
+
+def burst(students, questions, shared):
+    model = FakeModel(latency=0.3, seed=1)
+    tutor_ai.model = model
+    tutor_ai.hint_cache.clear()
+    quiz = [Question(f"Question {i} about cell biology?", ("One", "Two", "Three", "Four"), "A",
+                     f"Explanation for question {i} about cell biology.") for i in range(questions)]
+
+    def ask(i):
+        prompt = tutor_ai.build_hint_prompt(quiz[i % questions])
+        if shared:
+            return tutor_ai.generate_shared(prompt, tutor_ai.hint_cache)
+        return tutor_ai.client.generate(prompt)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        # two waves: everyone at once, then everyone again a moment later (the cache's turn)
+        list(pool.map(ask, range(students)))
+        list(pool.map(ask, range(students)))
+    return model.calls, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5)
+    args = parser.parse_args()
+    tutor_ai.MOCK_MODE = False
+
+    print(f"{args.students} students x 2 hint requests over {args.questions} questions")
+    calls, elapsed = burst(args.students, args.questions, shared=False)
+    print(f"  every request calls the model: {calls:4d} model calls in {elapsed:5.2f}s")
+    before = dict(tutor_ai.single_flight.stats)
+    calls, elapsed = burst(args.students, args.questions, shared=True)
+    coalesced = tutor_ai.single_flight.stats['coalesced'] - before['coalesced']
+    print(f"  single-flight + hint cache:    {calls:4d} model calls in {elapsed:5.2f}s"
+          f" | coalesced {coalesced} | cache {tutor_ai.hint_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# replays a recorded model session through deduplicate_question and counts retries, API calls and
+# repeats that reach the student, for exact-string matching vs the near-duplicate index
+# also checks questions sharing a set of choices are only called repeats when their stems match too, and
+# exits 1 if not, so it can gate a change to near_dup.py like a test would
+# run from the repo root: python benchmarks/bench_dedup.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tutor_ai
+from fake_model import FakeResponse
+from near_dup import NearDuplicateIndex
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "session_log.jsonl")
+
+
+class ReplayModel:
+    # hands back the logged replies in order (wrapping around)
+    # with obey_exclusions, it skips replies on a concept whose question shows up in the prompt,
+    # which is roughly what Gemini does once it can actually see the exclusion list
+    def __init__(self, entries, obey_exclusions):
+        self.entries = entries
+        self.obey_exclusions = obey_exclusions
+        self.position = 0
+        self.calls = 0
+        self.concept_of = {}
+        for entry in entries:
+            self.concept_of[entry['response'].split("\n")[0]] = entry['concept']
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        excluded = {c for text, c in self.concept_of.items() if text in prompt} if self.obey_exclusions else set()
+        for _ in range(len(self.entries)):
+            entry = self.entries[self.position % len(self.entries)]
+            self.position += 1
+            if entry['concept'] not in excluded:
+                return FakeResponse(entry['response'])
+        return FakeResponse(self.entries[0]['response'])
+
+
+def replay(entries, questions, near_dup, exclusions):
+    model = ReplayModel(entries, obey_exclusions=exclusions)
+    tutor_ai.MOCK_MODE = False
+    tutor_ai.model = model
+    # a threshold above 1 means only byte-identical text ever matches, i.e. the old behavior
+    index = NearDuplicateIndex() if near_dup else NearDuplicateIndex(threshold=1.01)
+    seen = []  # in serve order, like the session's SeenQuestions, so the exclusions sent don't depend on set order
+    served_concepts = set()
+    repeats = 0
+    for _ in range(questions):
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = tutor_ai.deduplicate_question("Biology", seen, "easy", index)
+        concept = model.concept_of.get(data['question_text'])
+        if concept in served_concepts:
+            repeats += 1
+        served_concepts.add(concept)
+        seen.append(data['question_text'])
+        index.add(data['question_text'], data['choices'])
+    return model.calls, repeats
+
+
+# (stored question, new question, whether the new one is a repeat), all with the same four choices
+SHARED_CHOICES = ("Mitochondria", "Nucleus", "Ribosome", "Chloroplast")
+SHARED_CHOICE_CASES = (
+    ("Which organelle stores the cell's genetic material?",
+     "Which organelle produces most of the cell's ATP?", False),
+    ("Which organelle stores the cell's genetic material?",
+     "Which organelle holds the genetic material of a cell?", True),
+)
+
+
+def check_shared_choices():
+    ok = True
+    for stored, asked, repeat in SHARED_CHOICE_CASES:
+        index = NearDuplicateIndex()
+        index.add(stored, SHARED_CHOICES)
+        found = index.find(asked, SHARED_CHOICES) is not None
+        print(f"  {'repeat' if found else 'new':>6} (expected {'repeat' if repeat else 'new'}): {asked}")
+        ok = ok and found == repeat
+    return ok
+
+
+def time_lookups(size):
+    rng = random.Random(1)
+    vocab = [f"term{i}" for i in range(5000)]
+    index = NearDuplicateIndex()
+    for _ in range(size):
+        index.add("What is " + " ".join(rng.sample(vocab, 8)) + "?")
+    probes = ["What is " + " ".join(rng.sample(vocab, 8)) + "?" for _ in range(2000)]
+    start = time.perf_counter()
+    for probe in probes:
+        index.find(probe)
+    return (time.perf_counter() - start) / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=10, help="questions to serve from the replayed log")
+    args = parser.parse_args()
+
+    with open(LOG_PATH) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    print(f"replaying {len(entries)} logged replies, serving {args.questions} questions")
+    # the old prompt sent a literal "{recent_questions}", so the model never saw what to avoid
+    modes = (
+        ("exact match", False, False),
+        ("near-dup", True, False),
+        ("near-dup + excl", True, True),
+    )
+    results = {}
+    for label, near_dup, exclusions in modes:
+        calls, repeats = replay(entries, args.questions, near_dup, exclusions)
+        results[label] = calls
+        print(f"{label:>16}: model calls {calls:3d} | retries {calls - args.questions:3d}"
+              f" | repeats served {repeats}")
+    print(f"model calls saved by feeding exclusions back: {results['near-dup'] - results['near-dup + excl']}")
+
+    for size in (100, 1000, 5000):
+        print(f"lookup with {size:5d} seen questions: {time_lookups(size) * 1e6:7.1f} us")
+
+    print("same choices, against a stored question on the nucleus:")
+    ok = check_shared_choices()
+    print("ok" if ok else "FAILED: shared choices decided a repeat on their own")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
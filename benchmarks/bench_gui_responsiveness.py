@@ -0,0 +1,145 @@
+# checks the quiz window never holds up Qt's main thread while the model works: a scripted session (a wrong
+# answer, a hint, a follow-up, the right answer, then a follow-up cut short by Next Question) against the
+# synthetic model with --latency seconds per call, with a heartbeat timer measuring how late each tick fires
+# exits 1 if any stall goes over --limit ms, so it can gate a change to gui.py like a test would
+# then a second window is closed while its first question loads, to check in-flight work goes with it
+# run from the repo root: python benchmarks/bench_gui_responsiveness.py
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QApplication
+import qasync
+
+import tutor_ai
+from model_backends import SyntheticModel
+
+HEARTBEAT_MS = 10
+
+
+async def wait_for(condition, limit=60.0):
+    give_up = time.perf_counter() + limit
+    while not condition():
+        if time.perf_counter() > give_up:
+            raise TimeoutError("the window never got there")
+        await asyncio.sleep(0.01)
+
+
+async def script(args, window, log):
+    session = window.session
+    for n in range(args.questions):
+        asked = time.perf_counter()
+        await wait_for(lambda: window.answer_buttons[0].isEnabled())
+        log(f"question {n + 1} on screen after {time.perf_counter() - asked:.2f}s")
+        right = session.correct_letter
+        wrong = next(letter for letter in "ABCD" if letter != right)
+        window.answer_buttons["ABCD".index(wrong)].click()
+
+        window.hint_button.click()
+        await wait_for(lambda: window.hint_task is None or window.hint_task.done())
+        window.follow_up_input.setText("How does this idea show up in everyday life?")
+        window.follow_up_button.click()
+        await wait_for(lambda: window.follow_up_task is None or window.follow_up_task.done())
+        log("  hint and follow-up streamed in")
+
+        window.answer_buttons["ABCD".index(right)].click()
+        window.follow_up_input.setText("Can you give me another example of this?")
+        window.follow_up_button.click()
+        in_flight = window.follow_up_task
+        await asyncio.sleep(0.2)
+        window.retry_button.click()
+        await asyncio.sleep(0)
+        log(f"  follow-up cancelled by Next Question: {in_flight.cancelled()}")
+        if not in_flight.cancelled():
+            return False
+
+    window.close()
+    return True
+
+
+async def close_while_loading(make_window, log):
+    # a new window's first question is a model call away; closing it then takes the task down with it
+    window = make_window("Chemistry")
+    await asyncio.sleep(0.2)
+    loading = window.question_task
+    window.close()
+    await asyncio.sleep(0.5)
+    log(f"question still loading cancelled on close: {loading.cancelled()}")
+    return loading.cancelled() and window.session.current_question_number == 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds the synthetic model takes per call")
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--limit", type=float, default=50.0, help="longest main-thread stall allowed (ms)")
+    args = parser.parse_args()
+
+    from gui import TutorWindow
+    from question_bank import QuestionBank
+    from session_log import SessionEventLog
+
+    tutor_ai.MOCK_MODE = False
+    tutor_ai.model = SyntheticModel(latency=args.latency, malformed_rate=0.0, seed=11)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setQuitOnLastWindowClosed(False)  # the script closes the window and carries on
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+
+    stalls = []
+    last = [None]
+
+    def heartbeat():
+        now = time.perf_counter()
+        if last[0] is not None:
+            stalls.append((now - last[0]) * 1000 - HEARTBEAT_MS)
+        last[0] = now
+
+    timer = QTimer()
+    timer.setTimerType(Qt.TimerType.PreciseTimer)
+    timer.setInterval(HEARTBEAT_MS)
+    timer.timeout.connect(heartbeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def make_window(topic):
+            window = TutorWindow(topic, "easy", bank=QuestionBank(os.path.join(tmp, "bank.db")),
+                                 event_log=SessionEventLog(os.path.join(tmp, "sessions.log")),
+                                 max_questions=args.questions + 1)
+            window.show()
+            return window
+
+        async def run():
+            return await script(args, window, lines.append) and await close_while_loading(make_window, lines.append)
+
+        started = time.perf_counter()
+        window = make_window("Biology")
+        print(f"window built in {(time.perf_counter() - started) * 1000:.0f} ms (before the heartbeat starts)")
+        timer.start()
+        # the model's own chatter (dedup retries and so on) isn't what this is measuring
+        lines = []
+        with contextlib.redirect_stdout(io.StringIO()), loop:
+            cancelled = loop.run_until_complete(run())
+        timer.stop()
+        print("\n".join(lines))
+
+    stalls.sort()
+    worst = stalls[-1] if stalls else 0.0
+    print(f"\n{len(stalls)} heartbeats over a session with {args.latency:.1f}s model calls: "
+          f"late by p50 {stalls[len(stalls) // 2]:.1f} ms, p99 {stalls[int(len(stalls) * 0.99)]:.1f} ms, "
+          f"worst {worst:.1f} ms (limit {args.limit:.0f} ms)")
+    ok = worst <= args.limit and cancelled
+    print("ok" if ok else "FAILED: " + ("the main thread stalled" if worst > args.limit else "work outlived its question"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# scores the follow-up intent matcher against labelled follow-ups and times it against the old check
+# (a substring scan of a handful of "banned phrases", which only knew about answer fishing)
+# intent_corpus.tsv was written alongside the phrase table, so it only shows the phrases cover what they were
+# meant to; intent_heldout.tsv was written without looking at them, and its score is the accuracy figure
+# scores are per intent; "none" rows are open-ended questions that should still go to the model
+# run from the repo root: python benchmarks/bench_intents.py
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intents
+from question_format import Question
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CORPUS_PATH = os.path.join(DATA, "intent_corpus.tsv")
+HELDOUT_PATH = os.path.join(DATA, "intent_heldout.tsv")
+
+# the question every corpus row is asked about
+QUESTION = Question("Which organelle produces most of a cell's ATP?",
+                    ("Nucleus", "Ribosome", "Mitochondrion", "Chloroplast"), "C",
+                    "Mitochondria make most of the cell's ATP through cellular respiration.")
+
+OLD_BANNED_PHRASES = [
+    "what's the answer", "what is the answer", "give me the answer",
+    "which one is correct", "is it", "correct answer",
+    "choose the right one", "is the answer", "tell me the answer"
+]
+
+
+def old_classify(text):
+    lower = text.lower()
+    return "answer_fishing" if any(phrase in lower for phrase in OLD_BANNED_PHRASES) else None
+
+
+def load_corpus(path):
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            label, text = line.rstrip("\n").split("\t", 1)
+            rows.append((label, text))
+    return rows
+
+
+def score(rows, classify):
+    # per label: [true positives, false positives, false negatives]
+    counts = {}
+    mistakes = []
+    for label, text in rows:
+        got = classify(text) or "none"
+        if got == label:
+            counts.setdefault(label, [0, 0, 0])[0] += 1
+        else:
+            counts.setdefault(got, [0, 0, 0])[1] += 1
+            counts.setdefault(label, [0, 0, 0])[2] += 1
+            mistakes.append((label, got, text))
+    return counts, mistakes
+
+
+def report(name, rows, classify, show_mistakes, measure="right"):
+    counts, mistakes = score(rows, classify)
+    correct = len(rows) - len(mistakes)
+    print(f"{name}: {correct}/{len(rows)} {measure} ({correct / len(rows):.1%})")
+    for label in sorted(counts):
+        tp, fp, fn = counts[label]
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        print(f"  {label:>16}: precision {precision:6.1%} | recall {recall:6.1%}")
+    if show_mistakes:
+        for label, got, text in mistakes:
+            print(f"    expected {label:<16} got {got:<16} {text}")
+
+
+def throughput(classify, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            classify(text)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--heldout", default=HELDOUT_PATH)
+    parser.add_argument("--rounds", type=int, default=200, help="passes over the corpus for the timing")
+    parser.add_argument("--mistakes", action="store_true", help="list every misclassified row")
+    args = parser.parse_args()
+
+    rows = load_corpus(args.corpus)
+    heldout = load_corpus(args.heldout)
+    matcher = lambda text: intents.classify(text, QUESTION)  # noqa: E731
+    print(f"phrase-table corpus: {len(rows)} follow-ups, {dict(Counter(label for label, _ in rows))}")
+    print(f"held out:            {len(heldout)} follow-ups, {dict(Counter(label for label, _ in heldout))}\n")
+    report("intent matcher, phrase-table corpus", rows, matcher, args.mistakes, "covered")
+    report("intent matcher, held out", heldout, matcher, args.mistakes)
+    report("old banned phrases, held out", heldout, old_classify, args.mistakes)
+
+    texts = [text for _, text in rows + heldout]
+    new = throughput(lambda text: intents.classify(text, QUESTION), texts, args.rounds)
+    old = throughput(old_classify, texts, args.rounds)
+    print(f"\nintent matcher:     {new * 1e6:6.2f} us per message ({1 / new:10,.0f}/s)")
+    print(f"old banned phrases: {old * 1e6:6.2f} us per message ({1 / old:10,.0f}/s)")
+    # what a canned reply costs end to end, template included
+    replies = throughput(lambda text: intents.respond(intents.classify(text, QUESTION) or "", QUESTION, 1,
+                                                      "Think about where respiration happens.", "B"),
+                         texts, args.rounds)
+    print(f"classify + reply:   {replies * 1e6:6.2f} us per message")
+
+
+if __name__ == "__main__":
+    main()
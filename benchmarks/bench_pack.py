@@ -0,0 +1,151 @@
+# how a question pack (question_pack.py) holds up as it grows: export time and file size, then time to open,
+# resident memory and time per seen-aware pick, against loading the same questions from a json file and
+# against the sqlite question bank's take()
+# each way of loading runs in its own process, so the memory numbers don't bleed into each other
+# run from the repo root: python benchmarks/bench_pack.py --questions 100000
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_format import Question
+from seen_questions import SeenQuestions
+
+DIFFICULTIES = ("easy", "moderate", "hard")
+
+
+def rss_mb():
+    # resident set size right now (Linux); elsewhere the peak so far, which is the best we get
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def make_questions(count, topics):
+    for n in range(count):
+        topic = f"topic {n % topics}"
+        difficulty = DIFFICULTIES[(n // topics) % 3]
+        yield topic, difficulty, Question(
+            f"Question {n}: which of these best describes idea {n} in {topic}?",
+            (f"The first reading of idea {n}", f"The second reading of idea {n}", f"The third reading of idea {n}",
+             f"The fourth reading of idea {n}"),
+            "ABCD"[n % 4], f"Idea {n} is usually explained with the {'first second third fourth'.split()[n % 4]} "
+                            f"reading, because that is how {topic} introduces it.", difficulty)
+
+
+def child(kind, path, picks, seen_count, topics):
+    # opens the questions one way, then picks `picks` of them for a student who has seen seen_count already
+    rng = random.Random(7)
+    before = rss_mb()
+    start = time.perf_counter()
+    if kind == "pack":
+        from question_pack import QuestionPack
+
+        store = QuestionPack(path, seed=7)
+        take = store.take
+    elif kind == "json":
+        with open(path) as f:
+            rows = json.load(f)
+        store = {}
+        for topic, difficulty, row in rows:
+            store.setdefault((topic, difficulty), []).append(row)
+
+        def take(topic, difficulty, seen, count=1):
+            shelf = store.get((topic, difficulty), [])
+            picked = []
+            for row in rng.sample(shelf, len(shelf)):
+                if row[0] not in seen:
+                    picked.append(Question.from_list(row).to_dict())
+                    if len(picked) == count:
+                        break
+            return picked
+    else:
+        from question_bank import QuestionBank
+
+        store = QuestionBank(path, max_questions=10**9)
+        take = store.take
+    opened = time.perf_counter() - start
+    after_open = rss_mb()
+
+    seen = SeenQuestions()
+    for n in range(seen_count):
+        seen.add(f"Question {n}: which of these best describes idea {n} in topic {n % topics}?")
+    times = []
+    for _ in range(picks):
+        topic = f"topic {rng.randrange(topics)}"
+        difficulty = rng.choice(DIFFICULTIES)
+        start = time.perf_counter()
+        picked = take(topic, difficulty, seen)
+        times.append(time.perf_counter() - start)
+        for question in picked:
+            seen.add(question['question_text'])
+    times.sort()
+    print(json.dumps({'open_ms': opened * 1000, 'open_mb': after_open - before, 'picked_mb': rss_mb() - before,
+                      'pick_us': statistics.median(times) * 1e6, 'pick_p99_us': times[int(len(times) * 0.99)] * 1e6}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--picks", type=int, default=2000, help="questions picked after opening")
+    parser.add_argument("--seen", type=int, default=500, help="questions the student has already seen")
+    parser.add_argument("--skip-sqlite", action="store_true", help="the sqlite bank is slow to fill at 100k+")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.picks, args.seen, args.topics)
+        return
+
+    from question_bank import QuestionBank
+    from question_pack import write_pack
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'pack': os.path.join(tmp, "bank.pack"), 'json': os.path.join(tmp, "bank.json"),
+                 'sqlite': os.path.join(tmp, "bank.db")}
+        start = time.perf_counter()
+        write_pack(paths['pack'], make_questions(args.questions, args.topics))
+        written = time.perf_counter() - start
+        print(f"{args.questions} questions, {args.topics} topics x {len(DIFFICULTIES)} difficulties")
+        size = os.path.getsize(paths['pack']) / 2**20
+        print(f"  pack written in {written:6.2f}s, {size:6.1f} MB")
+        with open(paths['json'], "w") as f:
+            json.dump([[t, d, q.to_list()] for t, d, q in make_questions(args.questions, args.topics)], f)
+        print(f"  json is {os.path.getsize(paths['json']) / 2**20:6.1f} MB")
+        kinds = ["pack", "json"]
+        if not args.skip_sqlite:
+            start = time.perf_counter()
+            bank = QuestionBank(paths['sqlite'], max_questions=10**9)
+            shelves = {}
+            for topic, difficulty, question in make_questions(args.questions, args.topics):
+                shelves.setdefault((topic, difficulty), []).append(question.to_dict())
+            for (topic, difficulty), questions in shelves.items():
+                bank.add(topic, difficulty, questions)
+            bank.close()
+            print(f"  sqlite bank filled in {time.perf_counter() - start:6.2f}s")
+            kinds.append("sqlite")
+
+        print(f"\n{'':>8} {'open':>10} {'rss open':>10} {'rss after':>10} {'pick p50':>11} {'pick p99':>11}")
+        for kind in kinds:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, paths[kind],
+                                  "--picks", str(args.picks), "--seen", str(args.seen), "--topics", str(args.topics)],
+                                 capture_output=True, text=True, check=True).stdout
+            r = json.loads(out)
+            print(f"{kind:>8} {r['open_ms']:8.1f}ms {r['open_mb']:8.1f}MB {r['picked_mb']:8.1f}MB"
+                  f" {r['pick_us']:9.1f}us {r['pick_p99_us']:9.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# parse success rate and parse time over recorded model replies, old line parser vs question_format
+# the corpus holds the logged replies in the shapes Gemini drifts into ("A)" choices, bold labels, stems
+# split over lines, JSON with and without code fences) plus a few broken ones that must be rejected
+# run from the repo root: python benchmarks/bench_parse.py
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_format import QuestionFormatError, parse_question
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "model_outputs.jsonl")
+
+
+def legacy_parse(content):
+    # the parser generate_quiz_question used before structured output, kept here for comparison
+    question, choices, answer_letter, explanation, found = "", [], "", "", False
+    for line in content.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(("A.", "B.", "C.", "D.")):
+            choices.append(line[3:].strip())
+        elif line.startswith("Answer:"):
+            answer_letter = line.replace("Answer:", "").strip().upper()
+        elif line.startswith("Explanation:"):
+            explanation = line.replace("Explanation:", "").strip()
+        elif not found:
+            question, found = line, True
+    answer_index = ord(answer_letter) - ord('A')
+    answer = choices[answer_index] if 0 <= answer_index < len(choices) else "Unknown"
+    valid = bool(question) and len(choices) == 4 and answer_letter in "ABCD" and answer != "Unknown"
+    return (question, answer_letter) if valid else None
+
+
+def new_parse(content):
+    try:
+        question = parse_question(content)
+    except QuestionFormatError:
+        return None
+    return question.question, question.answer_letter
+
+
+def run(parser, corpus, repeat=200):
+    correct = defaultdict(int)
+    for entry in corpus:
+        try:
+            result = parser(entry['response'])
+        except Exception:
+            result = None
+        expected = entry['expected']
+        ok = result is None if expected is None else result == (expected['question'], expected['answer_letter'])
+        correct[entry['shape']] += ok
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for entry in corpus:
+            try:
+                parser(entry['response'])
+            except Exception:
+                pass
+    per_parse = (time.perf_counter() - start) / (repeat * len(corpus))
+    return correct, per_parse
+
+
+def main():
+    with open(CORPUS_PATH) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    totals = defaultdict(int)
+    for entry in corpus:
+        totals[entry['shape']] += 1
+
+    results = {name: run(parser, corpus) for name, parser in (("legacy", legacy_parse), ("new", new_parse))}
+    print(f"{len(corpus)} recorded replies ({sum(e['expected'] is None for e in corpus)} should be rejected)")
+    print(f"{'shape':>14} {'legacy':>8} {'new':>8}")
+    for shape in sorted(totals):
+        print(f"{shape:>14} " + " ".join(f"{results[n][0][shape]:>4}/{totals[shape]:<3}" for n in ("legacy", "new")))
+    for name, (correct, per_parse) in results.items():
+        rate = sum(correct.values()) / len(corpus)
+        print(f"{name:>8}: parse success {rate:6.1%} | {per_parse * 1e6:6.1f} us per reply")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# time-to-question with and without prefetching, against a fake model with simulated latency
+# then checks a batch session adapts: after a wrong answer the next question is a level down, and comes out of
+# the batch already fetched; exits 1 if not, so it can gate a change to the prefetcher like a test would
+# run from the repo root: python benchmarks/bench_prefetch.py --latency 0.5 --think 2
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tutor_ai
+from fake_model import FakeModel
+
+
+def run_session(prefetch, latency, think, batch=False):
+    tutor_ai.MOCK_MODE = False
+    tutor_ai.model = FakeModel(latency=latency)
+    session = tutor_ai.QuizSession("Biology", "easy", prefetch=prefetch, batch=batch)
+    waits = []
+    while not session.is_finished():
+        start = time.perf_counter()
+        data = session.next_question()
+        waits.append(time.perf_counter() - start)
+        # pretend the student is reading and answering
+        time.sleep(think)
+        session.submit_answer(data.answer_letter, data.answer_letter)
+    session.close()
+    return waits, tutor_ai.model.calls
+
+
+def check_adapts(prefetch, latency):
+    # a student who starts at moderate and misses the first question should get an easy one next
+    tutor_ai.MOCK_MODE = False
+    tutor_ai.model = FakeModel(latency=latency)
+    session = tutor_ai.QuizSession("Biology", "moderate", prefetch=prefetch, batch=True)
+    first = session.next_question()
+    wrong = next(letter for letter in "ABCD" if letter != first.answer_letter)
+    session.submit_answer(wrong, first.answer_letter)
+    second = session.next_question()
+    calls = tutor_ai.model.calls
+    session.close()
+    return first.difficulty, second.difficulty, calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--think", type=float, default=1.0, help="seconds the student spends per question")
+    parser.add_argument("--depth", type=int, default=2, help="prefetch depth")
+    args = parser.parse_args()
+
+    results = {}
+    modes = (
+        ("blocking", 0, False),
+        (f"prefetch={args.depth}", args.depth, False),
+        ("batch", 0, True),
+        ("batch+prefetch", args.depth, True),
+    )
+    for label, prefetch, batch in modes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            waits, calls = run_session(prefetch, args.latency, args.think, batch)
+        results[label] = (waits, calls)
+
+    print(f"model latency {args.latency:.2f}s, think time {args.think:.2f}s")
+    for label, (waits, calls) in results.items():
+        ms = [w * 1000 for w in waits]
+        print(f"{label:>15}: first {ms[0]:8.1f} ms | later mean {statistics.mean(ms[1:]):8.1f} ms"
+              f" | max {max(ms[1:]):8.1f} ms | model calls {calls}")
+
+    ok = True
+    for label, prefetch in (("batch", 0), ("batch+prefetch", args.depth)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            first, second, calls = check_adapts(prefetch, args.latency)
+        print(f"{label:>15}: {first}, a wrong answer, then {second} ({calls} model call{'s' if calls != 1 else ''})")
+        ok = ok and second == "easy"
+    print("ok" if ok else "FAILED: a wrong answer didn't bring the next question down a level")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# before/after for the prompt versions in prompts.py (v1 = the original prompts, v2 = compact + system instruction)
+# 1. tokens per request kind (system instruction included, since it's billed with every request) and the
+#    time it takes to build each prompt
+# 2. scripted sessions against the synthetic model, where each call also takes --ms-per-1k-tokens per thousand
+#    prompt tokens (the model reads the prompt before it writes anything), reporting tokens per question from
+#    the session's token budget and time to question
+# --count-tokens recounts the template texts with Gemini's own count_tokens (needs the API key set up)
+# run from the repo root: python benchmarks/bench_prompts.py
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts
+import tutor_ai
+from model_backends import SyntheticModel
+from question_format import Question
+
+QUESTION = Question("Which organelle produces most of a cell's ATP?",
+                    ("Nucleus", "Ribosome", "Mitochondrion", "Chloroplast"), "C",
+                    "Mitochondria make most of the cell's ATP through cellular respiration.")
+RECENT = ["What is the function of the cell membrane?", "Which molecule carries genetic information?",
+          "What do ribosomes make?"]
+
+REQUESTS = (
+    ("question (json)", lambda: tutor_ai.build_question_prompt("Biology", "easy", RECENT, structured=True)),
+    ("question (streamed)", lambda: tutor_ai.build_question_prompt("Biology", "easy", RECENT)),
+    ("question + hint (json)",
+     lambda: tutor_ai.build_question_prompt("Biology", "hard", RECENT, structured=True, extras=True)),
+    ("batch of 5 (json)", lambda: tutor_ai.build_batch_prompt("Biology", 5, "moderate", RECENT, structured=True)),
+    ("batch of 5 (streamed)", lambda: tutor_ai.build_batch_prompt("Biology", 5, "moderate", RECENT)),
+    ("hint", lambda: tutor_ai.build_hint_prompt(QUESTION)),
+    ("follow-up", lambda: tutor_ai.build_follow_up_prompt("Why does that matter for muscles?", QUESTION, "B")),
+)
+
+
+class PrefillModel:
+    # the synthetic model, plus a delay that grows with the prompt
+    def __init__(self, inner, ms_per_1k):
+        self.inner = inner
+        self.ms_per_1k = ms_per_1k
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(prompts.call_tokens(prompt) * self.ms_per_1k / 1e6)
+        return await self.inner.generate_content_async(prompt, **kwargs)
+
+
+def build_report(rounds):
+    rows = {}
+    for version in sorted(prompts.TEMPLATES):
+        prompts.VERSION = version
+        for name, build in REQUESTS:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                build()
+            rows.setdefault(name, {})[version] = (prompts.call_tokens(build()),
+                                                  (time.perf_counter() - start) / rounds * 1e6)
+    versions = sorted(prompts.TEMPLATES)
+    print(f"{'request':>22}  " + "  ".join(f"{v + ' tokens':>10} {v + ' build':>10}" for v in versions) + "   change")
+    for name, by_version in rows.items():
+        cells = "  ".join(f"{tokens:10d} {us:8.1f}us" for tokens, us in (by_version[v] for v in sorted(by_version)))
+        before, after = by_version["v1"][0], by_version["v2"][0]
+        print(f"{name:>22}  {cells}   {(after - before) / before:+.0%}")
+
+
+def run_sessions(version, args):
+    # even-numbered students just answer; odd ones get each question wrong first and ask for a hint and
+    # about their mistake, which is where the question and options in the v2 hint/follow-up prompts cost more
+    prompts.VERSION = version
+    quiet, asking, waits = [], [], []
+    for i in range(args.sessions):
+        tutor_ai.model = PrefillModel(SyntheticModel(latency=args.latency, malformed_rate=0.1, seed=i),
+                                      args.ms_per_1k_tokens)
+        tutor_ai.hint_cache.clear()
+        tutor_ai.follow_up_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            session = tutor_ai.QuizSession("Biology", "easy", speculate=args.speculate)
+            served = 0
+            while not session.is_finished():
+                asked = time.perf_counter()
+                question = session.next_question()
+                waits.append((time.perf_counter() - asked) * 1000)
+                if question is None:
+                    break
+                served += 1
+                if i % 2:
+                    session.submit_answer("D" if question.answer_letter != "D" else "A", question.answer_letter)
+                    session.get_hint()
+                    session.follow_up("How does that work inside the cell?")
+                session.submit_answer(question.answer_letter, question.answer_letter)
+            spent = session.budget.spent
+            session.close()
+        (asking if i % 2 else quiet).append(spent / max(1, served))
+    return statistics.mean(quiet), statistics.mean(asking), statistics.median(waits)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000, help="builds per prompt for the build timing")
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.05, help="fixed part of the fake model's latency")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=100.0, help="prompt reading time")
+    parser.add_argument("--speculate", choices=tutor_ai.SPECULATE_POLICIES, default="off")
+    parser.add_argument("--count-tokens", action="store_true", help="count the templates with Gemini's count_tokens")
+    args = parser.parse_args()
+    tutor_ai.MOCK_MODE = False
+
+    print("tokens per request (system instruction included) and prompt build time\n")
+    build_report(args.rounds)
+
+    if args.count_tokens:
+        model = tutor_ai._build_gemini_model()
+        for version in sorted(prompts.TEMPLATES):
+            counted = prompts.measure(lambda text: model.count_tokens(text).total_tokens, version)
+            estimated = prompts.measure(version=version)
+            print(f"\n{version} templates, count_tokens vs estimate:")
+            for name in counted:
+                print(f"  {name:>18}: {counted[name]:5d} {estimated[name]:5d}")
+
+    print(f"\n{args.sessions} sessions per version, {args.latency * 1000:.0f} ms + "
+          f"{args.ms_per_1k_tokens:.0f} ms per 1k prompt tokens per call")
+    results = {}
+    for version in sorted(prompts.TEMPLATES):
+        results[version] = run_sessions(version, args)
+        quiet, asking, wait = results[version]
+        print(f"{version:>4}: tokens per question {quiet:6.1f} (with a hint and a follow-up each {asking:6.1f})"
+              f" | time to question p50 {wait:6.1f} ms")
+    (q1, a1, w1), (q2, a2, w2) = results["v1"], results["v2"]
+    print(f"v2 vs v1: tokens per question {(q2 - q1) / q1:+.0%} ({(a2 - a1) / a1:+.0%} with help),"
+          f" time to question {(w2 - w1) / w1:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
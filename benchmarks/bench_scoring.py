@@ -0,0 +1,124 @@
+# what the scorecards (scoring.py) cost: time per answer event, size of a saved card, and a class dashboard
+# over --sessions sessions built by merging their saved cards, against rebuilding the same numbers by
+# replaying every session out of the session log (which is how you'd get them without scorecards)
+# run from the repo root: python benchmarks/bench_scoring.py --sessions 10000
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_model import fake_question_json
+from scoring import Scorecard
+from session_log import ANSWER_SUBMITTED, HINT_REQUESTED, QUESTION_SERVED, SESSION_STARTED, read_events, replay_session
+
+TOPICS = ("Biology", "Chemistry", "World History", "Economics")
+LEVELS = ("easy", "moderate", "hard")
+
+
+def simulate(rng, session_id, out, questions):
+    # one student's session, written in the session log's format with made-up times (a student takes
+    # seconds to answer, not microseconds), and its scorecard fed the same events
+    card = Scorecard()
+    topic = rng.choice(TOPICS)
+    at = round(time.time(), 3)
+
+    def log(code, payload):
+        out.write(f"{at:.3f}\t{session_id}\t{code}\t{json.dumps(payload, separators=(',', ':'))}\n")
+
+    log(SESSION_STARTED, [topic, "easy", questions, [topic]])
+    for n in range(questions):
+        data = fake_question_json(rng.randrange(10000))
+        level = rng.choice(LEVELS)
+        log(QUESTION_SERVED, [data['question'], data['choices'], "A", data['explanation'], level, topic])
+        card.served(topic, level, at)
+        if rng.random() < 0.1:
+            continue  # skipped
+        if rng.random() < 0.3:
+            log(HINT_REQUESTED, [n + 1])
+            card.hinted()
+        for _ in range(3):
+            at = round(at + rng.expovariate(1 / 20), 3)
+            right = rng.random() < 0.6
+            log(ANSWER_SUBMITTED, [n + 1, "A" if right else "B", right])
+            card.answered(right, at)
+            if right:
+                break
+    return card
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=10, help="questions per session")
+    parser.add_argument("--replay", type=int, default=200, help="sessions to time replay_session on")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    card = Scorecard()
+    events = 100000
+    start = time.perf_counter()
+    for i in range(events // 2):
+        card.served(TOPICS[i % 4], LEVELS[i % 3], i)
+        card.answered(i % 3 != 0, i + 12.5)
+    per_event = (time.perf_counter() - start) / events
+    print(f"one event: {per_event * 1e6:.2f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.log")
+        states = []
+        ids = []
+        with open(path, "w", encoding="utf-8") as out:
+            for i in range(args.sessions):
+                session_id = f"s{i:07d}"
+                ids.append(session_id)
+                states.append(json.dumps(simulate(rng, session_id, out, args.questions).to_state()))
+        print(f"saved card: {sum(map(len, states)) / len(states):.0f} bytes on average, "
+              f"{os.path.getsize(path) / args.sessions:.0f} bytes of log per session\n")
+
+        start = time.perf_counter()
+        dashboard = Scorecard.combined(Scorecard.from_state(json.loads(state)) for state in states)
+        report = dashboard.report()
+        merged = time.perf_counter() - start
+
+        # the cheapest possible replay: one pass over the log, feeding each session's events to a card
+        start = time.perf_counter()
+        cards = defaultdict(Scorecard)
+        for at, session_id, code, payload in read_events(path):
+            if code == QUESTION_SERVED:
+                cards[session_id].served(payload[5], payload[4], at)
+            elif code == ANSWER_SUBMITTED:
+                cards[session_id].answered(payload[2], at)
+            elif code == HINT_REQUESTED:
+                cards[session_id].hinted()
+        replayed = Scorecard.combined(cards.values()).report()
+        one_pass = time.perf_counter() - start
+
+        # what the app itself can do today: rebuild each QuizSession from the log
+        sample = ids[:args.replay]
+        start = time.perf_counter()
+        for session_id in sample:
+            replay_session(session_id, path)
+        per_session = (time.perf_counter() - start) / len(sample)
+
+    print(f"class dashboard over {args.sessions} sessions:")
+    print(f"  merging saved cards:         {merged * 1000:9.1f} ms")
+    print(f"  one pass over the log:       {one_pass * 1000:9.1f} ms")
+    print(f"  replay_session, all:         {per_session * args.sessions * 1000:9.1f} ms "
+          f"({per_session * 1000:.2f} ms per session, extrapolated from {len(sample)})")
+    agree = replayed == report
+    print(f"  merged and replayed numbers agree: {agree}")
+    print(f"\naccuracy {report['accuracy']:.1%} | first try {report['first_try_rate']:.1%} | "
+          f"hints {report['hint_rate']:.1%} | skipped {report['skipped']} | "
+          f"time to answer p50 {report['time_to_answer']['p50']}s, mean {report['time_to_answer']['mean']}s")
+    for topic, row in report['by_topic'].items():
+        print(f"  {topic:>14}: {row['answered']:6d} answered, accuracy {row['accuracy']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
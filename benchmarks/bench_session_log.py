@@ -0,0 +1,69 @@
+# what the session event log costs per event, and how long replaying a session from it takes
+# run from the repo root: python benchmarks/bench_session_log.py --sessions 2000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tutor_ai
+from fake_model import fake_question_json
+from question_format import Question
+from session_log import SessionEventLog, read_events, replay_session
+
+
+def play(session, number):
+    data = fake_question_json(number)
+    session.serve_question(Question(data['question'], tuple(data['choices']), data['answer'], data['explanation']))
+    session.hint_requested()
+    session.submit_answer("B", session.correct_letter)
+    session.submit_answer("A", session.correct_letter)
+
+
+def run(sessions, log):
+    start = time.perf_counter()
+    ids = []
+    for i in range(sessions):
+        session = tutor_ai.QuizSession("Biology", event_log=log)
+        for q in range(session.max_questions):
+            play(session, i * 10 + q)
+        ids.append(session.session_id)
+    return time.perf_counter() - start, ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    baseline, _ = run(args.sessions, None)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.log")
+        log = SessionEventLog(path)
+        logged, ids = run(args.sessions, log)
+        log.close()
+        size = os.path.getsize(path)
+        events = sum(1 for _ in read_events(path))
+        # the append itself, away from the noise of building sessions
+        log = SessionEventLog(os.path.join(tmp, "appends.log"))
+        payload = [3, "B", False]
+        start = time.perf_counter()
+        for _ in range(100000):
+            log.append("abc123def456", "A", payload)
+        append_time = (time.perf_counter() - start) / 100000
+        log.close()
+        start = time.perf_counter()
+        session = replay_session(ids[-1], path)
+        replay_time = time.perf_counter() - start
+
+    print(f"{args.sessions} sessions, {events} events, {size / events:.0f} bytes per event on disk")
+    print(f"  sessions without log {baseline:6.2f}s | with log {logged:6.2f}s"
+          f" | append {append_time * 1e6:4.1f} us per event")
+    print(f"  replayed one session in {replay_time * 1000:.1f} ms (scans the whole log):"
+          f" score {session.score}/{session.total_questions}, {len(session.attempts)} attempts")
+
+
+if __name__ == "__main__":
+    main()
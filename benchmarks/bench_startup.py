@@ -0,0 +1,81 @@
+# how long the app takes to get the intro window on screen, plus an -X importtime breakdown
+# run from the repo root: QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# starts the app the same way main.py does and prints a line the moment the intro window first paints
+FIRST_PAINT = """
+import sys
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtWidgets import QApplication
+from intro_gui import IntroWindow
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            print("painted", flush=True)
+            QApplication.instance().exit(0)
+        return False
+
+app = QApplication(sys.argv)
+window = IntroWindow()
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+app.exec()
+"""
+
+
+def time_to_first_paint():
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", FIRST_PAINT], cwd=ROOT, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+    for line in proc.stdout:
+        if line.startswith("painted"):
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        elapsed = float("nan")
+    proc.wait()
+    return elapsed
+
+
+def import_report(module, top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative_us), int(self_us), name))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    paints = sorted(time_to_first_paint() for _ in range(args.runs))
+    print(f"wall clock to intro window first paint over {args.runs} runs: "
+          f"best {paints[0] * 1000:.0f} ms, median {paints[len(paints) // 2] * 1000:.0f} ms")
+
+    print(f"\nslowest imports for `import intro_gui` (cumulative ms):")
+    for cumulative_us, self_us, name in import_report("intro_gui", args.top):
+        print(f"  {cumulative_us / 1000:8.1f}  {name}")
+
+    print("\nfor comparison, what loading the Gemini model costs (now deferred until first use):")
+    for cumulative_us, self_us, name in import_report("google.generativeai", 1):
+        print(f"  {cumulative_us / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# end-to-end benchmark: scripted quiz sessions (QuizSession directly, and TutorWindow under offscreen Qt)
+# against a synthetic model with injected latency, drifted/broken replies and repeats
+# reports p50/p95/p99 time-to-question, model calls, tokens, dedup retry rate, where the time went
+# (prompt building, model, parsing, dedup) and GUI frame times, and writes it all as json so two
+# commits can be compared
+# with --wrong-rate the scripted student misses some questions and asks for a hint, which times the hints too
+# (compare --speculate off and always to see what hints generated up front cost in tokens and save in waiting)
+# --prompts v1 runs the original prompts, for a before/after on tokens per question (see bench_prompts.py)
+# run from the repo root:
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_suite.py --out before.json
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_suite.py --out after.json --compare before.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import prompts
+import tutor_ai
+from model_backends import SyntheticModel
+from near_dup import NearDuplicateIndex
+
+MODES = (
+    ("blocking", 0, False),
+    ("prefetch", 2, False),
+    ("batch", 0, True),
+    ("batch+prefetch", 2, True),
+)
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'n': 0}
+    ordered = sorted(values)
+
+    def rank(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+    return {'p50': rank(0.50), 'p95': rank(0.95), 'p99': rank(0.99), 'max': round(ordered[-1], 3),
+            'n': len(ordered)}
+
+
+class Meter:
+    # wraps the functions each stage runs through and adds up their time (from every thread)
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.originals = []
+
+    def add(self, stage, seconds, count=1):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += count
+
+    def wrap(self, owner, name, stage, counter=None):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = original(*args, **kwargs)
+            self.add(stage, time.perf_counter() - start)
+            if counter:
+                counter(result)
+            return result
+
+        setattr(owner, name, timed)
+        self.originals.append((owner, name, original))
+
+    def restore(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals.clear()
+
+
+class MeteredModel:
+    # sits between the client and the synthetic model: counts calls, time and (estimated) tokens
+    def __init__(self, inner, meter):
+        self.inner = inner
+        self.meter = meter
+        self.calls = 0
+        self.tokens = 0
+
+    def _count(self, prompt, text):
+        # estimated the same way for every prompt version, system instruction included
+        self.tokens += prompts.call_tokens(prompt) + prompts.estimate_tokens(text)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        start = time.perf_counter()
+        response = self.inner.generate_content(prompt, stream=stream, **kwargs)
+        if stream:
+            return self._metered_stream(prompt, response, start)
+        self.meter.add("model", time.perf_counter() - start)
+        self._count(prompt, response.text)
+        return response
+
+    def _metered_stream(self, prompt, chunks, start):
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk.text)
+            yield chunk
+        self.meter.add("model", time.perf_counter() - start)
+        self._count(prompt, "".join(parts))
+
+
+def instrument(meter, dedup):
+    def count_dedup(match):
+        dedup['lookups'] += 1
+        dedup['hits'] += match is not None
+
+    def count_parsed(result):
+        dedup['candidates'] += len(result[0]) if isinstance(result, tuple) else 1
+
+    meter.wrap(tutor_ai, "build_question_prompt", "prompt")
+    meter.wrap(tutor_ai, "build_batch_prompt", "prompt")
+    meter.wrap(tutor_ai, "parse_question_text", "parse", count_parsed)
+    meter.wrap(tutor_ai, "parse_question_batch", "parse", count_parsed)
+    meter.wrap(NearDuplicateIndex, "find", "dedup", count_dedup)
+
+
+def fresh_model(args, seed):
+    tutor_ai.hint_cache.clear()
+    return SyntheticModel(latency=args.latency, malformed_rate=args.malformed_rate, drift_rate=0.3,
+                          repeat_rate=args.repeat_rate, seed=seed)
+
+
+def run_sessions(args, prefetch, batch):
+    meter = Meter()
+    dedup = defaultdict(int)
+    instrument(meter, dedup)
+    waits, hints, calls, tokens, durations, failed = [], [], [], [], [], 0
+    try:
+        for i in range(args.sessions):
+            model = MeteredModel(fresh_model(args, seed=i), meter)
+            tutor_ai.model = model
+            student = random.Random(i)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                session = tutor_ai.QuizSession("Biology", "easy", prefetch=prefetch, batch=batch,
+                                               speculate=args.speculate)
+                while not session.is_finished():
+                    asked = time.perf_counter()
+                    question = session.next_question()
+                    waits.append((time.perf_counter() - asked) * 1000)
+                    if question is None:
+                        failed += 1
+                        break
+                    time.sleep(args.think)
+                    if student.random() < args.wrong_rate:
+                        wrong = next(letter for letter in "ABCD" if letter != question.answer_letter)
+                        session.submit_answer(wrong, question.answer_letter)
+                        asked = time.perf_counter()
+                        session.get_hint()
+                        hints.append((time.perf_counter() - asked) * 1000)
+                    session.submit_answer(question.answer_letter, question.answer_letter)
+                session.close()
+            durations.append((time.perf_counter() - start) * 1000)
+            calls.append(model.calls)
+            tokens.append(model.tokens)
+    finally:
+        meter.restore()
+    served = args.sessions * 5
+    return {
+        'time_to_question_ms': percentiles(waits),
+        'time_to_hint_ms': percentiles(hints),
+        'session_ms': percentiles(durations),
+        'model_calls_per_session': sum(calls) / len(calls),
+        'tokens_per_session': sum(tokens) / len(tokens),
+        # share of parsed questions thrown away because they repeated one already seen or queued
+        'dedup_retry_rate': round(dedup['hits'] / dedup['candidates'], 4) if dedup['candidates'] else 0.0,
+        'dedup_lookups': dedup['lookups'],
+        'failed_sessions': failed,
+        'stage_ms_per_question': {stage: round(seconds * 1000 / served, 3)
+                                  for stage, seconds in sorted(meter.seconds.items())},
+    }
+
+
+def run_gui(args):
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    from gui import TutorWindow, attach_event_loop
+    from question_bank import QuestionBank
+    from session_log import SessionEventLog
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    attach_event_loop(app)
+    waits, intervals, ticks = [], [], []
+    last = [time.perf_counter()]
+
+    def heartbeat():
+        # a 16 ms timer; how late it fires is how long the main thread was busy
+        now = time.perf_counter()
+        intervals.append((now - last[0]) * 1000)
+        last[0] = now
+
+    timer = QTimer()
+    timer.setInterval(16)
+    timer.timeout.connect(heartbeat)
+
+    def pump_until(condition, limit=30.0):
+        give_up = time.perf_counter() + limit
+        while not condition() and time.perf_counter() < give_up:
+            app.processEvents()
+            time.sleep(0.001)
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.gui_sessions):
+            tutor_ai.model = fresh_model(args, seed=100 + i)
+            event_log = SessionEventLog(os.path.join(tmp, "sessions.log"))
+            asked = time.perf_counter()
+            window = TutorWindow("Biology", "easy", bank=QuestionBank(os.path.join(tmp, f"bank{i}.db")),
+                                 event_log=event_log)
+            window.show()
+            last[0] = time.perf_counter()
+            timer.start()
+            for _ in range(window.session.max_questions):
+                pump_until(lambda: window.answer_buttons[0].isEnabled())
+                waits.append((time.perf_counter() - asked) * 1000)
+                if not window.answer_buttons[0].isEnabled():
+                    break
+                letter = window.session.correct_letter
+                window.answer_buttons["ABCD".index(letter)].click()
+                renderer = window.renderer_for(window.answer_label)
+                pump_until(lambda: not renderer.is_active())
+                time.sleep(args.think)
+                asked = time.perf_counter()
+                window.retry_button.click()
+            timer.stop()
+            ticks.extend(t * 1000 for r in window.renderers.values() for t in r.frame_times)
+            window.close()
+            app.processEvents()
+    return {
+        'time_to_question_ms': percentiles(waits),
+        'frame_interval_ms': percentiles(intervals),
+        'render_tick_ms': percentiles(ticks),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline):
+    # prints every p95 / per-session number that moved by more than 10%
+    def walk(a, b, path):
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key in a:
+                if key in b:
+                    yield from walk(a[key], b[key], f"{path}.{key}" if path else key)
+        elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+            yield path, b, a
+
+    print(f"\ncompared with {baseline.get('commit')}:")
+    for path, before, after in walk(current['results'], baseline['results'], ""):
+        if not (path.endswith(("p95", "p99", "per_session", "retry_rate")) or ".stage_ms" in path):
+            continue
+        if before and abs(after - before) / abs(before) > 0.10:
+            print(f"  {path:<55} {before:>10} -> {after:<10} ({(after - before) / abs(before):+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8, help="scripted sessions per mode")
+    parser.add_argument("--gui-sessions", type=int, default=2, help="scripted TutorWindow sessions (0 to skip)")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--think", type=float, default=0.1, help="seconds the student spends per question")
+    parser.add_argument("--malformed-rate", type=float, default=0.1)
+    parser.add_argument("--repeat-rate", type=float, default=0.15)
+    parser.add_argument("--wrong-rate", type=float, default=0.0, help="share of questions missed first try (then a hint)")
+    parser.add_argument("--speculate", choices=tutor_ai.SPECULATE_POLICIES, default="off")
+    parser.add_argument("--prompts", choices=sorted(prompts.TEMPLATES), default=prompts.VERSION,
+                        help="prompt version (v1 = the original prompts, to compare against)")
+    parser.add_argument("--out", help="write the results here as json")
+    parser.add_argument("--compare", help="an earlier --out file to diff against")
+    args = parser.parse_args()
+    tutor_ai.MOCK_MODE = False
+    prompts.VERSION = args.prompts
+    args.think = max(args.think, 0.0)
+
+    results = {}
+    for name, prefetch, batch in MODES:
+        results[name] = run_sessions(args, prefetch, batch)
+        r = results[name]
+        ttq = r['time_to_question_ms']
+        print(f"{name:>15}: time to question p50 {ttq['p50']:8.1f} | p95 {ttq['p95']:8.1f} | p99 {ttq['p99']:8.1f} ms"
+              f" | calls {r['model_calls_per_session']:4.1f} | tokens {r['tokens_per_session']:7.0f}"
+              f" | dedup retry {r['dedup_retry_rate']:.1%}")
+        print(f"{'':>15}  per question: " + ", ".join(f"{k} {v:.2f} ms" for k, v in r['stage_ms_per_question'].items()))
+        if r['time_to_hint_ms']['n']:
+            print(f"{'':>15}  time to hint p50 {r['time_to_hint_ms']['p50']:8.1f} | p95 {r['time_to_hint_ms']['p95']:8.1f} ms")
+    if args.gui_sessions:
+        results['gui'] = run_gui(args)
+        g = results['gui']
+        print(f"{'gui':>15}: time to question p50 {g['time_to_question_ms']['p50']:8.1f}"
+              f" | p95 {g['time_to_question_ms']['p95']:8.1f} ms"
+              f" | frame interval p99 {g['frame_interval_ms']['p99']:6.1f} ms"
+              f" | render tick p99 {g['render_tick_ms']['p99']:6.3f} ms")
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# per-tick cost of the typing effect: the old "setText(whole prefix)" label vs TypingRenderer
+# run from the repo root: QT_QPA_PLATFORM=offscreen python benchmarks/bench_typing.py
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication, QLabel, QTextEdit
+
+from gui import TypingRenderer
+
+SENTENCE = "Mitochondria turn nutrients into ATP through cellular respiration, which is why they matter here.\n"
+
+
+def old_label_ticks(app, text):
+    # what update_typing used to do: one character per tick, re-setting the whole prefix each time
+    label = QLabel()
+    label.setWordWrap(True)
+    label.setFixedSize(420, 360)
+    label.show()
+    times = []
+    for i in range(len(text)):
+        start = time.perf_counter()
+        label.setText(text[:i + 1])
+        app.processEvents()
+        times.append(time.perf_counter() - start)
+    label.close()
+    return times
+
+
+def renderer_ticks(app, text):
+    box = QTextEdit()
+    box.setReadOnly(True)
+    box.setFixedSize(420, 360)
+    box.show()
+    renderer = TypingRenderer(box)
+    renderer.start(text)
+    renderer.timer.stop()  # drive the ticks by hand so we time only the work
+    times = []
+    while renderer.pending:
+        start = time.perf_counter()
+        renderer.tick()
+        app.processEvents()
+        times.append(time.perf_counter() - start)
+    box.close()
+    return times
+
+
+def describe(times):
+    ms = [t * 1000 for t in times]
+    first, last = ms[:max(1, len(ms) // 10)], ms[-max(1, len(ms) // 10):]
+    return (f"ticks {len(ms):5d} | mean {statistics.mean(ms):6.3f} ms | first 10% {statistics.mean(first):6.3f} ms"
+            f" | last 10% {statistics.mean(last):6.3f} ms | total {sum(ms):8.1f} ms")
+
+
+def main():
+    app = QApplication(sys.argv)
+    for repeats in (2, 10, 40):
+        text = SENTENCE * repeats
+        print(f"{len(text)} characters")
+        print(f"  old label : {describe(old_label_ticks(app, text))}")
+        print(f"  renderer  : {describe(renderer_ticks(app, text))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# load test for quiz_server.py: starts the server in-process on a fake model, then runs a crowd of
+# simulated students through full quizzes (start, next, hint, answer ... ) and reports req/s and latency
+# run from the repo root: python benchmarks/load_test_server.py --students 1000 --topics 5
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiohttp import web
+
+import tutor_ai
+from fake_model import FakeModel
+from quiz_server import CompactSessionStore, InMemorySessionStore, QuizServer
+
+TOPICS = ["Biology", "Chemistry", "U.S. History", "Algebra", "Geography", "Physics", "Literature", "Economics"]
+
+
+async def student(http, base, topic, rng, latencies, errors, delay):
+    async def call(name, method, path, **kwargs):
+        start = time.perf_counter()
+        async with http.request(method, base + path, **kwargs) as response:
+            data = await response.json()
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors.append((path, response.status))
+            return data
+
+    await asyncio.sleep(delay)  # students trickle in over --ramp seconds instead of all in the same instant
+    created = await call("start", "POST", "/sessions", json={'topic': topic, 'difficulty': "easy"})
+    session = f"/sessions/{created['session_id']}"
+    while True:
+        question = await call("next", "POST", session + "/next")
+        if question.get('finished') or 'error' in question:
+            break
+        if rng.random() < 0.3:
+            await call("hint", "POST", session + "/hint")
+        await call("answer", "POST", session + "/answer", json={'answer': rng.choice("ABCD")})
+        await asyncio.sleep(rng.uniform(0, 0.05))  # reading time
+    await call("end", "DELETE", session)
+
+
+async def run(args):
+    tutor_ai.MOCK_MODE = False
+    tutor_ai.model = FakeModel(latency=args.latency, seed=1)
+    store = InMemorySessionStore() if args.store == "memory" else CompactSessionStore()
+    server = QuizServer(store, batch_size=args.batch_size)
+    runner = web.AppRunner(server.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    rng = random.Random(3)
+    latencies = {}
+    errors = []
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(student(http, base, TOPICS[i % args.topics], random.Random(rng.random()),
+                                       latencies, errors, args.ramp * i / args.students)
+                               for i in range(args.students)))
+        elapsed = time.perf_counter() - start
+        async with http.get(base + "/stats") as response:
+            stats = await response.json()
+    await runner.cleanup()
+    return elapsed, latencies, errors, stats
+
+
+def percentile(sorted_ms, fraction):
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--topics", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which students arrive")
+    parser.add_argument("--store", choices=["compact", "memory"], default="compact")
+    args = parser.parse_args()
+    args.topics = min(args.topics, len(TOPICS))
+
+    elapsed, latencies, errors, stats = asyncio.run(run(args))
+    total = sum(len(v) for v in latencies.values())
+    print(f"{args.students} students on {args.topics} topics, {args.store} store, model latency {args.latency}s")
+    print(f"  {total} requests in {elapsed:.2f}s -> {total / elapsed:7.1f} req/s | errors {len(errors)}")
+    every = sorted(t * 1000 for v in latencies.values() for t in v)
+    print(f"  all        p50 {statistics.median(every):7.1f} ms | p99 {percentile(every, 0.99):7.1f} ms")
+    for name, values in sorted(latencies.items()):
+        ms = sorted(t * 1000 for t in values)
+        print(f"  {name:<10} p50 {statistics.median(ms):7.1f} ms | p99 {percentile(ms, 0.99):7.1f} ms | n {len(ms)}")
+    coalescing = stats['coalescing']
+    print(f"  model calls {stats['client']['calls']} | coalesced {coalescing['coalesced']}"
+          f" | hint cache hits {coalescing['hint_cache']['hits']}")
+    for pool, info in stats['pools'].items():
+        print(f"  pool {pool}: {info}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+# headless bulk question generation for building banks ahead of time: every topic x difficulty gets filled to
+# --count questions by a bounded pool of workers, each reply going through the pipeline
+#   generate -> parse -> validate -> near-dup filter -> write
+# as soon as it lands (one reply at a time, on the same loop as the workers, so nothing waits for a whole topic)
+# the workers share a rate limiter that starts at --rpm requests a minute, halves whenever the model says it's
+# rate limited and wins the rate back a bit at a time on success; failed requests go back on the queue
+# the output (one question per json line, with its topic) is written as it goes and doubles as the checkpoint:
+# run the same command again after an interruption and it picks up where it stopped, with the stage counts
+# from OUT.checkpoint carried over
+# run: python bulk_generate.py questions.jsonl --topics Biology "World History" --count 200 [--bank] [--pack out.pack]
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+from collections import deque
+
+import prompts
+import telemetry
+import tutor_ai
+from gemini_client import CircuitBreaker, CircuitOpenError, GeminiClient, is_retryable
+from mastery import normalize_difficulty
+from near_dup import NearDuplicateIndex
+from question_bank import QuestionBank, normalize_topic
+from question_format import Question, QuestionFormatError, json_config, parse_batch
+
+log = logging.getLogger(__name__)
+
+STAGES = ("parse", "validate", "near_dup")
+CHECKPOINT_EVERY = 5.0  # seconds
+STALL_LIMIT = 3  # replies in a row with nothing new in them before a topic is given up on
+FAILURE_LIMIT = 20  # failed requests in a row (rate limits aside) before the whole run stops
+
+_ABOVE = re.compile(r"\b(all|none|both) of the (above|these)\b", re.IGNORECASE)
+
+
+def _words(text):
+    return re.sub(r"[^a-z0-9 ]", " ", text.lower()).split()
+
+
+def quality_problem(question):
+    # what's wrong with a question that parsed fine but shouldn't go in a bank, or None
+    # (the structural checks, four distinct choices and an explanation, already happened in Question)
+    if len(_words(question.question)) < 4:
+        return "short stem"
+    if len(_words(question.explanation)) < 4:
+        return "thin explanation"
+    if any(_ABOVE.search(choice) for choice in question.choices):
+        return "all/none of the above"
+    answer = " ".join(_words(question.answer))
+    if len(answer.split()) >= 2 and answer in " ".join(_words(question.question)):
+        return "answer in the stem"
+    wrong = [len(c) for letter, c in zip("ABCD", question.choices) if letter != question.answer_letter]
+    if len(question.answer) > 40 and len(question.answer) > 2 * max(wrong):
+        return "longest choice is the answer"
+    return None
+
+
+def is_rate_limited(error):
+    cause = error.__cause__ or error
+    if getattr(cause, 'code', None) == 429:
+        return True
+    message = str(cause).lower()
+    return "429" in message or "quota" in message or "rate limit" in message or "exhausted" in message
+
+
+class RateLimiter:
+    # spaces requests out to `rate` a second; a rate-limit reply halves it (never below min_rate), each success
+    # wins back a twentieth of the starting rate
+    def __init__(self, per_minute, min_per_minute=2):
+        self.max_rate = per_minute / 60
+        self.min_rate = min(min_per_minute / 60, self.max_rate)
+        self.rate = self.max_rate
+        self.next_at = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        at = max(now, self.next_at)
+        self.next_at = at + 1 / self.rate
+        if at > now:
+            await asyncio.sleep(at - now)
+
+    def throttled(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.next_at = max(self.next_at, time.monotonic() + 1 / self.rate)
+
+    def succeeded(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    @property
+    def per_minute(self):
+        return self.rate * 60
+
+
+class Shelf:
+    # one topic + difficulty being filled
+    def __init__(self, topic, difficulty, target):
+        self.topic = topic
+        self.difficulty = difficulty
+        self.target = target
+        self.written = 0
+        self.pending = 0  # questions asked for by requests in flight
+        self.index = NearDuplicateIndex()
+        # recent questions, plus whatever rejected ones were close to, for the next prompt's "not these" list
+        self.exclude = deque(maxlen=10)
+        self.stalls = 0
+        self.given_up = False
+
+    @property
+    def key(self):
+        return normalize_topic(self.topic), self.difficulty
+
+    def need(self, accept_rate=1.0):
+        # what's still missing once the requests in flight come back (accept_rate = share of questions kept)
+        return 0 if self.given_up else self.target - self.written - self.pending * accept_rate
+
+    def remember(self, question):
+        self.index.add(question.question, question.choices)
+        self.exclude.append(question.question)
+
+
+def new_stats():
+    return {'requests': 0, 'rate_limited': 0, 'failed': 0, 'returned': 0, 'parse': 0, 'validate': 0,
+            'near_dup': 0, 'surplus': 0, 'written': 0, 'reasons': {}, 'elapsed': 0.0}
+
+
+class BulkGenerator:
+    def __init__(self, out_path, topics, difficulties, count, batch_size=10, workers=4, per_minute=60,
+                 structured=None, extras=False, bank=None):
+        self.out_path = out_path
+        self.checkpoint_path = out_path + ".checkpoint"
+        self.batch_size = batch_size
+        self.workers = workers
+        self.structured = tutor_ai.STRUCTURED_OUTPUT if structured is None else structured
+        self.extras = extras
+        self.bank = bank
+        self.limiter = RateLimiter(per_minute)
+        # retries are the pool's job here (a failed request goes back on the queue and the limiter slows down),
+        # so the client itself gives up after one try
+        self.client = GeminiClient(tutor_ai.get_model, max_concurrency=workers, retries=0,
+                                   breaker=CircuitBreaker(threshold=FAILURE_LIMIT, reset_after=10.0))
+        self.shelves = {}
+        for topic in topics:
+            for difficulty in difficulties:
+                shelf = Shelf(topic, normalize_difficulty(difficulty), count)
+                self.shelves.setdefault(shelf.key, shelf)
+        self.stats = new_stats()
+        self.run_written = 0
+        self.failures = 0
+        self.error = None
+        self.replies = None
+        self.progress = None
+        self.out = None
+
+    def resume(self):
+        # the output file is what counts; the checkpoint only carries the stage counts across runs
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                self.stats.update(json.load(f))
+        good = 0
+        written = 0
+        if os.path.exists(self.out_path):
+            with open(self.out_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # cut off mid-write, dropped below
+                    good += len(line)
+                    row = json.loads(line)
+                    shelf = self.shelves.get((normalize_topic(row['topic']), normalize_difficulty(row['difficulty'])))
+                    written += 1
+                    if shelf is not None:
+                        question = Question.from_dict(row)
+                        shelf.written += 1
+                        shelf.remember(question)
+            os.truncate(self.out_path, good)
+        self.stats['written'] = written
+        if self.bank is not None:
+            # what the bank already holds counts as seen, so the run doesn't pay for questions it has
+            for shelf in self.shelves.values():
+                for text in self.bank.question_texts(shelf.topic, shelf.difficulty):
+                    shelf.index.add(text)
+        return written
+
+    def save_checkpoint(self, elapsed):
+        self.stats['elapsed'] = elapsed
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.stats, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def accept_rate(self):
+        returned = self.stats['returned']
+        kept = self.stats['written'] + self.stats['surplus']
+        return max(0.25, kept / returned) if returned >= 20 else 1.0
+
+    def next_job(self):
+        # the shelf furthest from done; asks for a few extra when the pipeline has been throwing questions out
+        rate = self.accept_rate()
+        open_shelves = [s for s in self.shelves.values() if s.need(rate) >= 1]
+        if not open_shelves:
+            return None
+        shelf = max(open_shelves, key=lambda s: s.need(rate))
+        size = min(self.batch_size, math.ceil(shelf.need(rate) / rate))
+        shelf.pending += size
+        return shelf, size
+
+    def busy(self):
+        return any(s.pending > 0 for s in self.shelves.values())
+
+    async def worker(self):
+        while self.error is None:
+            job = self.next_job()
+            if job is None:
+                if not self.busy():
+                    return
+                self.progress.clear()
+                await self.progress.wait()
+                continue
+            shelf, size = job
+            await self.limiter.wait()
+            prompt = tutor_ai.build_batch_prompt(shelf.topic, size, shelf.difficulty, list(shelf.exclude),
+                                                 self.structured, self.extras)
+            config = json_config(tutor_ai.question_schema(self.extras, batch=True)) if self.structured else None
+            self.stats['requests'] += 1
+            try:
+                with telemetry.span("bulk.request", difficulty=shelf.difficulty, count=size):
+                    content = await self.client.generate_async(prompt, generation_config=config)
+            except Exception as e:
+                shelf.pending -= size
+                self.progress.set()
+                if is_rate_limited(e) or isinstance(e, CircuitOpenError):
+                    self.stats['rate_limited'] += 1
+                    self.limiter.throttled()
+                    continue
+                self.stats['failed'] += 1
+                self.failures += 1
+                log.warning("request for %s (%s) failed: %s", shelf.topic, shelf.difficulty, e)
+                if not is_retryable(e.__cause__ or e):
+                    self.error = e
+                elif self.failures >= FAILURE_LIMIT:
+                    self.error = RuntimeError(f"{self.failures} requests in a row failed, last: {e}")
+                continue
+            self.failures = 0
+            self.limiter.succeeded()
+            await self.replies.put((shelf, size, content))
+
+    def process(self, shelf, size, content):
+        # parse -> validate -> near-dup filter -> write, for one reply
+        stats = self.stats
+        try:
+            questions, rejected = parse_batch(content, shelf.difficulty)
+        except QuestionFormatError:
+            questions, rejected = [], size
+        stats['returned'] += len(questions) + rejected
+        stats['parse'] += rejected
+        kept = 0
+        for question in questions:
+            problem = quality_problem(question)
+            if problem:
+                stats['validate'] += 1
+                stats['reasons'][problem] = stats['reasons'].get(problem, 0) + 1
+                continue
+            match = shelf.index.find(question.question, question.choices)
+            if match:
+                stats['near_dup'] += 1
+                shelf.exclude.append(match)
+                continue
+            if shelf.written >= shelf.target:
+                stats['surplus'] += 1
+                continue
+            shelf.remember(question)
+            self.out.write(json.dumps({'topic': shelf.topic, **question.to_dict()}) + "\n")
+            shelf.written += 1
+            stats['written'] += 1
+            self.run_written += 1
+            kept += 1
+        self.out.flush()
+        shelf.stalls = 0 if kept else shelf.stalls + 1
+        if shelf.stalls >= STALL_LIMIT and shelf.written < shelf.target:
+            log.warning("giving up on %s (%s) at %d questions: the model keeps repeating itself",
+                        shelf.topic, shelf.difficulty, shelf.written)
+            shelf.given_up = True
+
+    async def writer(self):
+        # runs until run() sends None after the workers are done, or until a reply can't be written; then the
+        # error stops the workers the same way a failed request does
+        while True:
+            reply = await self.replies.get()
+            if reply is None:
+                return
+            shelf, size, content = reply
+            shelf.pending -= size
+            try:
+                self.process(shelf, size, content)
+            except Exception as e:
+                log.exception("writing a reply for %s (%s) failed", shelf.topic, shelf.difficulty)
+                self.error = e
+                return
+            finally:
+                self.progress.set()
+
+    async def run(self, report_every=10.0):
+        self.replies = asyncio.Queue()
+        self.progress = asyncio.Event()
+        started = time.monotonic()
+        before = self.stats['elapsed']
+        last_checkpoint = last_report = started
+        self.out = open(self.out_path, "a", encoding="utf-8")
+        writer = asyncio.create_task(self.writer())
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        try:
+            pending = set(workers)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=1.0)
+                now = time.monotonic()
+                if now - last_checkpoint >= CHECKPOINT_EVERY:
+                    self.save_checkpoint(before + now - started)
+                    last_checkpoint = now
+                if report_every and now - last_report >= report_every:
+                    print(self.progress_line(now - started), flush=True)
+                    last_report = now
+            # replies the workers queued last are paid for: write them before the file is closed
+            await self.replies.put(None)
+            await writer
+        finally:
+            for task in workers + [writer]:
+                task.cancel()
+            self.out.close()
+            self.save_checkpoint(before + time.monotonic() - started)
+        # not in the finally: stopping the client's loop under requests that are still being cancelled on it
+        # (ctrl-c) only adds noise on the way out
+        self.client.close()
+        if self.error is not None:
+            raise self.error
+        return time.monotonic() - started
+
+    def progress_line(self, elapsed):
+        target = sum(s.target for s in self.shelves.values())
+        done = sum(min(s.written, s.target) for s in self.shelves.values())
+        return (f"{done}/{target} questions | {self.run_written / max(elapsed, 1e-9) * 60:.1f}/min | "
+                f"{self.stats['requests']} requests, {self.stats['rate_limited']} rate limited | "
+                f"limit {self.limiter.per_minute:.0f} rpm")
+
+    def report(self, elapsed):
+        stats = self.stats
+        lines = []
+        sent = stats['requests']
+        failed = stats['rate_limited'] + stats['failed']
+        lines.append(f"generate  {sent} requests, {stats['rate_limited']} rate limited, {stats['failed']} failed "
+                     f"({failed / sent if sent else 0:.1%} not answered)")
+        entering = stats['returned']
+        lines.append(f"          {entering} questions came back")
+        for stage in STAGES:
+            rejected = stats[stage]
+            lines.append(f"{stage:>9} rejected {rejected:6d} ({rejected / entering if entering else 0:6.1%})")
+            entering -= rejected
+        for reason, count in sorted(stats['reasons'].items(), key=lambda item: -item[1]):
+            lines.append(f"{'':>12}{reason}: {count}")
+        lines.append(f"    write {stats['written']} questions ({stats['surplus']} over target dropped)")
+        total = stats['elapsed']
+        lines.append(f"throughput {self.run_written / max(elapsed, 1e-9) * 60:.1f} questions/min this run "
+                     f"({elapsed:.1f}s), {stats['written'] / max(total, 1e-9) * 60:.1f}/min over all runs "
+                     f"({total:.1f}s); rate limit settled at {self.limiter.per_minute:.0f} rpm")
+        short = [s for s in self.shelves.values() if s.written < s.target]
+        for shelf in short:
+            lines.append(f"short: {shelf.topic} ({shelf.difficulty}) {shelf.written}/{shelf.target}")
+        return "\n".join(lines)
+
+
+def read_output(path):
+    # (topic, difficulty, question dict) for every question in a bulk output file
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.endswith("\n"):
+                row = json.loads(line)
+                yield row['topic'], row['difficulty'], row
+
+
+def store(path, bank):
+    shelves = {}
+    for topic, difficulty, row in read_output(path):
+        shelves.setdefault((topic, difficulty), []).append(row)
+    for (topic, difficulty), questions in shelves.items():
+        bank.add(topic, difficulty, questions)
+    return sum(len(questions) for questions in shelves.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate questions in bulk for a list of topics.")
+    parser.add_argument("out", help="jsonl file the questions go to (also where an interrupted run resumes from)")
+    parser.add_argument("--topics", nargs="+", default=[])
+    parser.add_argument("--topics-file", help="one topic per line")
+    parser.add_argument("--difficulty", nargs="+", default=["easy", "moderate", "hard"])
+    parser.add_argument("--count", type=int, default=50, help="questions per topic and difficulty")
+    parser.add_argument("--batch", type=int, default=10, help="questions asked for per request")
+    parser.add_argument("--workers", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--rpm", type=float, default=60, help="requests per minute to start at (and never go over)")
+    parser.add_argument("--extras", action="store_true", help="generate hints and why-wrong lines too")
+    parser.add_argument("--fresh", action="store_true", help="start over instead of resuming from OUT")
+    parser.add_argument("--bank", action="store_true", help="skip what the question bank has, add the new ones to it")
+    parser.add_argument("--pack", help="also write everything to this question pack (see question_pack.py)")
+    parser.add_argument("--backend", default=tutor_ai.MODEL_BACKEND,
+                        help="gemini, synthetic, record:PATH or replay:PATH (see model_backends.py)")
+    parser.add_argument("--prompts", choices=sorted(prompts.TEMPLATES), default=prompts.VERSION)
+    parser.add_argument("--log-level", default=os.environ.get("PAST_LOG_LEVEL", "WARNING"))
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    tutor_ai.MODEL_BACKEND = args.backend
+    prompts.VERSION = args.prompts
+
+    topics = list(args.topics)
+    if args.topics_file:
+        with open(args.topics_file, encoding="utf-8") as f:
+            topics += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not topics:
+        parser.error("no topics given (--topics or --topics-file)")
+    if args.fresh:
+        for path in (args.out, args.out + ".checkpoint"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    bank = QuestionBank() if args.bank else None
+    generator = BulkGenerator(args.out, topics, args.difficulty, args.count, args.batch, args.workers, args.rpm,
+                              extras=args.extras, bank=bank)
+    resumed = generator.resume()
+    if resumed:
+        print(f"resuming: {resumed} questions already in {args.out}")
+    try:
+        elapsed = asyncio.run(generator.run())
+    except KeyboardInterrupt:
+        print(f"\ninterrupted; run the same command again to pick up from {generator.stats['written']} questions")
+        sys.exit(130)
+    except Exception as e:
+        print(f"stopped: {e}")
+        print(generator.report(generator.stats['elapsed'] or 1e-9))
+        sys.exit(1)
+    print(generator.report(elapsed))
+
+    if bank is not None:
+        print(f"added {store(args.out, bank)} questions to the question bank")
+        bank.close()
+    if args.pack:
+        from question_pack import write_pack
+
+        print(f"wrote {write_pack(args.pack, read_output(args.out))} questions to {args.pack}")
+
+
+if __name__ == "__main__":
+    main()
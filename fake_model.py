@@ -0,0 +1,177 @@
+# stand-in for the Gemini model so we can time things without hitting the API
+# it answers prompts with well-formed quiz questions after sleeping for a bit, like a real round trip,
+# and can be told to fail some of the time (rate limits, server errors, hangs) to exercise retries
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+# looks like the google.api_core errors as far as gemini_client is concerned (it only checks .code)
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeModel:
+    # error_rate: chance a call fails with a 429 or 503; hang_rate: chance it stalls for hang_time seconds
+    def __init__(self, latency=0.5, error_rate=0.0, hang_rate=0.0, hang_time=60.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _roll(self):
+        # decides up front how this call goes: "ok", "error" or "hang"
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            with self.lock:
+                self.calls += 1
+                self.errors += 1
+            return "error"
+        if roll < self.error_rate + self.hang_rate:
+            return "hang"
+        return "ok"
+
+    def _error(self):
+        if self.rng.random() < 0.5:
+            return FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+        return FakeAPIError(503, "The service is currently unavailable.")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        outcome = self._roll()
+        if outcome == "error":
+            time.sleep(self.latency * 0.2)
+            raise self._error()
+        if outcome == "hang":
+            time.sleep(self.hang_time)
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self.latency)
+        return FakeResponse(self._reply(prompt, kwargs.get('generation_config')))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        outcome = self._roll()
+        if outcome == "error":
+            await asyncio.sleep(self.latency * 0.2)
+            raise self._error()
+        if outcome == "hang":
+            await asyncio.sleep(self.hang_time)
+        if stream:
+            return self._stream_async(prompt)
+        await asyncio.sleep(self.latency)
+        return FakeResponse(self._reply(prompt, kwargs.get('generation_config')))
+
+    async def _stream_async(self, prompt, chunk_size=24):
+        text = self._reply(prompt)
+        pieces = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        await asyncio.sleep(self.latency * 0.25)
+        for piece in pieces:
+            yield FakeResponse(piece)
+            await asyncio.sleep(self.latency * 0.75 / len(pieces))
+
+    def _stream(self, prompt, chunk_size=24):
+        # like a real stream: the first chunk shows up after a fraction of the full latency
+        text = self._reply(prompt)
+        pieces = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        time.sleep(self.latency * 0.25)
+        for piece in pieces:
+            yield FakeResponse(piece)
+            time.sleep(self.latency * 0.75 / len(pieces))
+
+    def _reply(self, prompt, generation_config=None):
+        with self.lock:
+            self.calls += 1
+        as_json = bool(generation_config) and generation_config.get('response_mime_type') == "application/json"
+        # speculative prompts ask for a hint and why-wrong lines too
+        extras = "why_wrong" in prompt or "Why not [Letter]" in prompt
+        batch = re.search(r"Generate (\d+) different multiple-choice quiz questions", prompt)
+        if batch:
+            count = int(batch.group(1))
+            if as_json:
+                return json.dumps([self._question_json(next(self.counter), extras) for _ in range(count)])
+            return "\n---\n".join(
+                f"Question {i + 1}: " + self._question_text(next(self.counter), extras) for i in range(count)
+            )
+        number = next(self.counter)
+        if "multiple-choice quiz question" in prompt:
+            if as_json:
+                return json.dumps(self._question_json(number, extras))
+            return self._question_text(number, extras)
+        return f"Fake reply #{number}: think about the key idea behind the question."
+
+    def _question_json(self, number, extras):
+        data = self.question_json(number)
+        if extras:
+            data.update(hint=FAKE_HINT, why_wrong=list(FAKE_WHY_WRONG))
+        return data
+
+    def _question_text(self, number, extras):
+        text = self.question_text(number)
+        if extras:
+            text += f"\nHint: {FAKE_HINT}" + "".join(
+                f"\nWhy not {letter}: {why}" for letter, why in zip("ABCD", FAKE_WHY_WRONG) if why)
+        return text
+
+    # what one question looks like in a reply; subclasses can change the wording or break it on purpose
+    def question_json(self, number):
+        return fake_question_json(number)
+
+    def question_text(self, number):
+        return fake_question_text(number)
+
+
+# every fake question's right answer is A
+FAKE_HINT = "Think about the key idea behind the question."
+FAKE_WHY_WRONG = ("", "It is connected, so this can't be it.", "It matters in practice too.", "It is still in use.")
+
+_TEMPLATES = [
+    "What is the main role of {term} in {field}?",
+    "Which statement about {term} is true?",
+    "Where would a {field} student most likely run into {term}?",
+    "Why does {term} matter when studying {field}?",
+    "How would you explain {term} to someone new to {field}?",
+]
+_ADJECTIVES = ["cellular", "thermal", "linear", "ancient", "digital", "organic", "modern", "magnetic", "urban",
+               "molecular", "fiscal", "tidal", "neural", "lunar", "civic", "acoustic", "binary"]
+_NOUNS = ["respiration", "gradient", "treaty", "algorithm", "membrane", "erosion", "inflation", "circuit",
+          "mutation", "sonnet", "orbit", "catalyst", "census", "glacier", "protocol", "reflex", "tariff"]
+_FIELDS = ["biology", "history", "physics", "economics", "computer science", "geography", "literature"]
+
+
+def fake_question_json(number):
+    # each number maps to its own made-up term so questions don't look like rewordings of each other
+    term = f"{_ADJECTIVES[number % len(_ADJECTIVES)]} {_NOUNS[(number // len(_ADJECTIVES)) % len(_NOUNS)]}"
+    field = _FIELDS[number % len(_FIELDS)]
+    return {
+        'question': _TEMPLATES[number % len(_TEMPLATES)].format(term=term, field=field),
+        'choices': [
+            f"It is central to how {term} works",
+            f"It has nothing to do with {term}",
+            f"It only applies to {term} in theory",
+            f"It was replaced by {term} long ago",
+        ],
+        'answer': "A",
+        'explanation': f"{term.capitalize()} is central here, which is why A is the fake correct answer.",
+    }
+
+
+def fake_question_text(number):
+    data = fake_question_json(number)
+    choices = "".join(f"{letter}. {choice}\n" for letter, choice in zip("ABCD", data['choices']))
+    return f"{data['question']}\n{choices}Answer: {data['answer']}\nExplanation: {data['explanation']}"
@@ -0,0 +1,368 @@
+# one shared, pooled way of talking to Gemini
+# every call (questions, hints, follow-ups, prefetch workers) goes through the same event loop, so they share
+# one connection, one concurrency limit, one retry/backoff policy and one circuit breaker
+import asyncio
+import contextlib
+import queue
+import random
+import threading
+import time
+
+import prompts
+import telemetry
+
+# HTTP-ish codes worth another try: timeouts, rate limits / quota, and the server having a bad moment
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class ModelUnavailableError(Exception):
+    pass
+
+
+class CircuitOpenError(ModelUnavailableError):
+    pass
+
+
+class BudgetExceededError(ModelUnavailableError):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # google.api_core errors carry the HTTP status as .code
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message or "unavailable" in message
+
+
+# stops hammering Gemini when it keeps failing: after `threshold` failed calls in a row we fail fast
+# for `reset_after` seconds, then let one call through to see if things are back
+class CircuitBreaker:
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        # set while the one trial call after a cool-off is out; everyone else is refused until it comes back
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.probing:
+                return False
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                # half-open: one more failure puts us straight back to open
+                self.failures = self.threshold - 1
+                self.opened_at = None
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def end_trial(self):
+        # the trial call ended without telling us either way (cancelled, or an error retrying won't fix):
+        # the next caller gets to try instead
+        with self.lock:
+            self.probing = False
+
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class GeminiClient:
+    # get_model is called on every request so the model can be swapped out (mock mode, benchmarks)
+    def __init__(self, get_model, max_concurrency=8, timeout=30.0, retries=3, base_delay=0.5, max_delay=8.0,
+                 breaker=None):
+        self.get_model = get_model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {'calls': 0, 'retries': 0, 'timeouts': 0, 'failures': 0, 'rejected': 0}
+        # called as listener(operation, seconds, ok) once each generate/stream finishes (the session log uses it)
+        self.listeners = []
+        self.loop = None
+        self.thread = None
+        self.semaphore = None
+        self.start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # the shared loop lives in a daemon thread and is started by whoever needs it first
+        with self.start_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.semaphore = asyncio.Semaphore(self.max_concurrency)
+                self.thread = threading.Thread(target=self.loop.run_forever, name="gemini-client", daemon=True)
+                self.thread.start()
+        return self.loop
+
+    def _backoff(self, attempt):
+        # exponential backoff with full jitter so a crowd of retries doesn't all land at once
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @contextlib.contextmanager
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.stats['rejected'] += 1
+            raise CircuitOpenError("Gemini keeps failing, holding off on new requests for a bit.")
+        # the breaker is only used from the shared loop, so if it is probing now, this call is the trial
+        trial = self.breaker.probing
+        try:
+            yield
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    def _check_budget(self):
+        # the token budget of whoever made this call (see prompts.charging), if it has one
+        budget = prompts.current_budget()
+        if budget is not None and budget.exhausted():
+            budget.refuse()
+            raise BudgetExceededError(f"This session has used its {budget.limit} token budget.")
+
+    async def _call(self, prompt, **kwargs):
+        model = self.get_model()
+        if hasattr(model, 'generate_content_async'):
+            return await model.generate_content_async(prompt, **kwargs)
+        return await asyncio.to_thread(model.generate_content, prompt, **kwargs)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, operation, started, ok):
+        elapsed = time.monotonic() - started
+        for listener in list(self.listeners):
+            try:
+                listener(operation, elapsed, ok)
+            except Exception:
+                pass  # a broken listener must never break a model call
+
+    def _on_client_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    async def generate_async(self, prompt, timeout=None, deadline=None, generation_config=None):
+        # timeout caps each attempt, deadline (seconds from now) caps the whole thing including retries
+        # generation_config goes straight to the model (e.g. JSON output with a response schema)
+        # callers on another event loop (the gui, a server) get the work handed to the shared loop
+        work = self._generate(prompt, timeout, deadline, generation_config)
+        if self._on_client_loop():
+            return await work
+        future = asyncio.run_coroutine_threadsafe(work, self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def _generate(self, prompt, timeout=None, deadline=None, generation_config=None):
+        started = time.monotonic()
+        ok = False
+        try:
+            with telemetry.span("model.generate"):
+                result = await self._generate_with_retries(prompt, timeout, deadline, generation_config)
+            ok = True
+            return result
+        finally:
+            self._notify("generate", started, ok)
+
+    async def _generate_with_retries(self, prompt, timeout, deadline, generation_config):
+        timeout = timeout or self.timeout
+        give_up_at = time.monotonic() + deadline if deadline else None
+        self._check_budget()
+        with self._check_breaker():
+            attempt = 0
+            while True:
+                budget = timeout if give_up_at is None else min(timeout, give_up_at - time.monotonic())
+                try:
+                    if budget <= 0:
+                        raise asyncio.TimeoutError()
+                    async with self.semaphore:
+                        self.stats['calls'] += 1
+                        kwargs = {'generation_config': generation_config} if generation_config else {}
+                        response = await asyncio.wait_for(self._call(prompt, **kwargs), budget)
+                    text = getattr(response, 'text', None)
+                    if not text:
+                        raise ValueError("Gemini response did not return text.")
+                    self.breaker.record_success()
+                    telemetry.current().set(attempts=attempt + 1)
+                    telemetry.record_usage(getattr(response, 'usage_metadata', None))
+                    prompts.charge(prompt, text, getattr(response, 'usage_metadata', None))
+                    return text.strip()
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats['timeouts'] += 1
+                    if not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt)
+                    out_of_time = give_up_at is not None and time.monotonic() + delay >= give_up_at
+                    if attempt >= self.retries or out_of_time:
+                        telemetry.current().set(attempts=attempt + 1)
+                        self.stats['failures'] += 1
+                        self.breaker.record_failure()
+                        raise ModelUnavailableError(f"Gemini request failed after {attempt + 1} tries: {e}") from e
+                    attempt += 1
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(delay)
+
+    async def stream_async(self, prompt, timeout=None):
+        # yields text chunks; a failure before the first chunk is retried like generate_async, after that it's raised
+        if self._on_client_loop():
+            async for piece in self._stream(prompt, timeout):
+                yield piece
+            return
+        caller = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for piece in self._stream(prompt, timeout):
+                    caller.call_soon_threadsafe(chunks.put_nowait, ("chunk", piece))
+                caller.call_soon_threadsafe(chunks.put_nowait, ("done", None))
+            except BaseException as e:
+                caller.call_soon_threadsafe(chunks.put_nowait, ("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                kind, value = await chunks.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    async def _stream(self, prompt, timeout=None):
+        started = time.monotonic()
+        ok = False
+        try:
+            with telemetry.span("model.stream"):
+                async for piece in self._stream_with_retries(prompt, timeout):
+                    yield piece
+            ok = True
+        finally:
+            self._notify("stream", started, ok)
+
+    async def _stream_with_retries(self, prompt, timeout):
+        timeout = timeout or self.timeout
+        self._check_budget()
+        with self._check_breaker():
+            attempt = 0
+            while True:
+                started = False
+                usage = None
+                parts = []
+                try:
+                    async with self.semaphore:
+                        self.stats['calls'] += 1
+                        model = self.get_model()
+                        if hasattr(model, 'generate_content_async'):
+                            response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True),
+                                                              timeout)
+                            chunks = response.__aiter__()
+                            next_chunk = chunks.__anext__
+                        else:
+                            response = await asyncio.to_thread(model.generate_content, prompt, stream=True)
+                            chunks = iter(response)
+
+                            async def next_chunk():
+                                chunk = await asyncio.to_thread(next, chunks, None)
+                                if chunk is None:
+                                    raise StopAsyncIteration
+                                return chunk
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(next_chunk(), timeout)
+                            except StopAsyncIteration:
+                                break
+                            # the token counts come with the last chunk
+                            usage = getattr(chunk, 'usage_metadata', None) or usage
+                            text = getattr(chunk, 'text', "")
+                            if text:
+                                started = True
+                                parts.append(text)
+                                yield text
+                    self.breaker.record_success()
+                    telemetry.current().set(attempts=attempt + 1)
+                    telemetry.record_usage(usage, "stream")
+                    prompts.charge(prompt, "".join(parts), usage)
+                    return
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats['timeouts'] += 1
+                    if started or not is_retryable(e):
+                        raise
+                    if attempt >= self.retries:
+                        self.stats['failures'] += 1
+                        self.breaker.record_failure()
+                        raise ModelUnavailableError(f"Gemini stream failed after {attempt + 1} tries: {e}") from e
+                    attempt += 1
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self._backoff(attempt - 1))
+
+    def submit(self, coro):
+        # runs a coroutine on the shared loop from any thread; cancelling the returned future cancels it there
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def generate(self, prompt, timeout=None, deadline=None, generation_config=None):
+        # blocking version for threads (prefetch workers, Qt worker threads); still runs on the shared loop
+        future = asyncio.run_coroutine_threadsafe(self._generate(prompt, timeout, deadline, generation_config),
+                                                  self._ensure_loop())
+        return future.result()
+
+    def stream(self, prompt, timeout=None):
+        # blocking generator version of stream_async; closing it early cancels the request
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for piece in self._stream(prompt, timeout):
+                    chunks.put(("chunk", piece))
+                chunks.put(("done", None))
+            except BaseException as e:
+                chunks.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                kind, value = chunks.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def close(self):
+        with self.start_lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=1)
+                self.loop = None
@@ -1,17 +1,148 @@
+import asyncio
+import math
 import sys
+import time
+from collections import deque
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QTextEdit, QLineEdit,
     QVBoxLayout, QHBoxLayout, QMessageBox, QFrame, QSizePolicy
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QObject, QEvent, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+import qasync
+import tutor_ai
 from tutor_ai import QuizSession
+from question_pack import default_bank
+import session_log
+from session_log import SessionEventLog
+
+
+# the window's model work runs as asyncio tasks on a qasync loop, which is Qt's own event loop underneath
+# (main.py starts it): a handler awaiting the model hands the main thread back to Qt, so the window keeps
+# repainting and taking clicks, and the work can be cancelled like any other task
+# attach_event_loop is for code that pumps Qt itself (processEvents in the benchmarks) instead
+def attach_event_loop(app):
+    loop = qasync.QEventLoop(app, already_running=True)
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+# types text out a chunk at a time with one reused timer
+# on a QTextEdit each tick just inserts the new characters at the end, so a tick costs the same no matter
+# how long the text already is; a QLabel has no cursor, so there we keep the number of ticks bounded instead
+class TypingRenderer(QObject):
+    def __init__(self, target, interval=16, frames=60, parent=None):
+        super().__init__(parent)
+        self.target = target
+        self.frames = frames  # roughly how many ticks a piece of text should take, however long it is
+        self.pending = deque()
+        self.step = 1
+        self.shown = ""  # only used for QLabel targets
+        self.frame_times = deque(maxlen=500)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.tick)
+        self.uses_cursor = hasattr(target, "textCursor")
+        # clicking the text skips to the end
+        (target.viewport() if self.uses_cursor else target).installEventFilter(self)
+
+    def start(self, text):
+        self.clear()
+        self.append(text)
+
+    def append(self, text):
+        if not text:
+            return
+        self.pending.append(text)
+        remaining = sum(len(piece) for piece in self.pending)
+        self.step = max(1, math.ceil(remaining / self.frames))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def clear(self):
+        self.timer.stop()
+        self.pending.clear()
+        self.shown = ""
+        if self.uses_cursor:
+            self.target.clear()
+        else:
+            self.target.setText("")
+
+    def set_html(self, html):
+        # for finished rich text that shouldn't be typed out
+        self.timer.stop()
+        self.pending.clear()
+        if self.uses_cursor:
+            self.target.setHtml(html)
+        else:
+            self.target.setText(html)
+
+    def skip(self):
+        if self.pending:
+            self._write("".join(self.pending))
+            self.pending.clear()
+        self.timer.stop()
+
+    def is_active(self):
+        return self.timer.isActive()
+
+    def tick(self):
+        started = time.perf_counter()
+        piece = ""
+        while self.pending and len(piece) < self.step:
+            head = self.pending[0]
+            take = self.step - len(piece)
+            piece += head[:take]
+            if take >= len(head):
+                self.pending.popleft()
+            else:
+                self.pending[0] = head[take:]
+        if piece:
+            self._write(piece)
+        if not self.pending:
+            self.timer.stop()
+        self.frame_times.append(time.perf_counter() - started)
+
+    def _write(self, piece):
+        if self.uses_cursor:
+            cursor = self.target.textCursor()
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(piece)
+        else:
+            self.shown += piece
+            self.target.setText(self.shown)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.MouseButtonPress and self.pending:
+            self.skip()
+        return False
+
 
 class TutorWindow(QWidget):
-    def __init__(self, topic=None, difficulty="easy"):
+    # fired from the prefetch worker threads, Qt queues it over to the main thread for us
+    question_partial = pyqtSignal(object)
+
+    def __init__(self, topic=None, difficulty="easy", prefetch=2, batch=True, bank=None, event_log=None, topics=None,
+                 max_questions=5):
         super().__init__()
         self.topic = topic
         self.difficulty = difficulty
-        self.session = QuizSession(topic=topic, difficulty=difficulty)
+        self.waiting_for_question = False
+        # asyncio tasks for what's in flight; stop_tasks() cancels them all
+        self.question_task = None
+        self.hint_task = None
+        self.follow_up_task = None
+        self.question_partial.connect(self.on_question_partial)
+        # the session history (and every model call's latency) is only recorded when asked for (--session-log)
+        if event_log is None and session_log.RECORD_PATH:
+            event_log = SessionEventLog(session_log.RECORD_PATH)
+        self.event_log = event_log
+        if self.event_log is not None:
+            tutor_ai.client.add_listener(self.event_log.model_call)
+        self.session = QuizSession(topic=topic, difficulty=difficulty, prefetch=prefetch, batch=batch,
+                                   bank=bank if bank is not None else default_bank(),
+                                   on_question_partial=self.question_partial.emit, event_log=self.event_log,
+                                   topics=topics, max_questions=max_questions)
         self.setWindowTitle("Eric and Redhouse AI Tutor - Let’s Learn Together!")
         self.setMinimumSize(900, 800)
 
@@ -128,15 +259,18 @@ class TutorWindow(QWidget):
         self.ai_feedback_static_label.setContentsMargins(10, 10, 10, 0)
         right_layout.addWidget(self.ai_feedback_static_label)
 
-        self.answer_label = QLabel("")
-        self.answer_label.setWordWrap(True)
+        # read-only text box rather than a QLabel so the typing effect can append instead of re-setting everything
+        self.answer_label = QTextEdit()
+        self.answer_label.setReadOnly(True)
+        self.answer_label.setFrameShape(QFrame.Shape.NoFrame)
         self.answer_label.setStyleSheet("color: black; font-weight: bold; background-color: #f2f2f2; border-radius: 8px; padding: 16px;")
         # placeholder text for now before user answers
-        self.answer_label.setText("This space will show explanations and feedback after you answer.")
+        self.answer_label.setPlainText("This space will show explanations and feedback after you answer.")
         self.answer_label.setContentsMargins(12, 12, 12, 12)
         self.answer_label.setFixedHeight(360)
         self.answer_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
         right_layout.addWidget(self.answer_label)
+        self.renderers = {}
 
         # hint button (only turns on after 1 wrong try)
         self.hint_button = QPushButton("Get Hint")
@@ -148,6 +282,23 @@ class TutorWindow(QWidget):
 
         self.hint_reveal_layout = QVBoxLayout()
         self.hint_reveal_layout.addWidget(self.hint_button)
+
+        # ask the tutor about the question; the reply streams into the feedback panel like the hint does
+        follow_up_layout = QHBoxLayout()
+        self.follow_up_input = QLineEdit()
+        self.follow_up_input.setPlaceholderText("Ask the tutor about this question...")
+        self.follow_up_input.returnPressed.connect(self.ask_follow_up)
+        self.follow_up_button = QPushButton("Ask")
+        self.follow_up_button.clicked.connect(self.ask_follow_up)
+        follow_up_layout.addWidget(self.follow_up_input)
+        follow_up_layout.addWidget(self.follow_up_button)
+        self.hint_reveal_layout.addLayout(follow_up_layout)
+        self.set_follow_up_enabled(False)
+
+        # what the hint / follow-up request is up to
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("font-size: 13px; color: #666666;")
+        self.hint_reveal_layout.addWidget(self.status_label)
         # we don’t show the answer anymore so that part is gone
         right_layout.addLayout(self.hint_reveal_layout)
 
@@ -189,8 +340,9 @@ class TutorWindow(QWidget):
         self.load_question()
 
     def load_question(self):
-        self.session.wrong_attempts = 0
-        self.attempts_left = 3
+        # anything still being fetched about the last question is no use now
+        self.stop_tasks()
+        self.set_follow_up_enabled(False)
         if self.session.is_finished():
             # Remove emoji from completion and final score message
             final_score = self.session.score_percentage()
@@ -205,29 +357,67 @@ class TutorWindow(QWidget):
             self.retry_button.setStyleSheet("background-color: #666; color: white;")
             final_message = f"<b>Final Score:</b> {final_score:.2f}%<br>" \
                             f"<b>Insights:</b> {self.session.get_score_message()}"
-            self.answer_label.setText(final_message)
+            self.renderer_for(self.answer_label).set_html(final_message)
             return
         self.retry_button.setStyleSheet("")  # Reset to default blue
         self.question_counter_label.setText(
             f"Question {self.session.current_question_number} of {self.session.max_questions}"
+            f" ({self.session.next_difficulty().capitalize()})"
+            + (f" - {self.session.upcoming_topic}" if len(self.session.topics) > 1 else "")
         )
-        data = self.session.next_question()
+        if not self.session.question_ready():
+            # nothing prefetched yet, so show a loading state until it comes in
+            self.question_label.setText(f"<b>Topic:</b> {self.session.upcoming_topic}<br><br>Loading question...")
+            for btn in self.answer_buttons:
+                btn.setDisabled(True)
+            self.hint_button.setEnabled(False)
+            self.retry_button.setEnabled(False)
+        self.question_task = self.spawn(self.next_question())
+
+    async def next_question(self):
+        self.waiting_for_question = True
+        try:
+            data = await self.session.next_question_async()
+        finally:
+            self.waiting_for_question = False
+        self.show_question(data)
+
+    def on_question_partial(self, event):
+        # the question we're waiting on is streaming in, so put each piece up as soon as it's parsed
+        if not self.waiting_for_question or event[1] != 0:
+            return
+        if event[0] == "stem":
+            self.question_label.setText(f"<b>Topic:</b> {self.session.upcoming_topic}<br><br><b>Question:</b> {event[2]}")
+        elif event[0] == "choice":
+            i = "ABCD".index(event[2])
+            self.answer_buttons[i].setText(f"{event[2]}. {event[3]}")
+
+    def show_question(self, data):
+        if data is None:
+            # the model is down or rate limited; let the student try again instead of showing a fake question
+            self.question_label.setText(
+                f"<b>Topic:</b> {self.session.upcoming_topic}<br><br>"
+                f"Couldn't reach the tutor right now. Press Next Question to try again."
+            )
+            for btn in self.answer_buttons:
+                btn.setDisabled(True)
+            self.hint_button.setEnabled(False)
+            self.retry_button.setEnabled(True)
+            return
         # Remove emoji from topic label
         self.question_label.setText(
-            f"<b>Topic:</b> {self.session.topic}<br><br><b>Question:</b> {data['question']}"
+            f"<b>Topic:</b> {self.session.topic}<br><br><b>Question:</b> {data.question}"
         )
         choices = ["A.", "B.", "C.", "D."]
-        for i, choice in enumerate(data['choices']):
+        for i, choice in enumerate(data.choices):
             self.answer_buttons[i].setText(f"{choices[i]} {choice}")
             self.answer_buttons[i].setToolTip(f"{choices[i]} {choice}")
             self.answer_buttons[i].setEnabled(True)
-        # stop old timer if it was still going
-        if hasattr(self, 'timer') and self.timer.isActive():
-            self.timer.stop()
-        # clear old feedback before new one starts
-        self.answer_label.setText("This space will show explanations and feedback after you answer.")
-        self.answer_label.repaint()
+        # clear old feedback (and stop any typing still going) before new one starts
+        self.renderer_for(self.answer_label).clear()
+        self.answer_label.setPlainText("This space will show explanations and feedback after you answer.")
         self.hint_button.setEnabled(False)
+        self.set_follow_up_enabled(True)
         self.retry_button.setEnabled(False)
 
     def check_answer(self):
@@ -243,11 +433,11 @@ class TutorWindow(QWidget):
             self.hint_button.setEnabled(False)
             self.retry_button.setEnabled(True)
         else:
-            self.attempts_left -= 1
-            if self.attempts_left == 2:
+            # the session keeps count of the tries (scoring.MAX_TRIES); the hint opens up after the first miss
+            if self.session.tries_left():
                 self.hint_button.setEnabled(True)
             self.animate_typing(feedback, self.answer_label)
-            if self.attempts_left <= 0:
+            if not self.session.tries_left():
                 for btn in self.answer_buttons:
                     btn.setDisabled(True)
                 self.hint_button.setEnabled(False)
@@ -259,20 +449,21 @@ class TutorWindow(QWidget):
         msg.setIcon(QMessageBox.Icon.Information)
         msg.setStandardButtons(QMessageBox.StandardButton.Ok)
         msg.setTextFormat(Qt.TextFormat.RichText)
-        if self.session.total_questions == 0:
+        card = self.session.scorecard.total
+        if card.answered == 0:
             msg.setWindowTitle("Progress")
             msg.setText("<span style='color: black;'>No questions answered yet.</span>")
             msg.exec()
             return
-        percent = self.session.score_percentage()
-        correct = self.session.correct_count
-        total = self.session.total_questions
         msg.setWindowTitle("Your Learning Progress")
         msg.setText(
             f"<span style='color: black;'>"
-            f"✅ Correct: {correct}<br>"
-            f"📊 Total: {total}<br>"
-            f"📈 Score: {percent:.2f}%"
+            f"✅ Correct: {card.correct}<br>"
+            f"📊 Answered: {card.answered}<br>"
+            f"📈 Score: {card.accuracy() * 100:.2f}%<br>"
+            f"🎯 First try: {card.first_try_rate() * 100:.0f}%<br>"
+            f"💡 Hints on {card.hinted} of {card.answered}<br>"
+            f"⏱ Time to answer: {card.mean_time():.0f}s on average"
             f"</span>"
         )
         msg.exec()
@@ -280,37 +471,80 @@ class TutorWindow(QWidget):
 
     # used to show answer, not anymore
 
+    # the hint streams into the feedback panel under the feedback instead of a popup we'd have to wait on
     def get_hint(self):
-        msg = QMessageBox(self)
-        msg.setIcon(QMessageBox.Icon.Information)
-        msg.setStandardButtons(QMessageBox.StandardButton.Ok)
-        msg.setTextFormat(Qt.TextFormat.RichText)
-        hint = self.session.get_hint()
-        msg.setWindowTitle("Hint")
-        msg.setText(f"<span style='color: black;'>Hint: {hint}</span>")
-        msg.exec()
+        if self.hint_task and not self.hint_task.done():
+            return
+        self.hint_button.setEnabled(False)
+        self.hint_task = self.start_reply(self.session.stream_hint_async(), "\n\nHint: ", "Getting a hint...")
+
+    def ask_follow_up(self):
+        prompt = self.follow_up_input.text().strip()
+        if not prompt or self.session.current_question is None:
+            return
+        # a new question replaces one still being answered
+        if self.follow_up_task:
+            self.follow_up_task.cancel()
+        self.follow_up_input.clear()
+        self.follow_up_task = self.start_reply(self.session.stream_follow_up_async(prompt),
+                                               f"\n\nYou asked: {prompt}\nTutor: ", "Asking the tutor...")
+
+    def start_reply(self, chunks, heading, waiting_text):
+        renderer = self.renderer_for(self.answer_label)
+        # finish the feedback typing right away so the reply lands underneath it
+        renderer.skip()
+        renderer.append(heading)
+        self.status_label.setText(waiting_text)
+        return self.spawn(self.stream_reply(chunks))
+
+    async def stream_reply(self, chunks):
+        renderer = self.renderer_for(self.answer_label)
+        try:
+            async for piece in chunks:
+                self.status_label.setText("")
+                renderer.append(piece)
+        finally:
+            await chunks.aclose()
+        self.status_label.setText("")
+
+    def spawn(self, work):
+        return asyncio.ensure_future(work)
+
+    def stop_tasks(self):
+        # whatever is still being fetched about the question on screen is no use once it's gone
+        for task in (self.question_task, self.hint_task, self.follow_up_task):
+            if task:
+                task.cancel()
+        self.question_task = self.hint_task = self.follow_up_task = None
+        self.waiting_for_question = False
+        self.status_label.setText("")
+
+    def set_follow_up_enabled(self, enabled):
+        self.follow_up_input.setEnabled(enabled)
+        self.follow_up_button.setEnabled(enabled)
+
+    def closeEvent(self, event):
+        self.stop_tasks()
+        self.session.close()
+        if self.event_log is not None:
+            tutor_ai.client.remove_listener(self.event_log.model_call)
+            self.event_log.close()
+        super().closeEvent(event)
+
+    def renderer_for(self, target):
+        # one renderer (and one timer) per widget, reused for every piece of text it shows
+        if target not in self.renderers:
+            self.renderers[target] = TypingRenderer(target, parent=self)
+        return self.renderers[target]
 
     def animate_typing(self, full_text, target_label):
-        self.current_index = 0
-        self.full_text = full_text
-        self.target_label = target_label
-
-        # make spacing look better in feedback
-        self.target_label.setContentsMargins(0, 8, 0, 8)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_typing)
-        self.timer.start(25)
-
-    def update_typing(self):
-        if self.current_index < len(self.full_text):
-            current_text = self.full_text[:self.current_index + 1]
-            self.target_label.setText(current_text)
-            self.current_index += 1
-        else:
-            self.timer.stop()
+        self.renderer_for(target_label).start(full_text)
 
 def run_app(topic=None):
     app = QApplication(sys.argv)
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
     window = TutorWindow(topic=topic)
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    with loop:
+        sys.exit(loop.run_forever())
\ No newline at end of file
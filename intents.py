@@ -0,0 +1,169 @@
+# what a student's follow-up question is after, without asking the model
+# the phrases below are compiled once into an Aho-Corasick automaton, so classifying a message is one pass
+# over its characters however many phrases there are (a few microseconds); the replies are built from the
+# question on screen (its choices, and the hint and why-wrong lines if it came with them); anything the
+# phrases don't catch goes to the model as before, so a miss costs a model call rather than a wrong reply
+# (benchmarks/bench_intents.py scores it on follow-ups the phrases weren't written from)
+# "^" and "$" stand for the start and end of the message, so "^ b $" only matches a message that's just "b"
+import re
+from collections import deque
+
+from question_format import LETTERS
+
+INTENT_PHRASES = {
+    # wants the answer handed over
+    "answer_fishing": [
+        "what s the answer", "whats the answer", "what is the answer", "give me the answer", "tell me the answer",
+        "just tell me", "just give me", "which one is correct", "which one is right", "which is correct",
+        "which is right", "which one is it", "correct answer", "right answer", "the answer is", "is the answer",
+        "choose the right one", "pick the right one", "which letter", "which option is", "reveal the answer",
+        "show me the answer", "^ a $", "^ b $", "^ c $", "^ d $", "is it a $", "is it b $", "is it c $",
+        "is it d $", "answer please", "^ answer $",
+    ],
+    # wants a nudge
+    "hint": [
+        "hint", "clue", "i m stuck", "im stuck", "i am stuck", "^ help $", "help me $", "help please",
+        "a little help", "point me in the right direction", "where do i start", "no idea $", "i don t know $",
+        "i dont know $", "nudge",
+    ],
+    # wants to see the question again
+    "repeat_question": [
+        "repeat the question", "what was the question", "what is the question", "say that again",
+        "what are the options", "what were the options", "what are the choices", "what were the choices",
+        "read it again", "show the question", "list the options", "list the choices",
+    ],
+    # wants to know why the answer they picked is wrong
+    "why_wrong": [
+        "why is that wrong", "why was i wrong", "why is it wrong", "why was that wrong", "why isn t it",
+        "why isnt it", "why not", "why is my answer wrong", "what did i get wrong", "why did i get it wrong",
+        "why am i wrong", "how is that wrong", "why wrong",
+    ],
+    "thanks": [
+        "^ thanks", "^ thank you", "^ thx", "^ ok thanks", "^ got it", "^ ok $", "^ okay $", "^ cool $",
+        "^ great $", "makes sense $",
+    ],
+}
+
+# when one message matches several intents, the first of these wins
+PRIORITY = ("answer_fishing", "why_wrong", "repeat_question", "hint", "thanks")
+
+# "is it ..." is answer fishing only when the rest names one of the choices
+_MAYBE_FISHING = "^ is it "
+
+
+def normalize(text):
+    return "^ " + " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split()) + " $"
+
+
+class IntentMatcher:
+    def __init__(self, phrases):
+        # goto[state] = {char: state}; fail[state] = longest proper suffix state; out[state] = intents ending here
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [set()]
+        for intent, patterns in phrases.items():
+            for pattern in patterns:
+                self._insert(pattern, intent)
+        self._insert(_MAYBE_FISHING, "maybe_fishing")
+        self._link()
+
+    def _insert(self, pattern, intent):
+        state = 0
+        for char in pattern:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(set())
+            state = nxt
+        self.out[state].add(intent)
+
+    def _link(self):
+        # breadth first, so every state's fail link is settled before its children need it
+        # (the root's children fail back to the root, which they already do)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+    def matches(self, normalized):
+        found = set()
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for char in normalized:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+MATCHER = IntentMatcher(INTENT_PHRASES)
+
+
+def _names_a_choice(rest, question):
+    # "is it mitochondria", "is it the second one"... close enough to one of the choices or a letter
+    rest = rest.strip()
+    if rest in ("a", "b", "c", "d") or rest in ("the first one", "the second one", "the third one", "the last one"):
+        return True
+    if question is None or not rest:
+        return False
+    for choice in question.choices:
+        choice = " ".join(re.sub(r"[^a-z0-9 ]", " ", choice.lower()).split())
+        if rest in choice or choice in rest:
+            return True
+    return False
+
+
+def classify(text, question=None):
+    # the intent of a follow-up message, or None for an open-ended question the model should answer
+    normalized = normalize(text)
+    found = MATCHER.matches(normalized)
+    if "maybe_fishing" in found:
+        found.discard("maybe_fishing")
+        if _names_a_choice(normalized[len(_MAYBE_FISHING):-2], question):
+            found.add("answer_fishing")
+    for intent in PRIORITY:
+        if intent in found:
+            return intent
+    return None
+
+
+def _options(question):
+    return "\n".join(f"• {letter}. {choice}" for letter, choice in zip(LETTERS, question.choices))
+
+
+# hint = a hint we already have for the question (generated with it, or cached); last_letter = the wrong
+# answer the student just gave, if any; each returns None when there's nothing better than asking the model
+def respond(intent, question=None, attempt_count=0, hint="", last_letter=None):
+    if intent == "answer_fishing":
+        if question is None:
+            return "Not just yet! Give it your best guess first, and I'll help you work through it."
+        nudge = f"Hint: {hint}" if hint else f"Think carefully about what the question is asking: {question.question}"
+        if attempt_count >= 3:
+            # no why-wrong lines for the other options here: with three of them ruled out, the fourth is the answer
+            own = f" Ask me why {last_letter} is wrong if you'd like to know what was off." if last_letter else ""
+            return (f"You're really giving this your all—great persistence!\n\n{nudge}\n\n"
+                    f"Go back to the idea the question is built on, then check which option fits it exactly.{own}")
+        return f"Not just yet! Let's go over the options to help you out:\n\n{_options(question)}\n\n{nudge}"
+    if intent == "hint":
+        return f"Here's a hint: {hint}" if hint else None
+    if intent == "repeat_question" and question is not None:
+        return f"Here's the question again:\n\n{question.question}\n\n{_options(question)}"
+    if intent == "why_wrong" and question is not None and last_letter:
+        why = question.why_not(last_letter)
+        if why:
+            return f"{last_letter} isn't it: {why} Have another look at the other options."
+        return None
+    if intent == "thanks":
+        return "You're welcome! Keep going—you've got this."
+    return None
@@ -5,7 +5,7 @@ import sys
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QPushButton, QLineEdit, QMessageBox, QComboBox
 )
-from gui import TutorWindow  # make sure gui.py has TutorWindow class exposed
+from tutor_ai import warm_up_model
 
 # This is the first window that shows up
 # It asks the user to type a topic and pick a difficulty before starting
@@ -27,7 +27,9 @@ class IntroWindow(QWidget):
 
         # Text box where user types in a topic
         self.topic_input = QLineEdit()
-        self.topic_input.setPlaceholderText("e.g., Biology, U.S. History, Python")
+        self.topic_input.setPlaceholderText("e.g., Biology, U.S. History, Python (separate topics with commas to mix them)")
+        # start loading the Gemini model in the background as soon as they start typing
+        self.topic_input.textEdited.connect(warm_up_model)
         layout.addWidget(self.topic_input)
 
         # Label above the difficulty dropdown
@@ -39,6 +41,13 @@ class IntroWindow(QWidget):
         self.difficulty_combo.addItems(["Easy", "Moderate", "Hard"])
         layout.addWidget(self.difficulty_combo)
 
+        # How many questions; the long ones bring back missed questions for another go
+        self.length_label = QLabel("Number of questions:")
+        layout.addWidget(self.length_label)
+        self.length_combo = QComboBox()
+        self.length_combo.addItems(["5", "10", "20", "50", "100"])
+        layout.addWidget(self.length_combo)
+
         # Start button that launches the quiz
         self.start_button = QPushButton("Start Quiz")
         self.start_button.clicked.connect(self.launch_quiz)
@@ -49,11 +58,15 @@ class IntroWindow(QWidget):
     # When Start button is clicked, launch the main quiz window if topic is valid
     def launch_quiz(self):
         # Get topic from user input
-        topic = self.topic_input.text().strip()
+        topics = [t.strip() for t in self.topic_input.text().split(",") if t.strip()]
         # If topic is entered, get selected difficulty and open quiz window
-        if topic:
+        if topics:
+            # imported here so the quiz window's setup isn't on the path to the intro window showing up
+            from gui import TutorWindow
+
             difficulty = self.difficulty_combo.currentText().lower()
-            self.quiz_window = TutorWindow(topic=topic, difficulty=difficulty)
+            self.quiz_window = TutorWindow(topic=topics[0], difficulty=difficulty, topics=topics[1:],
+                                           max_questions=int(self.length_combo.currentText()))
             self.quiz_window.show()
             self.close()
         # Otherwise, show warning to enter a topic
@@ -1,9 +1,48 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
 from intro_gui import IntroWindow
 from PyQt6.QtWidgets import QApplication
-import sys
+import qasync
+import prompts
+import question_pack
+import session_log
+import telemetry
+import tutor_ai
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=tutor_ai.MODEL_BACKEND,
+                        help="gemini, synthetic, record:PATH or replay:PATH (see model_backends.py)")
+    parser.add_argument("--log-level", default=os.environ.get("PAST_LOG_LEVEL", "WARNING"),
+                        help="DEBUG also prints every prompt sent to the model")
+    parser.add_argument("--speculate", choices=tutor_ai.SPECULATE_POLICIES, default=tutor_ai.SPECULATE,
+                        help="generate hints along with questions: always, for hard ones, or when a miss is likely")
+    parser.add_argument("--prompts", choices=sorted(prompts.TEMPLATES), default=prompts.VERSION,
+                        help="prompt version: v2 (compact, the default) or v1 (the original prompts)")
+    parser.add_argument("--token-budget", type=int, default=tutor_ai.TOKEN_BUDGET,
+                        help="tokens a quiz may spend on the model before it stops asking")
+    parser.add_argument("--pack", default=question_pack.PACK_PATH,
+                        help="ask questions from this question pack first (see question_pack.py), for offline use")
+    parser.add_argument("--session-log", default=session_log.RECORD_PATH,
+                        help="record each quiz (questions, answers, hints, model call times) to this file")
+    args, qt_args = parser.parse_known_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    telemetry.configure_from_env()
+    tutor_ai.MODEL_BACKEND = args.backend
+    tutor_ai.SPECULATE = args.speculate
+    prompts.VERSION = args.prompts
+    tutor_ai.TOKEN_BUDGET = args.token_budget
+    question_pack.PACK_PATH = args.pack
+    session_log.RECORD_PATH = args.session_log
+    app = QApplication(sys.argv[:1] + qt_args)
+    # Qt's event loop doubles as the asyncio loop the quiz window's model work runs on (see gui.py)
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
     window = IntroWindow()
     window.show()
-    sys.exit(app.exec())
+    with loop:
+        sys.exit(loop.run_forever())
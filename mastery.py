@@ -0,0 +1,62 @@
+# how well a student knows each topic, and so how hard their next question should be
+# a one-parameter IRT (Rasch) model kept up to date Elo-style: every difficulty level has a fixed
+# difficulty b on the logit scale, the student has an ability theta per topic, the chance they get a
+# question right is 1 / (1 + e^-(theta - b)), and after each question theta moves by k * (result - expected)
+# with k shrinking as answers pile up; the next question goes to whichever level the student should get
+# right about TARGET of the time (hard enough to learn something, easy enough not to give up)
+import math
+
+LEVELS = ("easy", "moderate", "hard")
+LEVEL_DIFFICULTY = {"easy": -1.0, "moderate": 0.0, "hard": 1.0}
+# what other parts of the app (and older saved data) have called the levels
+ALIASES = {"medium": "moderate", "normal": "moderate", "intermediate": "moderate", "beginner": "easy",
+           "difficult": "hard", "advanced": "hard"}
+TARGET = 0.7
+
+
+def normalize_difficulty(level):
+    level = (level or "").strip().lower()
+    level = ALIASES.get(level, level)
+    return level if level in LEVEL_DIFFICULTY else "easy"
+
+
+def expected(theta, level):
+    return 1.0 / (1.0 + math.exp(-(theta - LEVEL_DIFFICULTY[level])))
+
+
+class Mastery:
+    def __init__(self, start_level="easy", target=TARGET, k=1.6, min_k=0.6):
+        self.start_level = normalize_difficulty(start_level)
+        self.target = target
+        self.k = k
+        self.min_k = min_k
+        self.topics = {}  # topic -> [theta, questions answered]
+
+    def _initial(self):
+        # a new student sits where the level they picked is the right one for them
+        return LEVEL_DIFFICULTY[self.start_level] + math.log(self.target / (1 - self.target))
+
+    def ability(self, topic):
+        return self.topics.get(topic, (self._initial(), 0))[0]
+
+    def answered(self, topic):
+        return self.topics.get(topic, (0.0, 0))[1]
+
+    def _updated(self, topic, level, correct):
+        theta, answered = self.topics.get(topic, (self._initial(), 0))
+        k = max(self.min_k, self.k / math.sqrt(answered + 1))
+        return theta + k * ((1.0 if correct else 0.0) - expected(theta, normalize_difficulty(level))), answered + 1
+
+    def update(self, topic, level, correct):
+        self.topics[topic] = list(self._updated(topic, level, correct))
+        return self.topics[topic][0]
+
+    def level_for(self, topic, theta=None):
+        theta = self.ability(topic) if theta is None else theta
+        return min(LEVELS, key=lambda level: abs(expected(theta, level) - self.target))
+
+    def to_state(self):
+        return {topic: [round(theta, 4), answered] for topic, (theta, answered) in self.topics.items()}
+
+    def load_state(self, state):
+        self.topics = {topic: [theta, answered] for topic, (theta, answered) in state.items()}
@@ -0,0 +1,263 @@
+# stand-ins for the Gemini model object, so the app, tests and benchmarks can run without the network
+#   record:PATH  wraps the real model and appends every prompt/reply pair to PATH (jsonl)
+#   replay:PATH  answers from a recording, the same way every run, with simulated latency
+#   synthetic    makes up varied questions quickly, some drifting from the format and some broken
+#   gemini       the real thing
+# every backend looks like a google.generativeai GenerativeModel as far as GeminiClient is concerned:
+# generate_content(prompt, stream=False, generation_config=None) and the async version
+# pick one with PAST_MODEL_BACKEND=replay:recordings.jsonl (or python main.py --backend ...)
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from fake_model import FakeModel, FakeResponse
+
+KINDS = (
+    ("batch", re.compile(r"Generate \d+ different multiple-choice quiz questions")),
+    ("question", re.compile(r"multiple-choice quiz question")),
+    ("hint", re.compile(r"^Provide a helpful hint")),
+    ("follow_up", re.compile(r"^A student asked")),
+)
+
+
+def prompt_kind(prompt):
+    for kind, pattern in KINDS:
+        if pattern.search(prompt.strip()):
+            return kind
+    return "other"
+
+
+def _wants_json(generation_config):
+    return bool(generation_config) and dict(generation_config).get('response_mime_type') == "application/json"
+
+
+class RecordingModel:
+    # passes every call through to the real model and writes down what came back
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _write(self, prompt, generation_config, text, started):
+        record = {'kind': prompt_kind(prompt), 'json': _wants_json(generation_config), 'prompt': prompt,
+                  'response': text, 'latency': round(time.monotonic() - started, 3)}
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        started = time.monotonic()
+        response = self.inner.generate_content(prompt, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream(response, prompt, kwargs.get('generation_config'), started)
+        self._write(prompt, kwargs.get('generation_config'), response.text, started)
+        return response
+
+    def _record_stream(self, chunks, prompt, generation_config, started):
+        parts = []
+        for chunk in chunks:
+            parts.append(getattr(chunk, 'text', ""))
+            yield chunk
+        self._write(prompt, generation_config, "".join(parts), started)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        started = time.monotonic()
+        if not hasattr(self.inner, 'generate_content_async'):
+            response = await asyncio.to_thread(self.inner.generate_content, prompt, stream=stream, **kwargs)
+            if stream:
+                return self._record_stream(response, prompt, kwargs.get('generation_config'), started)
+        else:
+            response = await self.inner.generate_content_async(prompt, stream=stream, **kwargs)
+            if stream:
+                return self._record_stream_async(response, prompt, kwargs.get('generation_config'), started)
+        self._write(prompt, kwargs.get('generation_config'), response.text, started)
+        return response
+
+    async def _record_stream_async(self, chunks, prompt, generation_config, started):
+        parts = []
+        async for chunk in chunks:
+            parts.append(getattr(chunk, 'text', ""))
+            yield chunk
+        self._write(prompt, generation_config, "".join(parts), started)
+
+
+class ReplayModel:
+    # serves recorded replies: the exact prompt if it was recorded, otherwise the next recording of the same
+    # kind (question, batch, hint, ...) in file order, so a run is the same every time
+    # latency=None sleeps as long as the real call took (times speed), a number sleeps that long instead
+    def __init__(self, path, latency=None, speed=1.0, chunk_size=24):
+        self.latency = latency
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.by_prompt = {}
+        self.by_kind = {}
+        self.records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.records.append(record)
+                    self.by_prompt.setdefault((record['prompt'], record['json']), []).append(record)
+                    self.by_kind.setdefault((record['kind'], record['json']), []).append(record)
+        if not self.records:
+            raise ValueError(f"no recordings in {path}")
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _next(self, key, records):
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        return records[position % len(records)]
+
+    def _pick(self, prompt, generation_config):
+        as_json = _wants_json(generation_config)
+        with self.lock:
+            self.calls += 1
+            if (prompt, as_json) in self.by_prompt:
+                return self._next(("prompt", prompt, as_json), self.by_prompt[(prompt, as_json)])
+            kind = prompt_kind(prompt)
+            for key in ((kind, as_json), (kind, not as_json)):
+                if key in self.by_kind:
+                    return self._next(("kind",) + key, self.by_kind[key])
+            return self._next(("any",), self.records)
+
+    def _delay(self, record):
+        return (record['latency'] * self.speed) if self.latency is None else self.latency
+
+    def _pieces(self, text):
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        record = self._pick(prompt, kwargs.get('generation_config'))
+        if stream:
+            return self._stream(record)
+        time.sleep(self._delay(record))
+        return FakeResponse(record['response'])
+
+    def _stream(self, record):
+        pieces = self._pieces(record['response'])
+        time.sleep(self._delay(record) * 0.25)
+        for piece in pieces:
+            yield FakeResponse(piece)
+            time.sleep(self._delay(record) * 0.75 / len(pieces))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        record = self._pick(prompt, kwargs.get('generation_config'))
+        if stream:
+            return self._stream_async(record)
+        await asyncio.sleep(self._delay(record))
+        return FakeResponse(record['response'])
+
+    async def _stream_async(self, record):
+        pieces = self._pieces(record['response'])
+        await asyncio.sleep(self._delay(record) * 0.25)
+        for piece in pieces:
+            yield FakeResponse(piece)
+            await asyncio.sleep(self._delay(record) * 0.75 / len(pieces))
+
+
+class SyntheticModel(FakeModel):
+    # FakeModel's questions, except drift_rate of them come back in the formats Gemini drifts into,
+    # malformed_rate of them are broken (missing choices, no answer, cut off, bad json)
+    # and repeat_rate of them are a question it already gave out (to exercise dedup)
+    def __init__(self, latency=0.0, malformed_rate=0.1, drift_rate=0.3, repeat_rate=0.0, seed=None, **kwargs):
+        super().__init__(latency=latency, seed=seed, **kwargs)
+        self.malformed_rate = malformed_rate
+        self.drift_rate = drift_rate
+        self.repeat_rate = repeat_rate
+        self.shape_rng = random.Random(seed)
+        self.malformed = 0
+        self.repeated = 0
+
+    def _maybe_repeat(self, number):
+        with self.lock:
+            if number > 1 and self.shape_rng.random() < self.repeat_rate:
+                self.repeated += 1
+                return self.shape_rng.randrange(1, number)
+        return number
+
+    def _shape(self):
+        with self.lock:
+            roll = self.shape_rng.random()
+            if roll < self.malformed_rate:
+                self.malformed += 1
+                return "broken", self.shape_rng.randrange(4)
+            return ("drift" if roll < self.malformed_rate + self.drift_rate else "clean"), self.shape_rng.randrange(4)
+
+    def question_json(self, number):
+        data = super().question_json(self._maybe_repeat(number))
+        shape, variant = self._shape()
+        if shape == "drift":
+            data['choices'] = [f"{letter}. {c}" for letter, c in zip("ABCD", data['choices'])]
+        elif shape == "broken":
+            if variant == 0:
+                data['choices'] = data['choices'][:3]
+            elif variant == 1:
+                del data['answer']
+            elif variant == 2:
+                data['answer'] = "E"
+            else:
+                data['explanation'] = ""
+        return data
+
+    def question_text(self, number):
+        data = super().question_json(self._maybe_repeat(number))
+        shape, variant = self._shape()
+        labels = ["{}. ", "{}) ", "({}) ", "{}. "][variant] if shape == "drift" else "{}. "
+        choices = [labels.format(letter) + c for letter, c in zip("ABCD", data['choices'])]
+        answer = f"**Answer:** {data['answer']}" if shape == "drift" else f"Answer: {data['answer']}"
+        lines = [data['question'], *choices, answer, f"Explanation: {data['explanation']}"]
+        if shape == "broken":
+            if variant == 0:
+                del lines[3:5]  # two choices missing
+            elif variant == 1:
+                del lines[5]  # no answer line
+            elif variant == 2:
+                lines = lines[:3]  # reply cut off
+            else:
+                lines[5] = "Answer: the second one"
+        return "\n".join(lines)
+
+
+def create(spec, gemini_factory, latency=None):
+    # spec is "gemini", "synthetic", "record:PATH" or "replay:PATH"
+    name, _, path = spec.partition(":")
+    if name == "gemini":
+        return gemini_factory()
+    if name == "synthetic":
+        return SyntheticModel(latency=latency or 0.0)
+    if name == "record":
+        return RecordingModel(gemini_factory(), path or "recordings.jsonl")
+    if name == "replay":
+        return ReplayModel(path or "recordings.jsonl", latency=latency)
+    raise ValueError(f"unknown model backend {spec!r} (use gemini, synthetic, record:PATH or replay:PATH)")
+
+
+def main():
+    # records a few real sessions' worth of questions and hints for replay later
+    parser = argparse.ArgumentParser(description="Record real Gemini replies for offline replay.")
+    parser.add_argument("topics", nargs="+")
+    parser.add_argument("--out", default="recordings.jsonl")
+    parser.add_argument("--difficulty", default="easy")
+    parser.add_argument("--questions", type=int, default=5, help="questions per topic")
+    args = parser.parse_args()
+
+    import tutor_ai
+
+    tutor_ai.model = RecordingModel(tutor_ai._build_gemini_model(), args.out)
+    for topic in args.topics:
+        session = tutor_ai.QuizSession(topic, args.difficulty, batch=True)
+        session.max_questions = args.questions
+        while not session.is_finished() and session.next_question():
+            session.get_hint()
+        print(f"{topic}: recorded {session.total_questions} questions")
+    print(f"saved to {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# near-duplicate question detection so reworded repeats get caught, not just byte-identical ones
+# each question stem becomes a set of word shingles, MinHash squeezes that into a short signature,
+# and LSH banding means a lookup only scores a handful of candidates instead of every seen question
+# a question with the same set of choices as a stored one is always a candidate too, however its stem was reworded,
+# though the shared choices only count when the stems are somewhat alike as well
+import hashlib
+import random
+import re
+import threading
+from functools import lru_cache
+
+_PRIME = (1 << 61) - 1
+_STOP_WORDS = {
+    "a", "an", "the", "of", "is", "are", "was", "be", "by", "as", "on", "in", "to", "for", "and", "or", "it",
+    "that", "this", "with", "which", "what", "following", "does", "do", "known", "called", "commonly",
+}
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split())
+
+
+def shingles(question_text):
+    words = [w for w in _normalize(question_text).split() if w not in _STOP_WORDS]
+    result = set(words)
+    result.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return result
+
+
+def _jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+# stems less alike than this get no lift from shared choices: one set of options (the organelles, say)
+# can go with quite different questions
+CHOICE_STEM_FLOOR = 0.3
+
+
+def similarity(stem_a, choices_a, stem_b, choices_b):
+    score = _jaccard(stem_a, stem_b)
+    if choices_a and choices_b and score >= CHOICE_STEM_FLOOR:
+        # the same four options in any order on top of a similar stem is a strong sign it's the same question reworded
+        score = max(score, (score + _jaccard(choices_a, choices_b)) / 2)
+    return score
+
+
+def _shingle_hash(shingle):
+    # not hash(): that's salted per process, so which questions collide would change from run to run
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=6).digest(), "big")
+
+
+def _choice_key(choices):
+    return frozenset(choices) if len(choices) > 1 else None
+
+
+@lru_cache(maxsize=None)
+def _permutations(seed, num_perm):
+    rng = random.Random(seed)
+    return tuple((rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm))
+
+
+# the server rebuilds an index per request from the same shared questions, so signatures are cached by text
+@lru_cache(maxsize=8192)
+def _minhash(question_text, perms):
+    shingle_set = frozenset(shingles(question_text))
+    hashes = [_shingle_hash(s) for s in shingle_set] or [0]
+    return shingle_set, tuple(min([(a * h + b) % _PRIME for h in hashes]) for a, b in perms)
+
+
+class NearDuplicateIndex:
+    # max_entries bounds memory in long sessions: past it the oldest questions drop out of the index
+    # (exact repeats of those are still caught by seen_questions.SeenQuestions)
+    def __init__(self, threshold=0.45, num_perm=32, bands=16, seed=7, max_entries=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.perms = _permutations(seed, num_perm)
+        self.buckets = [{} for _ in range(bands)]
+        self.by_choices = {}  # set of normalized choices -> question texts with exactly those choices
+        self.entries = {}  # question text -> (stem shingles, normalized choices)
+        self.lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [tuple(signature[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def add(self, question_text, choices=()):
+        if question_text in self.entries:
+            return
+        shingle_set, signature = _minhash(question_text, self.perms)
+        keys = self._band_keys(signature)
+        with self.lock:
+            if question_text in self.entries:
+                return
+            choice_set = {_normalize(c) for c in choices}
+            self.entries[question_text] = (shingle_set, choice_set)
+            for bucket, key in zip(self.buckets, keys):
+                bucket.setdefault(key, []).append(question_text)
+            choice_key = _choice_key(choice_set)
+            if choice_key is not None:
+                self.by_choices.setdefault(choice_key, []).append(question_text)
+            if self.max_entries is not None and len(self.entries) > self.max_entries:
+                self._evict(next(iter(self.entries)))
+
+    def _evict(self, question_text):
+        _, choice_set = self.entries.pop(question_text)
+        _, signature = _minhash(question_text, self.perms)
+        keyed = list(zip(self.buckets, self._band_keys(signature)))
+        choice_key = _choice_key(choice_set)
+        if choice_key is not None:
+            keyed.append((self.by_choices, choice_key))
+        for bucket, key in keyed:
+            texts = bucket.get(key)
+            if texts is not None:
+                texts.remove(question_text)
+                if not texts:
+                    del bucket[key]
+
+    def _candidates(self, signature, choice_set=()):
+        keys = self._band_keys(signature)
+        choice_key = _choice_key(choice_set)
+        with self.lock:
+            found = set()
+            for bucket, key in zip(self.buckets, keys):
+                found.update(bucket.get(key, ()))
+            if choice_key is not None:
+                found.update(self.by_choices.get(choice_key, ()))
+            return [(text, self.entries[text]) for text in found]
+
+    def nearest(self, question_text, choices=(), k=3):
+        # closest stored questions, best first, as (text, similarity between 0 and 1)
+        shingle_set, signature = _minhash(question_text, self.perms)
+        choice_set = {_normalize(c) for c in choices}
+        scored = []
+        for text, (other_stem, other_choices) in self._candidates(signature, choice_set):
+            scored.append((text, similarity(shingle_set, choice_set, other_stem, other_choices)))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:k]
+
+    def find(self, question_text, choices=()):
+        # the stored question this one is a (near) repeat of, or None
+        if question_text in self.entries:
+            return question_text
+        best = self.nearest(question_text, choices, k=1)
+        if best and best[0][1] >= self.threshold:
+            return best[0][0]
+        return None
+
+    def __contains__(self, question_text):
+        return self.find(question_text) is not None
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,272 @@
+# every prompt the app sends, versioned, plus what they cost in tokens
+#   v1  the original prompts: the whole instruction block, rules and a worked example in every request
+#   v2  compact: the standing instructions (who the model is, one right answer out of four, don't give the
+#       answer away) go on the model once as its system instruction, requests carry only what changes, a
+#       format skeleton replaces the worked example, and hints and follow-ups get the question and its
+#       options so the model doesn't have to guess what the student is looking at
+# templates are parsed once at import into literal/field pieces and the static rule blocks are assembled
+# once per combination, so building a prompt is a join; each template's fixed text is counted with
+# estimate_tokens at import (measure() recounts them with the model's own count_tokens when there is one)
+# token budgets: a TokenBudget made current with charging() gets every model call made inside it (the
+# contextvar follows the call onto GeminiClient's loop thread) and GeminiClient refuses new calls once it's spent
+import contextlib
+import contextvars
+import os
+import re
+import threading
+from functools import lru_cache
+from string import Formatter
+
+from question_format import LETTERS
+
+# PAST_PROMPTS=v1 goes back to the original prompts (main.py / quiz_server.py --prompts too)
+VERSION = os.environ.get("PAST_PROMPTS", "v2")
+
+SYSTEM_INSTRUCTIONS = {
+    "v1": None,
+    "v2": "You are an expert tutor. Your quiz questions are accurate, with four options (A-D) and one right "
+          "answer. Never tell a student the answer; be brief and friendly.",
+}
+
+TEXTS = {
+    "v1": {
+        "question": """
+You are an expert tutor. Generate one unique multiple-choice quiz question on the topic: "{topic}"
+
+Requirements:
+- Ask a clear, academically accurate question.
+{rules}{exclusions}
+{example}
+The difficulty level should be {level}
+""",
+        "batch": """
+You are an expert tutor. Generate {count} different multiple-choice quiz questions on the topic: "{topic}"
+
+Requirements:
+- Every question must test a different idea; no two questions may ask the same thing.
+- Ask clear, academically accurate questions.
+{rules}{exclusions}
+{example}
+The difficulty level should be {level}
+""",
+        "level.easy": "on a general knowledge topic for beginners.",
+        "level.moderate": "that requires some critical thinking or background knowledge.",
+        "level.hard": "that is challenging and requires higher-level reasoning.",
+        "level.mixed": "as follows, in this order: {levels}.",
+        "text_rules": """- Provide four answer options labeled A, B, C, and D.
+- Only one answer should be correct.
+- Clearly label the correct answer with: Answer: [Correct Letter]
+- Also include a brief explanation after the answer, clearly labeled: Explanation: [your explanation here]
+""",
+        "json_rules": """- Reply in JSON: "question" is the question, "choices" the four answer options (no A/B/C/D labels),
+  "answer" the letter of the correct option and "explanation" a brief explanation.
+- Only one answer should be correct.
+""",
+        "text_extras": """- After the explanation give a hint that points the way without giving the answer away: Hint: [hint]
+- Then one line for each wrong option saying in a sentence why it's wrong: Why not [Letter]: [reason]
+""",
+        "json_extras": """- "hint" is a hint that points the way without giving the answer away, and "why_wrong" has one short
+  sentence per option, in order, saying why it's wrong ("" for the correct one).
+""",
+        "batch_json": "- Reply with a JSON array holding one object per question.\n",
+        "batch_text": "- Put a line containing only --- between questions.\n",
+        "example": """Example:
+What does CPU stand for?
+A. Central Processing Unit
+B. Computer Program Utility
+C. Central Power Unit
+D. Computer Performance Unit
+Answer: A
+Explanation: The CPU, or Central Processing Unit, is the primary component of a computer that performs most of the processing inside a computer.
+""",
+        "batch_example": """Example:
+Question 1: What does CPU stand for?
+A. Central Processing Unit
+B. Computer Program Utility
+C. Central Power Unit
+D. Computer Performance Unit
+Answer: A
+Explanation: The CPU, or Central Processing Unit, is the primary component of a computer that performs most of the processing inside a computer.
+---
+Question 2: ...
+""",
+        "exclusions": "- Do not repeat or reword any of these questions:\n{listed}\n",
+        "exclusion": "  - {text}",
+        "batch_exclusion": "- {text}",
+        # v1 hints were asked about the explanation, which is all the old code had to hand
+        "hint": "Provide a helpful hint for this quiz question without revealing the answer: {explanation}",
+        "follow_up": "A student asked: '{prompt}'.\n{context}Please provide a helpful explanation or clarification, "
+                     "without revealing the quiz answer directly. Keep the tone friendly and educational.",
+        "follow_up_context": "They are working on this quiz question: {question}\n",
+        "follow_up_last": "",
+    },
+    "v2": {
+        "question": 'Generate one multiple-choice quiz question on "{topic}", {level}\n{rules}{exclusions}',
+        "batch": 'Generate {count} different multiple-choice quiz questions on "{topic}", {level}\n{rules}{exclusions}',
+        "level.easy": "for beginners.",
+        "level.moderate": "needing some critical thinking.",
+        "level.hard": "needing higher-level reasoning.",
+        "level.mixed": "in this order: {levels}.",
+        "text_rules": "Reply in this format:\n[question]\nA. [option]\nB. [option]\nC. [option]\nD. [option]\n"
+                      "Answer: [letter]\nExplanation: [brief]\n",
+        "json_rules": "JSON: question, choices (4, no letters), answer (letter), explanation (brief).\n",
+        "text_extras": "Hint: [a nudge, not the answer]\nWhy not [Letter]: [one sentence], per wrong option\n",
+        "json_extras": "Add hint (a nudge, not the answer) and why_wrong (per option, one sentence on why it's wrong; "
+                       "\"\" for the right one).\n",
+        "batch_json": "A JSON array, one object per question, each on a different idea.\n",
+        "batch_text": "Each on a different idea; a line with only --- between questions.\n",
+        "example": "",
+        "batch_example": "",
+        "exclusions": "Not these or rewordings of them:\n{listed}\n",
+        "exclusion": "- {text}",
+        "batch_exclusion": "- {text}",
+        "hint": "Provide a helpful hint for this question:\n{question}\n{options}",
+        "follow_up": "A student asked: '{prompt}'\n{context}Explain or clarify in a few sentences.",
+        "follow_up_context": "About this question:\n{question}\n{options}\n{last}",
+        "follow_up_last": "Their last answer, {letter}, was wrong.\n",
+    },
+}
+
+_PIECES = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text):
+    # close to what Gemini's tokenizer gives for English: a word of up to four letters is one token and longer
+    # ones about one per four letters, every digit and punctuation mark one; good enough to compare prompts
+    return sum(1 + (len(piece) - 1) // 4 if piece[0].isalpha() else 1 for piece in _PIECES.findall(text))
+
+
+class PromptTemplate:
+    __slots__ = ("name", "version", "text", "parts", "fields", "tokens")
+
+    def __init__(self, name, version, text):
+        self.name = name
+        self.version = version
+        self.text = text
+        # (literal text, field name or None), parsed once instead of on every format() call
+        self.parts = [(literal, field) for literal, field, _, _ in Formatter().parse(text)]
+        self.fields = {field for _, field in self.parts if field}
+        self.tokens = estimate_tokens("".join(literal for literal, _ in self.parts))
+
+    def render(self, fields):
+        # fields the template doesn't use are ignored, so one set of fields serves every version
+        return "".join(literal + (str(fields[field]) if field else "") for literal, field in self.parts)
+
+
+TEMPLATES = {version: {name: PromptTemplate(name, version, text) for name, text in texts.items()}
+             for version, texts in TEXTS.items()}
+SYSTEM_TOKENS = {version: estimate_tokens(text or "") for version, text in SYSTEM_INSTRUCTIONS.items()}
+
+
+def template(name, version=None):
+    return TEMPLATES[version or VERSION][name]
+
+
+def render(name, version=None, **fields):
+    return template(name, version).render(fields)
+
+
+def system_instruction(version=None):
+    return SYSTEM_INSTRUCTIONS[version or VERSION]
+
+
+@lru_cache(maxsize=None)
+def rules(version, structured, extras=False, batch=False):
+    # the reply-format block; only eight of these exist per version, so each is built once
+    texts = TEXTS[version]
+    if structured:
+        block = (texts["batch_json"] if batch else "") + texts["json_rules"]
+        return block + (texts["json_extras"] if extras else "")
+    block = texts["text_rules"] + (texts["text_extras"] if extras else "")
+    return block + (texts["batch_text"] if batch else "")
+
+
+def options(choices):
+    return "\n".join(f"{letter}. {choice}" for letter, choice in zip(LETTERS, choices))
+
+
+def call_tokens(prompt, version=None):
+    # what a request costs on the way in: the prompt plus the system instruction that rides along with it
+    return estimate_tokens(prompt) + SYSTEM_TOKENS[version or VERSION]
+
+
+def measure(counter=estimate_tokens, version=None):
+    # fixed tokens of every template ({name: tokens}), counted with counter (e.g. the model's count_tokens)
+    version = version or VERSION
+    counts = {name: counter("".join(literal for literal, _ in t.parts)) if t.text.strip() else 0
+              for name, t in TEMPLATES[version].items()}
+    counts["system"] = counter(SYSTEM_INSTRUCTIONS[version]) if SYSTEM_INSTRUCTIONS[version] else 0
+    return counts
+
+
+class TokenBudget:
+    # the tokens one session has spent on the model; with a limit, GeminiClient refuses new calls made under
+    # it once the limit is reached (the call in flight when it runs out still finishes, so it can go a bit over)
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.calls = 0
+        self.refused = 0
+        self.lock = threading.Lock()
+
+    @property
+    def spent(self):
+        return self.prompt_tokens + self.response_tokens
+
+    def remaining(self):
+        return None if self.limit is None else max(0, self.limit - self.spent)
+
+    def exhausted(self):
+        return self.limit is not None and self.spent >= self.limit
+
+    def charge(self, prompt_tokens, response_tokens):
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.response_tokens += response_tokens
+            self.calls += 1
+
+    def refuse(self):
+        with self.lock:
+            self.refused += 1
+
+    def report(self):
+        return {'limit': self.limit, 'spent': self.spent, 'remaining': self.remaining(),
+                'prompt_tokens': self.prompt_tokens, 'response_tokens': self.response_tokens, 'calls': self.calls,
+                'tokens_per_call': round(self.spent / self.calls, 1) if self.calls else 0.0, 'refused': self.refused}
+
+    def to_state(self):
+        return [self.limit, self.prompt_tokens, self.response_tokens, self.calls, self.refused]
+
+    def load_state(self, state):
+        self.limit, self.prompt_tokens, self.response_tokens, self.calls, self.refused = state
+
+
+_budget = contextvars.ContextVar("token_budget", default=None)
+
+
+@contextlib.contextmanager
+def charging(budget):
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        try:
+            _budget.reset(token)
+        except ValueError:
+            pass  # closed from another context (a stream finished elsewhere); nothing to undo there
+
+
+def current_budget():
+    return _budget.get()
+
+
+def charge(prompt, reply, usage=None):
+    # the model's own counts when the response has them, estimates otherwise (fake models); a stream the caller
+    # walks away from isn't charged
+    budget = _budget.get()
+    if budget is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0) or call_tokens(prompt)
+    response_tokens = getattr(usage, 'candidates_token_count', 0) or estimate_tokens(reply)
+    budget.charge(prompt_tokens, response_tokens)
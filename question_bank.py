@@ -0,0 +1,220 @@
+# local on-disk question bank so popular topics don't need a fresh Gemini call every time
+# questions are keyed by normalized topic + difficulty ("medium" and "moderate" are one shelf, like everywhere
+# else), and old / unused ones get evicted
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from mastery import normalize_difficulty
+
+DEFAULT_PATH = os.environ.get(
+    "PAST_QUESTION_BANK", os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_bank.db")
+)
+# rows read per step when picking questions
+TAKE_CHUNK = 32
+LAST_ID = (1 << 63) - 1  # the largest id sqlite hands out
+
+
+def normalize_topic(topic):
+    # "  U.S. History " and "u.s. history" should land on the same shelf
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", topic.lower()).split())
+
+
+class QuestionBank:
+    def __init__(self, path=DEFAULT_PATH, max_questions=20000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_questions = max_questions
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # the prefetch workers share this connection, the lock keeps them from stepping on each other
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                topic_key TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question_text TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                UNIQUE (topic_key, difficulty, question_text)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_topic ON questions (topic_key, difficulty)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON questions (last_used_at)")
+        self._normalize_difficulties()
+        self.conn.commit()
+
+    def _normalize_difficulties(self):
+        # banks filled before difficulties were normalized have e.g. "medium" rows nothing asks for any more
+        for (stored,) in self.conn.execute("SELECT DISTINCT difficulty FROM questions").fetchall():
+            level = normalize_difficulty(stored)
+            if level != stored:
+                self.conn.execute("UPDATE OR IGNORE questions SET difficulty = ? WHERE difficulty = ?", (level, stored))
+                self.conn.execute("DELETE FROM questions WHERE difficulty = ?", (stored,))
+
+    def take(self, topic, difficulty, seen_questions=(), count=1):
+        # hands back up to `count` stored questions the student hasn't seen yet
+        # starts at a random row of the shelf and reads on from there a chunk at a time (wrapping round once), so
+        # a pick reads about as many rows as it has to skip, however big the shelf is
+        shelf = (normalize_topic(topic), normalize_difficulty(difficulty))
+        cutoff = time.time() - self.ttl_seconds
+        picked = []
+        with self.lock:
+            size = self.conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE topic_key = ? AND difficulty = ?", shelf
+            ).fetchone()[0]
+            if size:
+                # by position in the shelf, not a random id: other shelves' rows sit between its ids, and the row
+                # after a long gap would get picked far more often (both queries only walk the index)
+                pivot = self.conn.execute(
+                    "SELECT id FROM questions WHERE topic_key = ? AND difficulty = ? ORDER BY id LIMIT 1 OFFSET ?",
+                    (*shelf, random.randrange(size)),
+                ).fetchone()[0]
+                for after, last in ((pivot - 1, LAST_ID), (0, pivot - 1)):
+                    while len(picked) < count:
+                        rows = self.conn.execute(
+                            "SELECT id, question_text, data FROM questions WHERE topic_key = ? AND difficulty = ? "
+                            "AND id > ? AND id <= ? AND created_at > ? ORDER BY id LIMIT ?",
+                            (*shelf, after, last, cutoff, TAKE_CHUNK),
+                        ).fetchall()
+                        picked.extend((row_id, data) for row_id, text, data in rows if text not in seen_questions)
+                        if len(rows) < TAKE_CHUNK:
+                            break
+                        after = rows[-1][0]
+                picked = picked[:count]
+            if picked:
+                self.conn.executemany(
+                    "UPDATE questions SET last_used_at = ? WHERE id = ?",
+                    [(time.time(), row_id) for row_id, _ in picked],
+                )
+                self.conn.commit()
+            self.hits += len(picked)
+            self.misses += count - len(picked)
+        return [json.loads(data) for _, data in picked]
+
+    def add(self, topic, difficulty, questions):
+        now = time.time()
+        difficulty = normalize_difficulty(difficulty)
+        rows = [
+            (normalize_topic(topic), difficulty, q['question_text'], json.dumps(q), now, now)
+            for q in questions
+        ]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO questions "
+                "(topic_key, difficulty, question_text, data, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # drop anything past its TTL, then the least recently used rows until we're under the cap
+        self.conn.execute("DELETE FROM questions WHERE created_at <= ?", (time.time() - self.ttl_seconds,))
+        (total,) = self.conn.execute("SELECT COUNT(*) FROM questions").fetchone()
+        if total > self.max_questions:
+            self.conn.execute(
+                "DELETE FROM questions WHERE id IN "
+                "(SELECT id FROM questions ORDER BY last_used_at ASC LIMIT ?)",
+                (total - self.max_questions,),
+            )
+
+    def count(self, topic=None, difficulty=None):
+        with self.lock:
+            if topic is None:
+                return self.conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE topic_key = ? AND difficulty = ?",
+                (normalize_topic(topic), normalize_difficulty(difficulty)),
+            ).fetchone()[0]
+
+    def question_texts(self, topic, difficulty):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT question_text FROM questions WHERE topic_key = ? AND difficulty = ?",
+                (normalize_topic(topic), normalize_difficulty(difficulty)),
+            ).fetchall()
+        return {text for (text,) in rows}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'questions': self.count(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM questions")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def warm(bank, topics, difficulties, per_topic):
+    # imported here so `stats` / `clear` don't pay for loading the Gemini client
+    from tutor_ai import MAX_BATCH, generate_quiz_batch
+
+    for topic in topics:
+        for difficulty in map(normalize_difficulty, difficulties):
+            have = start = bank.count(topic, difficulty)
+            if have >= per_topic:
+                print(f"{topic} ({difficulty}): already has {have} questions")
+                continue
+            # a batch at a time, like a session asks for them; stops early if the model has nothing new to give
+            while have < per_topic:
+                questions = generate_quiz_batch(topic, min(per_topic - have, MAX_BATCH), difficulty,
+                                                bank.question_texts(topic, difficulty))
+                bank.add(topic, difficulty, questions)
+                added = bank.count(topic, difficulty) - have
+                have += added
+                if not added:
+                    break
+            print(f"{topic} ({difficulty}): added {have - start} questions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local question bank.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm_cmd = sub.add_parser("warm", help="pre-generate questions for a list of topics")
+    warm_cmd.add_argument("topics", nargs="+")
+    warm_cmd.add_argument("--difficulty", nargs="+", default=["easy", "moderate", "hard"])
+    warm_cmd.add_argument("--count", type=int, default=10, help="questions to keep per topic and difficulty")
+    export_cmd = sub.add_parser("export", help="write the stored questions to a question pack (question_pack.py)")
+    export_cmd.add_argument("out")
+    export_cmd.add_argument("--topics", nargs="+", help="only these topics")
+    sub.add_parser("stats", help="show how many questions are stored")
+    sub.add_parser("clear", help="delete every stored question")
+    args = parser.parse_args()
+
+    bank = QuestionBank(args.path)
+    if args.command == "warm":
+        warm(bank, args.topics, args.difficulty, args.count)
+    elif args.command == "export":
+        # imported here, question_pack imports this module
+        from question_pack import export
+
+        print(f"wrote {export(bank, args.out, args.topics)} questions to {args.out}")
+    elif args.command == "clear":
+        bank.clear()
+    print(bank.stats())
+    bank.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# the shape of a quiz question (and of an answer to one) and how we get one out of a model reply
+# with structured output the model answers in JSON that matches QUESTION_SCHEMA (or BATCH_SCHEMA);
+# anything else goes through the text parser, which copes with the usual drift ("A)" choices,
+# stems over several lines, "**Answer:** B") instead of quietly producing a broken question
+import json
+import re
+from dataclasses import dataclass
+
+LETTERS = ("A", "B", "C", "D")
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "choices": {"type": "array", "items": {"type": "string"}},
+        "answer": {"type": "string", "enum": list(LETTERS)},
+        "explanation": {"type": "string"},
+    },
+    "required": ["question", "choices", "answer", "explanation"],
+}
+
+BATCH_SCHEMA = {"type": "array", "items": QUESTION_SCHEMA}
+
+# the same, plus the hint and a line per wrong choice on why it's wrong, asked for up front (speculative mode)
+QUESTION_EXTRAS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **QUESTION_SCHEMA["properties"],
+        "hint": {"type": "string"},
+        "why_wrong": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": QUESTION_SCHEMA["required"] + ["hint", "why_wrong"],
+}
+
+BATCH_EXTRAS_SCHEMA = {"type": "array", "items": QUESTION_EXTRAS_SCHEMA}
+
+
+def json_config(schema):
+    # the generation_config that makes Gemini answer in JSON matching schema
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+class QuestionFormatError(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class Question:
+    question: str
+    choices: tuple
+    answer_letter: str
+    explanation: str
+    difficulty: str = "easy"
+    # generated along with the question when asked for (empty otherwise): a hint that doesn't give the answer
+    # away, and for each choice in order why it's wrong ("" for the right one)
+    hint: str = ""
+    why_wrong: tuple = ()
+
+    def __post_init__(self):
+        # strict: a question that gets built is one we can put on screen and grade
+        if not self.question:
+            raise QuestionFormatError("question has no stem")
+        if len(self.choices) != 4 or not all(self.choices):
+            raise QuestionFormatError(f"expected 4 choices, got {len(self.choices)}")
+        if len({c.lower() for c in self.choices}) != 4:
+            raise QuestionFormatError("choices repeat")
+        if self.answer_letter not in LETTERS:
+            raise QuestionFormatError(f"answer {self.answer_letter!r} is not one of A-D")
+        if not self.explanation:
+            raise QuestionFormatError("question has no explanation")
+
+    @property
+    def answer(self):
+        return self.choices[LETTERS.index(self.answer_letter)]
+
+    @property
+    def question_text(self):
+        return self.question
+
+    def why_not(self, letter):
+        # why the choice at letter is wrong, if we have it
+        if len(self.why_wrong) != 4 or letter not in LETTERS:
+            return ""
+        return self.why_wrong[LETTERS.index(letter)]
+
+    def to_dict(self):
+        # the plain dict the rest of the app passes around (and the question bank stores)
+        return {
+            'question': self.question,
+            'choices': list(self.choices),
+            'answer': self.answer,
+            'answer_letter': self.answer_letter,
+            'explanation': self.explanation,
+            'difficulty': self.difficulty,
+            'question_text': self.question,
+            'hint': self.hint,
+            'why_wrong': list(self.why_wrong),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['question'], tuple(data['choices']), data['answer_letter'], data['explanation'],
+                   data.get('difficulty', "easy"), data.get('hint', ""), tuple(data.get('why_wrong', ())))
+
+    # the compact list form sessions and the scheduler keep in their saved state
+    def to_list(self):
+        row = [self.question, list(self.choices), self.answer_letter, self.explanation, self.difficulty]
+        if self.hint or self.why_wrong:
+            row += [self.hint, list(self.why_wrong)]
+        return row
+
+    @classmethod
+    def from_list(cls, row):
+        # rows saved before hints were kept have the first five fields only
+        question, choices, letter, explanation, difficulty, *extras = row
+        hint, why_wrong = extras if extras else ("", ())
+        return cls(question, tuple(choices), letter, explanation, difficulty, hint, tuple(why_wrong))
+
+
+# one try at answering: which question (1-based), the letter picked, whether it was right and when
+@dataclass(frozen=True, slots=True)
+class Attempt:
+    question_number: int
+    letter: str
+    correct: bool
+    at: float
+
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_CHOICE_LABEL = re.compile(r"^\(?([A-D])\s*[.):\]]\s*")
+
+
+def _answer_letter(answer, choices):
+    # "B", "b", "B.", "(B)" or the text of the right choice all point at the same letter
+    answer = answer.strip()
+    label = re.fullmatch(r"\(?([A-Da-d])\)?\.?", answer)
+    if label:
+        return label.group(1).upper()
+    for letter, choice in zip(LETTERS, choices):
+        if answer.lower() == choice.lower():
+            return letter
+    return answer
+
+
+def _why_wrong(value):
+    # one short line per choice or nothing: a partial list can't be lined up with the choices
+    if isinstance(value, list) and len(value) == 4 and all(isinstance(v, str) for v in value):
+        return tuple(v.strip() for v in value)
+    return ()
+
+
+def question_from_json(obj, difficulty="easy"):
+    if not isinstance(obj, dict):
+        raise QuestionFormatError("expected a JSON object per question")
+    fields = {}
+    for key in ("question", "answer", "explanation"):
+        value = obj.get(key)
+        if not isinstance(value, str):
+            raise QuestionFormatError(f"{key!r} missing or not a string")
+        fields[key] = value.strip()
+    choices = obj.get("choices")
+    if not isinstance(choices, list) or not all(isinstance(c, str) for c in choices):
+        raise QuestionFormatError("'choices' missing or not a list of strings")
+    # the schema says no labels, but "A. ..." still turns up now and then
+    choices = tuple(_CHOICE_LABEL.sub("", c.strip()) for c in choices)
+    hint = obj.get("hint")
+    return Question(fields["question"], choices, _answer_letter(fields["answer"], choices),
+                    fields["explanation"], difficulty, hint.strip() if isinstance(hint, str) else "",
+                    _why_wrong(obj.get("why_wrong")))
+
+
+def _load_json(content):
+    try:
+        return json.loads(_FENCE.sub("", content))
+    except json.JSONDecodeError as e:
+        raise QuestionFormatError(f"reply is not valid JSON: {e}") from e
+
+
+def _looks_like_json(content):
+    return content.lstrip().startswith(("{", "[", "```"))
+
+
+_QUESTION_PREFIX = re.compile(r"^(?:Question\s*\d*|Q\d*)\s*[:.)]\s*", re.IGNORECASE)
+_CHOICE_LINE = re.compile(r"^\(?([A-D])\s*[.):\]]\s+(.*)$")
+_ANSWER_LINE = re.compile(r"^(?:Correct\s+)?Answer\s*[:\-]?\s*(.*)$", re.IGNORECASE)
+_EXPLANATION_LINE = re.compile(r"^Explanation\s*[:\-]?\s*(.*)$", re.IGNORECASE)
+_HINT_LINE = re.compile(r"^Hint\s*[:\-]\s*(.*)$", re.IGNORECASE)
+_WHY_NOT_LINE = re.compile(r"^Why\s+not\s+\(?([A-D])\)?\s*[:\-]\s*(.*)$", re.IGNORECASE)
+
+
+def question_from_text(content, difficulty="easy"):
+    stem = []
+    choices = {}
+    answer = ""
+    explanation = []
+    hint = []
+    why_not = {}
+    section = "stem"
+    for raw in content.split("\n"):
+        # markdown emphasis and heading marks carry no meaning here
+        line = raw.replace("**", "").replace("__", "").strip().lstrip("#").strip()
+        if not line:
+            continue
+        choice = _CHOICE_LINE.match(line)
+        answer_line = _ANSWER_LINE.match(line)
+        explanation_line = _EXPLANATION_LINE.match(line)
+        hint_line = _HINT_LINE.match(line)
+        why_not_line = _WHY_NOT_LINE.match(line)
+        if hint_line and choices:
+            section = "hint"
+            hint.append(hint_line.group(1))
+        elif why_not_line and choices:
+            section = "why_not"
+            why_not[why_not_line.group(1).upper()] = why_not_line.group(2).strip()
+        elif explanation_line and choices:
+            section = "explanation"
+            explanation.append(explanation_line.group(1))
+        elif answer_line and choices:
+            section = "answer"
+            answer = answer_line.group(1)
+        elif choice and section in ("stem", "choices") and choice.group(1) not in choices:
+            section = "choices"
+            choices[choice.group(1)] = choice.group(2).strip()
+        elif section == "stem":
+            stem.append(_QUESTION_PREFIX.sub("", line) if not stem else line)
+        elif section == "choices" and choices:
+            # a choice that wrapped onto the next line
+            last = max(choices)
+            choices[last] = f"{choices[last]} {line}"
+        elif section == "explanation":
+            explanation.append(line)
+        elif section == "hint":
+            hint.append(line)
+    if sorted(choices) != list(LETTERS):
+        raise QuestionFormatError(f"expected choices A-D, got {''.join(sorted(choices)) or 'none'}")
+    ordered = tuple(choices[letter] for letter in LETTERS)
+    # the answer line can carry extra words: "B. Mitosis", "B (Mitosis)"
+    answer = answer.strip()
+    letter = re.match(r"^\(?([A-Da-d])\)?(?:[.):\s]|$)", answer)
+    answer_letter = letter.group(1).upper() if letter else _answer_letter(answer, ordered)
+    # the right answer gets no "why not" line, so three lines cover it
+    wrong = [letter for letter in LETTERS if letter != answer_letter]
+    why_wrong = tuple(why_not.get(letter, "") for letter in LETTERS) if all(why_not.get(w) for w in wrong) else ()
+    return Question(" ".join(stem).strip(), ordered, answer_letter, " ".join(explanation).strip(), difficulty,
+                    " ".join(hint).strip(), why_wrong)
+
+
+def parse_question(content, difficulty="easy"):
+    # one question from a reply in either format; raises QuestionFormatError if it isn't usable
+    if _looks_like_json(content):
+        data = _load_json(content)
+        if isinstance(data, list):
+            if len(data) != 1:
+                raise QuestionFormatError(f"expected one question, got {len(data)}")
+            data = data[0]
+        return question_from_json(data, difficulty)
+    return question_from_text(content, difficulty)
+
+
+# splits a text batch into one chunk per question (we ask for --- between them, but numbered headers work too)
+def split_text_batch(content):
+    chunks = [c for c in re.split(r"(?m)^\s*-{3,}\s*$", content) if c.strip()]
+    if len(chunks) <= 1:
+        chunks = [c for c in re.split(r"(?m)^(?=\s*(?:\*\*)?Question\s*\d+\s*[:.)])", content) if c.strip()]
+    return chunks
+
+
+def parse_batch(content, difficulty="easy"):
+    # returns (good questions, number that didn't parse or validate)
+    # difficulty can be a list for a batch asked for at several levels: the level of each question in the
+    # order they were asked for (anything past the end gets the last one)
+    levels = [difficulty] if isinstance(difficulty, str) else list(difficulty) or ["easy"]
+    if _looks_like_json(content):
+        data = _load_json(content)
+        if isinstance(data, dict):
+            data = data.get("questions", [data])
+        items = data if isinstance(data, list) else [data]
+        parse_one = question_from_json
+    else:
+        items = split_text_batch(content)
+        parse_one = question_from_text
+    questions = []
+    rejected = 0
+    for position, item in enumerate(items):
+        try:
+            questions.append(parse_one(item, levels[min(position, len(levels) - 1)]))
+        except QuestionFormatError:
+            rejected += 1
+    return questions, rejected
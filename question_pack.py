@@ -0,0 +1,215 @@
+# a question bank frozen into one read-only file, for classrooms that can't count on the network:
+# generate a topic's questions once (question_bank.py warm, then question_bank.py export), copy the file over,
+# and point the app at it with --pack (PAST_QUESTION_PACK)
+# the file is memory-mapped rather than loaded, so opening a 100k-question pack reads a header and a small
+# shelf table and nothing else, and the OS pages in only the questions that actually get asked
+# layout (little-endian):
+#   header   magic, format version, question count, index offset, shelf table offset
+#   records  per question: stem length (u16), payload length (u32), the stem, the rest of the question as
+#            compact json (Question.to_list() minus the stem)
+#   index    one u64 record offset per question, grouped by shelf (topic + difficulty)
+#   shelves  json: [[topic key, difficulty, first index, count], ...]
+# a shelf is a contiguous run of the index, so picking a question is an index lookup plus one record read;
+# seen questions are skipped by their stem alone, without decoding the rest
+import argparse
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from mastery import normalize_difficulty
+from question_bank import QuestionBank, normalize_topic
+from question_format import Question, QuestionFormatError
+
+MAGIC = b"PASTQPK\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<HI")
+OFFSET = struct.Struct("<Q")
+
+PACK_PATH = os.environ.get("PAST_QUESTION_PACK")
+
+
+class PackFormatError(ValueError):
+    pass
+
+
+def write_pack(path, questions):
+    # questions = (topic, difficulty, question dict or Question) in any order; repeats within a shelf are dropped
+    # records are streamed to disk as they come; only their offsets (8 bytes each) and stems are held until the end
+    shelves = {}  # (topic key, difficulty) -> array of record offsets
+    stems = set()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        position = HEADER.size
+        for topic, difficulty, question in questions:
+            if not isinstance(question, Question):
+                try:
+                    question = Question.from_dict(question)
+                except (KeyError, QuestionFormatError):
+                    continue
+            shelf = (normalize_topic(topic), normalize_difficulty(difficulty))
+            stem = question.question.encode()
+            if (shelf, question.question) in stems or len(stem) > 0xFFFF:
+                continue
+            stems.add((shelf, question.question))
+            payload = json.dumps(question.to_list()[1:], separators=(',', ':')).encode()
+            f.write(RECORD.pack(len(stem), len(payload)))
+            f.write(stem)
+            f.write(payload)
+            shelves.setdefault(shelf, array("Q")).append(position)
+            position += RECORD.size + len(stem) + len(payload)
+        index_at = position
+        table = []
+        for (topic_key, difficulty), offsets in sorted(shelves.items()):
+            table.append([topic_key, difficulty, (position - index_at) // OFFSET.size, len(offsets)])
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            position += len(offsets) * OFFSET.size
+        f.write(json.dumps(table, separators=(',', ':')).encode())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, (position - index_at) // OFFSET.size, index_at, position))
+    os.replace(tmp_path, path)
+    return sum(count for _, _, _, count in table)
+
+
+def export(bank, path, topics=None):
+    # writes every question in a QuestionBank (or just the ones on topics) to a pack
+    keys = {normalize_topic(t) for t in topics} if topics else None
+    with bank.lock:
+        rows = bank.conn.execute("SELECT topic_key, difficulty, data FROM questions ORDER BY id").fetchall()
+    return write_pack(path, ((topic_key, difficulty, json.loads(data)) for topic_key, difficulty, data in rows
+                             if keys is None or topic_key in keys))
+
+
+class QuestionPack:
+    # read side; looks like a QuestionBank to QuizSession and the prefetcher (take / add), so it can go
+    # wherever a bank goes; fallback = a bank to ask when the pack has nothing left on a shelf (and where
+    # newly generated questions get stored, since the pack itself is read-only)
+    def __init__(self, path, fallback=None, seed=None):
+        self.path = path
+        self.fallback = fallback
+        self.rng = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+        self.file = open(path, "rb")
+        self.map = None
+        # on a bad file only our own handles get closed: the fallback belongs to the caller until we return
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.size, self.index_at, shelves_at = HEADER.unpack_from(self.map, 0)
+        except (ValueError, struct.error) as e:
+            self._close_file()
+            raise PackFormatError(f"{path} is not a question pack") from e
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._close_file()
+            raise PackFormatError(f"{path} is not a version {FORMAT_VERSION} question pack")
+        self.shelves = {(topic_key, difficulty): (first, count)
+                        for topic_key, difficulty, first, count in json.loads(self.map[shelves_at:])}
+
+    def _record(self, index):
+        (offset,) = OFFSET.unpack_from(self.map, self.index_at + index * OFFSET.size)
+        stem_length, payload_length = RECORD.unpack_from(self.map, offset)
+        return offset + RECORD.size, stem_length, payload_length
+
+    def stem(self, index):
+        start, stem_length, _ = self._record(index)
+        return self.map[start:start + stem_length].decode()
+
+    def question(self, index):
+        start, stem_length, payload_length = self._record(index)
+        payload = self.map[start + stem_length:start + stem_length + payload_length]
+        return Question.from_list([self.map[start:start + stem_length].decode()] + json.loads(payload))
+
+    def _walk(self, first, count):
+        # every index of a shelf once, in a random order: a random start and a random step that shares no
+        # factor with the shelf size; each step is O(1) and nothing the size of the shelf gets built
+        start = self.rng.randrange(count)
+        step = 1
+        if count > 2:
+            step = self.rng.randrange(1, count)
+            while math.gcd(step, count) != 1:
+                step = self.rng.randrange(1, count)
+        for i in range(count):
+            yield first + (start + i * step) % count
+
+    def take(self, topic, difficulty, seen_questions=(), count=1):
+        # up to count questions from the shelf the student hasn't seen, as question dicts
+        picked = []
+        shelf = self.shelves.get((normalize_topic(topic), normalize_difficulty(difficulty)))
+        if shelf:
+            for index in self._walk(*shelf):
+                if self.stem(index) not in seen_questions:
+                    picked.append(self.question(index).to_dict())
+                    if len(picked) == count:
+                        break
+        self.hits += len(picked)
+        self.misses += count - len(picked)
+        if len(picked) < count and self.fallback is not None:
+            texts = [q['question_text'] for q in picked]
+            seen = seen_questions.plus(texts) if hasattr(seen_questions, 'plus') else set(seen_questions) | set(texts)
+            picked += self.fallback.take(topic, difficulty, seen, count - len(picked))
+        return picked
+
+    def add(self, topic, difficulty, questions):
+        if self.fallback is not None:
+            self.fallback.add(topic, difficulty, questions)
+
+    def count(self, topic=None, difficulty=None):
+        if topic is None:
+            return self.size
+        return self.shelves.get((normalize_topic(topic), normalize_difficulty(difficulty)), (0, 0))[1]
+
+    def topics(self):
+        return sorted({topic_key for topic_key, _ in self.shelves})
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'questions': self.size, 'shelves': len(self.shelves), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def _close_file(self):
+        if self.map is not None and not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def close(self):
+        self._close_file()
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+def default_bank():
+    # what the gui reads questions from: the pack when there is one, backed by the local bank
+    if PACK_PATH:
+        return QuestionPack(PACK_PATH, fallback=QuestionBank())
+    return QuestionBank()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look inside a question pack.")
+    parser.add_argument("path")
+    parser.add_argument("--sample", metavar="TOPIC", help="print a few questions on TOPIC")
+    parser.add_argument("--difficulty", default="easy")
+    args = parser.parse_args()
+
+    pack = QuestionPack(args.path)
+    print(pack.stats())
+    for (topic_key, difficulty), (_, count) in sorted(pack.shelves.items()):
+        print(f"  {topic_key} ({difficulty}): {count}")
+    if args.sample:
+        for question in pack.take(args.sample, args.difficulty, count=3):
+            print(f"\n{question['question']}")
+            for letter, choice in zip("ABCD", question['choices']):
+                print(f"  {letter}. {choice}")
+    pack.close()
+
+
+if __name__ == "__main__":
+    main()
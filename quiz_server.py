@@ -0,0 +1,441 @@
+# headless quiz service: the same QuizSession logic as the gui, served over HTTP to many students at once
+# students on the same topic + difficulty share one pool of generated questions, and when the pool runs dry
+# only one batch request goes out no matter how many students are waiting on it
+# run: python quiz_server.py --port 8080   (needs aiohttp)
+import argparse
+import asyncio
+import json
+import logging
+import secrets
+import time
+import zlib
+from collections import OrderedDict
+
+from aiohttp import web
+
+import prompts
+import question_pack
+import telemetry
+import tutor_ai
+from mastery import normalize_difficulty
+from question_bank import normalize_topic
+from scoring import Scorecard
+from session_log import SessionEventLog
+
+# the most questions one session can ask for (a long practice session still keeps to a small, fixed state)
+MAX_SESSION_QUESTIONS = 500
+
+
+class SessionStore:
+    # where sessions live between requests; subclasses decide how they're kept
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def put(self, session_id, session):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def evict_idle(self, max_idle):
+        # drops sessions nobody has touched for max_idle seconds, returns how many went
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    # keeps the live QuizSession objects; fastest, but each one holds its own near-dup index
+    def __init__(self):
+        self.sessions = OrderedDict()  # id -> (session, last used), least recently used first
+
+    def get(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            return None
+        self.sessions[session_id] = (entry[0], time.monotonic())
+        self.sessions.move_to_end(session_id)
+        return entry[0]
+
+    def put(self, session_id, session):
+        self.sessions[session_id] = (session, time.monotonic())
+        self.sessions.move_to_end(session_id)
+
+    def delete(self, session_id):
+        entry = self.sessions.pop(session_id, None)
+        if entry:
+            entry[0].close()
+
+    def evict_idle(self, max_idle):
+        cutoff = time.monotonic() - max_idle
+        evicted = 0
+        while self.sessions:
+            session_id, (session, last_used) = next(iter(self.sessions.items()))
+            if last_used > cutoff:
+                break
+            self.delete(session_id)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class CompactSessionStore(SessionStore):
+    # keeps QuizSession.to_state() as compressed json, a few hundred bytes per student
+    # backend is any dict-like (a plain dict by default, or something shared like a dbm/redis wrapper)
+    def __init__(self, backend=None):
+        self.backend = {} if backend is None else backend
+        self.last_used = OrderedDict()
+
+    @staticmethod
+    def dumps(session):
+        return zlib.compress(json.dumps(session.to_state(), separators=(",", ":")).encode())
+
+    @staticmethod
+    def loads(blob):
+        return tutor_ai.QuizSession.from_state(json.loads(zlib.decompress(blob)))
+
+    def get(self, session_id):
+        blob = self.backend.get(session_id)
+        if blob is None:
+            return None
+        self.last_used[session_id] = time.monotonic()
+        self.last_used.move_to_end(session_id)
+        return self.loads(blob)
+
+    def put(self, session_id, session):
+        self.backend[session_id] = self.dumps(session)
+        self.last_used[session_id] = time.monotonic()
+        self.last_used.move_to_end(session_id)
+
+    def delete(self, session_id):
+        self.backend.pop(session_id, None)
+        self.last_used.pop(session_id, None)
+
+    def evict_idle(self, max_idle):
+        cutoff = time.monotonic() - max_idle
+        evicted = 0
+        while self.last_used:
+            session_id, last_used = next(iter(self.last_used.items()))
+            if last_used > cutoff:
+                break
+            self.delete(session_id)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.last_used)
+
+
+class QuestionPool:
+    # generated questions for one topic + difficulty, shared by every student on it
+    # pack = a question_pack.QuestionPack to refill from before asking the model
+    def __init__(self, topic, difficulty, batch_size=10, max_size=500, pack=None):
+        self.topic = topic
+        self.pack = pack
+        self.difficulty = difficulty
+        self.batch_size = batch_size
+        self.questions = OrderedDict()  # question text -> question data, oldest first
+        self.max_size = max_size
+        self.refill = None  # the in-flight generate task everyone waits on
+        self.batches = 0
+        self.served = 0
+
+    def pick(self, seen_questions, current_text=None):
+        for text, question_data in self.questions.items():
+            if text not in seen_questions and text != current_text:
+                return question_data
+        return None
+
+    async def take(self, seen_questions, current_text=None):
+        question_data = self.pick(seen_questions, current_text)
+        if question_data is None:
+            # shielded: one student's request going away mustn't cancel the refill everyone else is waiting on
+            await asyncio.shield(self._start_refill())
+            question_data = self.pick(seen_questions, current_text)
+        if question_data:
+            self.served += 1
+        return question_data
+
+    def warm(self):
+        # starts a refill in the background if the pool is empty, so the first student to need it doesn't wait
+        if not self.questions:
+            self._start_refill()
+
+    def _start_refill(self):
+        if self.refill is None:
+            self.refill = asyncio.ensure_future(self._refill())
+            # cleared when it's done, whether or not anyone is still waiting on it
+            self.refill.add_done_callback(self._refilled)
+        return self.refill
+
+    def _refilled(self, task):
+        if self.refill is task:
+            self.refill = None
+
+    async def _refill(self):
+        self.batches += 1
+        # a pool can't know which student gets each question, so "likely_wrong" is left to the sessions
+        extras = tutor_ai.should_speculate(tutor_ai.SPECULATE, self.difficulty)
+        questions = []
+        if self.pack:
+            questions = self.pack.take(self.topic, self.difficulty, self.questions, self.batch_size)
+        if not questions:
+            questions = await asyncio.to_thread(tutor_ai.generate_quiz_batch, self.topic, self.batch_size,
+                                                self.difficulty, set(self.questions), extras=extras)
+        for question_data in questions:
+            self.questions[question_data['question_text']] = question_data
+        while len(self.questions) > self.max_size:
+            self.questions.popitem(last=False)
+
+
+class QuizServer:
+    def __init__(self, store=None, max_idle=30 * 60, batch_size=10, event_log=None, pack=None):
+        self.store = store or CompactSessionStore()
+        self.pack = pack  # a question_pack.QuestionPack every pool draws on first, or None
+        self.event_log = event_log  # a session_log.SessionEventLog shared by every session, or None
+        self.max_idle = max_idle
+        self.batch_size = batch_size
+        self.pools = {}
+        self.locks = {}  # session id -> lock, so two requests from one student don't interleave
+        self.counters = {'requests': 0, 'evicted': 0}
+        # every ended session's scorecard added up, for GET /scores (a class dashboard)
+        self.scores = Scorecard.combined(())
+
+    def pool_for(self, topic, difficulty):
+        key = (normalize_topic(topic), difficulty)
+        if key not in self.pools:
+            self.pools[key] = QuestionPool(topic, difficulty, self.batch_size, pack=self.pack)
+        return self.pools[key]
+
+    def lock_for(self, session_id):
+        if session_id not in self.locks:
+            self.locks[session_id] = asyncio.Lock()
+        return self.locks[session_id]
+
+    def load(self, request):
+        session_id = request.match_info['session_id']
+        session = self.store.get(session_id)
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({'error': "unknown or expired session"}),
+                                   content_type="application/json")
+        session.event_log = self.event_log
+        return session_id, session
+
+    @staticmethod
+    def question_payload(session, question):
+        # everything the student needs, minus the answer
+        return {
+            'number': session.current_question_number - 1,
+            'of': session.max_questions,
+            'question': question.question,
+            'choices': list(question.choices),
+            'difficulty': question.difficulty,
+        }
+
+    async def start_session(self, request):
+        body = await request.json()
+        topic = (body.get('topic') or "").strip()
+        if not topic:
+            raise web.HTTPBadRequest(text=json.dumps({'error': "topic is required"}), content_type="application/json")
+        session_id = secrets.token_urlsafe(12)
+        difficulty = normalize_difficulty(body.get('difficulty', "easy"))
+        # topics = more topics to mix in; max_questions can run well past the usual 5 for a long practice session
+        topics = [t.strip() for t in body.get('topics') or [] if isinstance(t, str) and t.strip()]
+        try:
+            max_questions = max(1, min(int(body.get('max_questions', 5)), MAX_SESSION_QUESTIONS))
+        except (TypeError, ValueError):
+            raise web.HTTPBadRequest(text=json.dumps({'error': "max_questions must be a number"}),
+                                     content_type="application/json")
+        self.store.put(session_id, tutor_ai.QuizSession(topic, difficulty, event_log=self.event_log,
+                                                        session_id=session_id, adaptive=body.get('adaptive', True),
+                                                        topics=topics, max_questions=max_questions))
+        return web.json_response({'session_id': session_id})
+
+    async def next_question(self, request):
+        async with self.lock_for(request.match_info['session_id']):
+            session_id, session = self.load(request)
+            if session.is_finished():
+                return web.json_response({'finished': True, 'score_message': session.get_score_message()})
+            review = session.plan()
+            if review:
+                # a question the student missed earlier, coming back; it's already in the session
+                question_data = review[1]
+            else:
+                # pools are per topic and difficulty, so an adaptive session just draws from the one at its level
+                pool = self.pool_for(session.upcoming_topic, session.next_difficulty())
+                question_data = await pool.take(session.seen_questions, session.current_question_text)
+            if question_data is None:
+                return web.json_response({'error': "couldn't reach the tutor right now, try again"}, status=503)
+            question = session.serve_question(question_data)
+            self.store.put(session_id, session)
+            return web.json_response(self.question_payload(session, question))
+
+    async def submit_answer(self, request):
+        body = await request.json()
+        async with self.lock_for(request.match_info['session_id']):
+            session_id, session = self.load(request)
+            if session.current_question is None:
+                raise web.HTTPConflict(text=json.dumps({'error': "no question to answer yet"}),
+                                       content_type="application/json")
+            is_correct, feedback = session.submit_answer(body.get('answer', ""), session.correct_letter)
+            self.store.put(session_id, session)
+            if not session.is_finished():
+                # peeked, not planned: planning here would only stick in the memory store
+                self.pool_for(session.upcoming()[1], session.peek_difficulty()).warm()
+            result = {'correct': is_correct, 'feedback': feedback, 'score': session.score,
+                      'finished': session.is_finished()}
+            if result['finished']:
+                result['score_message'] = session.get_score_message()
+            return web.json_response(result)
+
+    async def hint(self, request):
+        async with self.lock_for(request.match_info['session_id']):
+            session_id, session = self.load(request)
+            if session.current_question is None:
+                raise web.HTTPConflict(text=json.dumps({'error': "no question yet"}), content_type="application/json")
+            # a hint generated with the question comes straight back; others are cached and coalesced across students
+            hint = await session.get_hint_async()
+            self.store.put(session_id, session)  # the session's token budget paid for it
+        return web.json_response({'hint': hint})
+
+    async def follow_up(self, request):
+        body = await request.json()
+        async with self.lock_for(request.match_info['session_id']):
+            session_id, session = self.load(request)
+            # answered from the question itself when intents.py recognizes what's being asked; otherwise cached
+            # per question, so students asking the same thing about a shared question get one model call
+            response = await session.follow_up_async(body.get('prompt', ""))
+            self.store.put(session_id, session)
+        return web.json_response({'response': response})
+
+    async def session_state(self, request):
+        # a read: it waits for the session's other requests and mustn't plan its next question, so the answer
+        # (and what's served next) is the same whichever session store is behind it
+        async with self.lock_for(request.match_info['session_id']):
+            _, session = self.load(request)
+            return web.json_response({
+                'topic': session.topic,
+                'topics': session.topics,
+                'difficulty': session.difficulty,
+                'next_difficulty': session.peek_difficulty(),
+                'score': session.score,
+                'answered': session.answered_count,
+                'question_number': session.current_question_number,
+                'finished': session.is_finished(),
+                'scorecard': session.scorecard.report(),
+                # hints and follow-ups; questions come from the shared pools, which no one session pays for
+                'tokens': session.budget.report(),
+            })
+
+    async def end_session(self, request):
+        session_id = request.match_info['session_id']
+        # waits for the session's other requests, so an answer still being scored makes it into the totals
+        async with self.lock_for(session_id):
+            session = self.store.get(session_id)
+            if session is not None:
+                self.scores.merge(session.scorecard)
+            self.store.delete(session_id)
+        self.locks.pop(session_id, None)
+        return web.json_response({'ok': True})
+
+    async def stats(self, request):
+        return web.json_response({
+            'sessions': len(self.store),
+            'pools': {f"{topic} ({difficulty})": {'questions': len(pool.questions), 'batches': pool.batches,
+                                                  'served': pool.served}
+                      for (topic, difficulty), pool in self.pools.items()},
+            'counters': self.counters,
+            'coalescing': tutor_ai.coalescing_stats(),
+            'client': tutor_ai.client.stats,
+        })
+
+    async def class_scores(self, request):
+        # accuracy, first tries, hints and answer times over every session that has ended, per topic and level
+        return web.json_response(self.scores.report())
+
+    async def metrics(self, request):
+        # Prometheus scrape target; empty unless the server was started with --metrics
+        exporter = telemetry.find(telemetry.PrometheusExporter)
+        return web.Response(text=exporter.render() if exporter else "", content_type="text/plain")
+
+    @web.middleware
+    async def count_requests(self, request, handler):
+        self.counters['requests'] += 1
+        return await handler(request)
+
+    async def evict_loop(self, app):
+        async def run():
+            while True:
+                await asyncio.sleep(min(60, self.max_idle))
+                evicted = self.store.evict_idle(self.max_idle)
+                self.counters['evicted'] += evicted
+                # a lock nobody holds is recreated on demand, so those can go too
+                self.locks = {s: lock for s, lock in self.locks.items() if lock.locked()}
+
+        task = asyncio.ensure_future(run())
+        yield
+        task.cancel()
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.count_requests])
+        app.cleanup_ctx.append(self.evict_loop)
+        app.add_routes([
+            web.post("/sessions", self.start_session),
+            web.get("/sessions/{session_id}", self.session_state),
+            web.delete("/sessions/{session_id}", self.end_session),
+            web.post("/sessions/{session_id}/next", self.next_question),
+            web.post("/sessions/{session_id}/answer", self.submit_answer),
+            web.post("/sessions/{session_id}/hint", self.hint),
+            web.post("/sessions/{session_id}/follow-up", self.follow_up),
+            web.get("/stats", self.stats),
+            web.get("/scores", self.class_scores),
+            web.get("/metrics", self.metrics),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve quizzes over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--store", choices=["compact", "memory"], default="compact")
+    parser.add_argument("--max-idle", type=float, default=30 * 60, help="seconds before an idle session is dropped")
+    parser.add_argument("--batch-size", type=int, default=10, help="questions per shared pool refill")
+    parser.add_argument("--log", help="append session events and model call latency to this file")
+    parser.add_argument("--metrics", action="store_true", help="collect timing spans and serve them on GET /metrics")
+    parser.add_argument("--trace", help="also write every timing span to this file (jsonl)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--pack", default=question_pack.PACK_PATH,
+                        help="serve questions from this question pack before generating any (see question_pack.py)")
+    parser.add_argument("--speculate", choices=tutor_ai.SPECULATE_POLICIES, default=tutor_ai.SPECULATE,
+                        help="generate hints along with questions: always, for hard ones, or when a miss is likely")
+    parser.add_argument("--prompts", choices=sorted(prompts.TEMPLATES), default=prompts.VERSION,
+                        help="prompt version: v2 (compact, the default) or v1 (the original prompts)")
+    parser.add_argument("--token-budget", type=int, default=tutor_ai.TOKEN_BUDGET,
+                        help="tokens each session may spend on hints and follow-ups")
+    args = parser.parse_args()
+    tutor_ai.SPECULATE = args.speculate
+    prompts.VERSION = args.prompts
+    tutor_ai.TOKEN_BUDGET = args.token_budget
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.metrics or args.trace:
+        telemetry.enable(telemetry.PrometheusExporter(),
+                         *([telemetry.JsonLinesExporter(args.trace)] if args.trace else []))
+
+    store = InMemorySessionStore() if args.store == "memory" else CompactSessionStore()
+    event_log = SessionEventLog(args.log) if args.log else None
+    if event_log:
+        tutor_ai.client.add_listener(event_log.model_call)
+    pack = question_pack.QuestionPack(args.pack) if args.pack else None
+    server = QuizServer(store, max_idle=args.max_idle, batch_size=args.batch_size, event_log=event_log, pack=pack)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+    if event_log:
+        event_log.close()
+
+
+if __name__ == "__main__":
+    main()
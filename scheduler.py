@@ -0,0 +1,73 @@
+# what comes next in a long practice session: a question the student missed that's due to come back,
+# or a new question on the next topic in turn (topics are interleaved round robin)
+# missed questions follow a Leitner schedule counted in questions served rather than days, since a practice
+# session is one sitting: missing a question on the first try puts it in box 0, due REVIEW_GAPS[0] questions
+# later; getting a review right first try moves it up a box to a longer gap and past the last box it's done;
+# missing it again starts it over; reviews never come back to back, so at least every other question is new
+from question_format import Question
+
+REVIEW_GAPS = (3, 8, 20)
+
+
+class SessionScheduler:
+    def __init__(self, topics, review=True, max_reviews=200):
+        self.topics = list(topics)
+        self.review = review
+        self.max_reviews = max_reviews
+        self.clock = 0  # questions served so far
+        self.turn = 0  # new questions served so far, which picks the topic
+        self.last_was_review = False
+        self.reviews = {}  # question text -> [topic, Question, box, due at], oldest miss first
+
+    def next_topic(self):
+        return self.topics[self.turn % len(self.topics)]
+
+    def due(self):
+        # the most overdue review as (topic, Question), or None
+        if not self.review or self.last_was_review:
+            return None
+        best = None
+        for topic, question, _, due_at in self.reviews.values():
+            if due_at <= self.clock and (best is None or due_at < best[2]):
+                best = (topic, question, due_at)
+        return best[:2] if best else None
+
+    def served(self, question):
+        self.clock += 1
+        self.last_was_review = question.question in self.reviews
+        if not self.last_was_review:
+            self.turn += 1
+
+    def answered(self, topic, question, correct):
+        # called with the first try at each question only
+        entry = self.reviews.get(question.question)
+        if not correct:
+            self.reviews.pop(question.question, None)
+            self.reviews[question.question] = [topic, question, 0, self.clock + REVIEW_GAPS[0]]
+            while len(self.reviews) > self.max_reviews:
+                del self.reviews[next(iter(self.reviews))]
+        elif entry is not None:
+            entry[2] += 1
+            if entry[2] >= len(REVIEW_GAPS):
+                del self.reviews[question.question]
+            else:
+                entry[3] = self.clock + REVIEW_GAPS[entry[2]]
+
+    def to_state(self):
+        return {
+            'topics': self.topics,
+            'clock': self.clock,
+            'turn': self.turn,
+            'last_was_review': self.last_was_review,
+            'reviews': [[topic, q.to_list(), box, due] for topic, q, box, due in self.reviews.values()],
+        }
+
+    def load_state(self, state):
+        self.topics = state['topics']
+        self.clock = state['clock']
+        self.turn = state['turn']
+        self.last_was_review = state.get('last_was_review', False)
+        self.reviews = {}
+        for topic, row, box, due in state['reviews']:
+            question = Question.from_list(row)
+            self.reviews[question.question] = [topic, question, box, due]
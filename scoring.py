@@ -0,0 +1,230 @@
+# the score, kept apart from the quiz and the window that show it: question served / answered / hint events go
+# into a Scorecard, which keeps running totals per topic + difficulty
+#   served, answered (at least one try), right (on any try), right first try, tries, hinted, hints,
+#   time from question to first answer (count, sum, sum of squares, min, max and a log2 histogram)
+# every event is O(1) and so is every rate read off them; a question that was served and never answered
+# counts as skipped, not wrong
+# cards add up: merge() sums two of them field by field, so a class dashboard is the sum of its students'
+# cards (Scorecard.combined) instead of a replay of every session's history
+import math
+import time
+
+MAX_TRIES = 3  # tries a student gets at a question before it's shown as done
+TIME_BUCKETS = 12  # histogram buckets: under 1s, 1-2s, 2-4s, ... 1024s and up
+
+
+def _bucket(seconds):
+    return 0 if seconds < 1 else min(TIME_BUCKETS - 1, int(math.log2(seconds)) + 1)
+
+
+class Tally:
+    __slots__ = ("served", "answered", "correct", "first_try", "tries", "hinted", "hints",
+                 "time_count", "time_sum", "time_squares", "time_min", "time_max", "time_buckets")
+
+    def __init__(self):
+        self.served = 0
+        self.answered = 0
+        self.correct = 0
+        self.first_try = 0
+        self.tries = 0
+        self.hinted = 0  # questions with at least one hint
+        self.hints = 0
+        self.time_count = 0
+        self.time_sum = 0.0
+        self.time_squares = 0.0
+        self.time_min = math.inf
+        self.time_max = 0.0
+        self.time_buckets = [0] * TIME_BUCKETS
+
+    def add_time(self, seconds):
+        seconds = max(0.0, seconds)
+        self.time_count += 1
+        self.time_sum += seconds
+        self.time_squares += seconds * seconds
+        self.time_min = min(self.time_min, seconds)
+        self.time_max = max(self.time_max, seconds)
+        self.time_buckets[_bucket(seconds)] += 1
+
+    def merge(self, other):
+        self.served += other.served
+        self.answered += other.answered
+        self.correct += other.correct
+        self.first_try += other.first_try
+        self.tries += other.tries
+        self.hinted += other.hinted
+        self.hints += other.hints
+        self.time_count += other.time_count
+        self.time_sum += other.time_sum
+        self.time_squares += other.time_squares
+        self.time_min = min(self.time_min, other.time_min)
+        self.time_max = max(self.time_max, other.time_max)
+        self.time_buckets = [a + b for a, b in zip(self.time_buckets, other.time_buckets)]
+        return self
+
+    def accuracy(self):
+        return self.correct / self.answered if self.answered else 0.0
+
+    def first_try_rate(self):
+        return self.first_try / self.answered if self.answered else 0.0
+
+    def hint_rate(self):
+        return self.hinted / self.answered if self.answered else 0.0
+
+    def mean_time(self):
+        return self.time_sum / self.time_count if self.time_count else 0.0
+
+    def time_stdev(self):
+        if self.time_count < 2:
+            return 0.0
+        mean = self.mean_time()
+        return math.sqrt(max(0.0, self.time_squares / self.time_count - mean * mean))
+
+    def time_quantile(self, q):
+        # the upper edge of the histogram bucket the q-th answer time falls in (clamped to the slowest seen)
+        if not self.time_count:
+            return 0.0
+        rank = q * self.time_count
+        seen = 0
+        for i, count in enumerate(self.time_buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(float(2 ** i), self.time_max)
+        return self.time_max
+
+    def report(self):
+        return {'served': self.served, 'answered': self.answered, 'skipped': self.served - self.answered,
+                'correct': self.correct, 'accuracy': round(self.accuracy(), 4),
+                'first_try_rate': round(self.first_try_rate(), 4),
+                'tries_per_question': round(self.tries / self.answered, 2) if self.answered else 0.0,
+                'hint_rate': round(self.hint_rate(), 4), 'hints': self.hints,
+                'time_to_answer': {'mean': round(self.mean_time(), 2), 'stdev': round(self.time_stdev(), 2),
+                                   'min': round(self.time_min, 2) if self.time_count else 0.0,
+                                   'p50': round(self.time_quantile(0.5), 2),
+                                   'p90': round(self.time_quantile(0.9), 2), 'max': round(self.time_max, 2)}}
+
+    def to_state(self):
+        return [self.served, self.answered, self.correct, self.first_try, self.tries, self.hinted, self.hints,
+                self.time_count, self.time_sum, self.time_squares,
+                None if self.time_min == math.inf else self.time_min, self.time_max, list(self.time_buckets)]
+
+    @classmethod
+    def from_state(cls, state):
+        tally = cls.__new__(cls)
+        (tally.served, tally.answered, tally.correct, tally.first_try, tally.tries, tally.hinted, tally.hints,
+         tally.time_count, tally.time_sum, tally.time_squares, time_min, tally.time_max, buckets) = state
+        tally.time_min = math.inf if time_min is None else time_min
+        tally.time_buckets = list(buckets)
+        return tally
+
+
+class Scorecard:
+    def __init__(self):
+        self.cells = {}  # (topic, difficulty) -> Tally
+        self.total = Tally()
+        self.sessions = 1
+        # the question being asked: [cell key, served at, tries so far, right yet, hints]
+        self.open = None
+
+    def _tallies(self, key):
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = Tally()
+        return cell, self.total
+
+    def served(self, topic, difficulty, at=None):
+        self.open = [(topic, difficulty), time.time() if at is None else at, 0, False, 0]
+        for tally in self._tallies(self.open[0]):
+            tally.served += 1
+
+    def answered(self, correct, at=None):
+        if self.open is None:
+            return
+        key, served_at, tries, right, _ = self.open
+        first = tries == 0
+        for tally in self._tallies(key):
+            tally.tries += 1
+            if first:
+                tally.answered += 1
+                tally.add_time((time.time() if at is None else at) - served_at)
+                if correct:
+                    tally.first_try += 1
+            if correct and not right:
+                tally.correct += 1
+        self.open[2] += 1
+        self.open[3] = right or correct
+
+    def hinted(self):
+        if self.open is None:
+            return
+        first = self.open[4] == 0
+        for tally in self._tallies(self.open[0]):
+            tally.hints += 1
+            if first:
+                tally.hinted += 1
+        self.open[4] += 1
+
+    def tries_left(self):
+        # for the question being asked; 0 once it's been got right
+        if self.open is None or self.open[3]:
+            return 0
+        return max(0, MAX_TRIES - self.open[2])
+
+    @property
+    def correct(self):
+        return self.total.correct
+
+    @property
+    def answered_count(self):
+        return self.total.answered
+
+    def percentage(self):
+        return self.total.accuracy() * 100
+
+    def by_topic(self):
+        return self._grouped(0)
+
+    def by_difficulty(self):
+        return self._grouped(1)
+
+    def _grouped(self, part):
+        groups = {}
+        for key, tally in self.cells.items():
+            groups.setdefault(key[part], Tally()).merge(tally)
+        return groups
+
+    def merge(self, other):
+        # adds other's finished counts in; whatever question other still has open stays with other
+        for key, tally in other.cells.items():
+            self.cells.setdefault(key, Tally()).merge(tally)
+        self.total.merge(other.total)
+        self.sessions += other.sessions
+        return self
+
+    @classmethod
+    def combined(cls, cards):
+        total = cls()
+        total.sessions = 0
+        for card in cards:
+            total.merge(card)
+        return total
+
+    def report(self):
+        return {'sessions': self.sessions, **self.total.report(),
+                'by_topic': {topic: t.report() for topic, t in sorted(self.by_topic().items())},
+                'by_difficulty': {level: t.report() for level, t in sorted(self.by_difficulty().items())}}
+
+    def to_state(self):
+        return {'cells': [[topic, difficulty, tally.to_state()] for (topic, difficulty), tally in self.cells.items()],
+                'sessions': self.sessions, 'open': self.open and [list(self.open[0])] + self.open[1:]}
+
+    @classmethod
+    def from_state(cls, state):
+        card = cls()
+        for topic, difficulty, tally in state['cells']:
+            card.cells[(topic, difficulty)] = Tally.from_state(tally)
+            card.total.merge(card.cells[(topic, difficulty)])
+        card.sessions = state.get('sessions', 1)
+        if state.get('open'):
+            key, *rest = state['open']
+            card.open = [tuple(key)] + rest
+        return card
@@ -0,0 +1,150 @@
+# what a student has already been asked, in a fixed number of bytes per question no matter how long
+# the session runs: a Bloom filter over the normalized stems answers "asked this before?" for every
+# question in the session (wrong about one time in `error_rate`, and only ever in the "yes" direction,
+# which just means a fresh question gets skipped), and a bounded deque keeps the last `window` stems
+# in the order they came, which is all the prompts' "don't repeat these" lists ever need
+import base64
+import hashlib
+import math
+import re
+from collections import deque
+from itertools import islice
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split())
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # double hashing: two 64-bit halves of one digest stand in for k independent hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenQuestions:
+    # grows like a scalable Bloom filter: when one filter is full a twice-as-big one with a tighter error
+    # rate starts, so the overall false positive rate stays under error_rate however many questions go in
+    def __init__(self, capacity=256, error_rate=0.001, window=20):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(capacity, error_rate / 2)]
+        self.window = deque(maxlen=window)
+        self.count = 0
+
+    @classmethod
+    def of(cls, texts, **kwargs):
+        seen = cls(**kwargs)
+        for text in texts:
+            seen.add(text)
+        return seen
+
+    def add(self, text):
+        if not text or text in self:
+            return
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * 2, current.error_rate / 2)
+            self.filters.append(current)
+        current.add(_normalize(text))
+        self.window.append(text)
+        self.count += 1
+
+    def __contains__(self, text):
+        if not text:
+            return False
+        key = _normalize(text)
+        return any(key in bloom for bloom in self.filters)
+
+    def __len__(self):
+        return self.count
+
+    def recent(self, n=None):
+        # the last n questions asked, oldest first
+        if n is None or n >= len(self.window):
+            return list(self.window)
+        return list(islice(reversed(self.window), n))[::-1]
+
+    def plus(self, texts):
+        return SeenPlus(self, texts)
+
+    def to_state(self):
+        return {
+            'count': self.count,
+            'recent': list(self.window),
+            'filters': [[bloom.capacity, bloom.error_rate, bloom.count, base64.b64encode(bloom.bits).decode()]
+                        for bloom in self.filters],
+        }
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        seen = cls(**kwargs)
+        if isinstance(state, list):
+            # sessions saved before this was a Bloom filter kept the plain list of question texts
+            for text in state:
+                seen.add(text)
+            return seen
+        seen.count = state['count']
+        seen.window.extend(state['recent'])
+        seen.filters = []
+        for capacity, error_rate, count, bits in state['filters']:
+            bloom = BloomFilter(capacity, error_rate)
+            bloom.bits = bytearray(base64.b64decode(bits))
+            bloom.count = count
+            seen.filters.append(bloom)
+        return seen
+
+
+class SeenPlus:
+    # a SeenQuestions plus a few more texts (questions queued but not asked yet), without copying either
+    __slots__ = ("seen", "extra")
+
+    def __init__(self, seen, extra):
+        self.seen = seen
+        self.extra = set(extra)
+
+    def __contains__(self, text):
+        return text in self.extra or text in self.seen
+
+    def __len__(self):
+        return len(self.seen) + len(self.extra)
+
+    def recent(self, n=None):
+        texts = self.seen.recent(n) + sorted(self.extra)
+        return texts if n is None else texts[-n:]
+
+    def plus(self, texts):
+        return SeenPlus(self.seen, self.extra | set(texts))
+
+
+def recent(seen, n=None):
+    # the last n of a SeenQuestions, or of any other collection of question texts
+    if isinstance(seen, (SeenQuestions, SeenPlus)):
+        return seen.recent(n)
+    texts = list(seen or [])
+    return texts if n is None else texts[-n:]
+
+
+def as_seen(seen):
+    # callers (the server's shared pools, the question bank warmer) still hand in plain sets and lists
+    if isinstance(seen, (SeenQuestions, SeenPlus)):
+        return seen
+    return SeenQuestions.of(seen or [])
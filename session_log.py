@@ -0,0 +1,160 @@
+# append-only log of what happens in each quiz session, cheap enough to leave on all the time
+# one short tab-separated line per event: time, session id, event code, compact json payload
+#   S  session started   [topic, difficulty, max questions, [topics]]
+#   Q  question served   [question, [choices], answer letter, explanation, difficulty, topic]
+#   (older logs have S without topics and Q without topic; replay_session reads both)
+#   A  answer submitted  [question number, letter, correct]
+#   H  hint requested    [question number]
+#   L  model call        [operation, seconds, ok]   (session id "-", calls aren't tied to one student)
+# lines are buffered in memory, written in batches and fsynced at most once per fsync_interval,
+# so a crash loses at most the last second or so of events
+import argparse
+import json
+import os
+import threading
+import time
+
+DEFAULT_PATH = os.environ.get(
+    "PAST_SESSION_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.log")
+)
+# where the app records its quizzes (main.py --session-log); nothing is written unless it's set
+RECORD_PATH = os.environ.get("PAST_SESSION_LOG")
+
+SESSION_STARTED = "S"
+QUESTION_SERVED = "Q"
+ANSWER_SUBMITTED = "A"
+HINT_REQUESTED = "H"
+MODEL_CALL = "L"
+
+
+class SessionEventLog:
+    def __init__(self, path=DEFAULT_PATH, batch_size=64, fsync_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        self.closed = threading.Event()
+        # nothing else may come along to push the last few events out, so a timer does it
+        self.flusher = threading.Thread(target=self._flush_periodically, name="session-log", daemon=True)
+        self.flusher.start()
+
+    def append(self, session_id, code, payload):
+        line = f"{time.time():.3f}\t{session_id}\t{code}\t{json.dumps(payload, separators=(',', ':'))}\n"
+        with self.lock:
+            if self.file.closed:
+                return  # a model call finishing after the window that logged it has closed
+            self.buffer.append(line)
+            if len(self.buffer) < self.batch_size:
+                return
+            lines, self.buffer = self.buffer, []
+            self.file.writelines(lines)
+
+    def model_call(self, operation, seconds, ok):
+        # GeminiClient listener signature, so the log can watch every model call
+        self.append("-", MODEL_CALL, [operation, round(seconds, 4), ok])
+
+    def flush(self, sync=True):
+        with self.lock:
+            lines, self.buffer = self.buffer, []
+            if self.file.closed:
+                return
+            self.file.writelines(lines)
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.fsync_interval):
+            self.flush()
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.flush()
+        with self.lock:
+            self.file.close()
+
+
+def read_events(path=DEFAULT_PATH, session_id=None):
+    # yields (time, session id, code, payload); a half-written last line from a crash is skipped
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t", 3)
+            if len(parts) != 4 or (session_id is not None and parts[1] != session_id):
+                continue
+            try:
+                payload = json.loads(parts[3])
+            except json.JSONDecodeError:
+                continue
+            yield float(parts[0]), parts[1], parts[2], payload
+
+
+def replay_session(session_id, path=DEFAULT_PATH, **session_kwargs):
+    # rebuilds a QuizSession from its events; the rebuilt session doesn't log anything itself
+    from question_format import Question
+    from tutor_ai import QuizSession
+
+    session = None
+    for at, _, code, payload in read_events(path, session_id):
+        if code == SESSION_STARTED:
+            topic, difficulty, max_questions = payload[:3]
+            # sessions logged before multi-topic mode have no topic list
+            topics = payload[3] if len(payload) > 3 else None
+            session = QuizSession(topic, difficulty, session_id=session_id, topics=topics,
+                                  max_questions=max_questions, **session_kwargs)
+        elif session is None:
+            continue
+        elif code == QUESTION_SERVED:
+            question, choices, letter, explanation, difficulty = payload[:5]
+            session.plan()
+            if len(payload) > 5:
+                session.upcoming_topic = payload[5]
+            session.serve_question(Question(question, tuple(choices), letter, explanation, difficulty), at)
+        elif code == ANSWER_SUBMITTED:
+            session.record_answer(payload[1], at=at)
+        elif code == HINT_REQUESTED:
+            session.hint_requested()
+    return session
+
+
+def session_history(session_id, path=DEFAULT_PATH):
+    # the quiz as plain data: every question with the answers given, for exporting
+    history = {'session_id': session_id, 'questions': []}
+    for at, _, code, payload in read_events(path, session_id):
+        if code == SESSION_STARTED:
+            history.update(topic=payload[0], difficulty=payload[1], started_at=at)
+        elif code == QUESTION_SERVED:
+            history['questions'].append({'question': payload[0], 'choices': payload[1], 'answer': payload[2],
+                                         'explanation': payload[3], 'attempts': [], 'hints': 0})
+            if len(payload) > 5:
+                history['questions'][-1]['topic'] = payload[5]
+        elif code == ANSWER_SUBMITTED and history['questions']:
+            history['questions'][-1]['attempts'].append({'letter': payload[1], 'correct': payload[2], 'at': at})
+        elif code == HINT_REQUESTED and history['questions']:
+            history['questions'][-1]['hints'] += 1
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look through the session event log.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sessions", help="list the sessions in the log")
+    export_cmd = sub.add_parser("export", help="print one session's quiz history as json")
+    export_cmd.add_argument("session_id")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(session_history(args.session_id, args.path), indent=2))
+        return
+    for at, session_id, code, payload in read_events(args.path):
+        if code == SESSION_STARTED:
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(at))
+            print(f"{session_id}  {started}  {payload[0]} ({payload[1]})")
+
+
+if __name__ == "__main__":
+    main()
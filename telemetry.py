@@ -0,0 +1,300 @@
+# timing spans, token counts and counters for everything that talks to the model
+# off unless PAST_TELEMETRY is set or enable() is called; while it's off span() hands back one shared
+# do-nothing span and count() returns straight away, so the calls can stay in the hot paths
+# finished spans and counter bumps go to whichever exporters are plugged in:
+#   RingBuffer          the last N spans in memory (benchmarks, poking around from a REPL)
+#   JsonLinesExporter   one json line per finished span
+#   PrometheusExporter  running totals and latency histograms in the Prometheus text format;
+#                       serve() puts them on http://host:port/metrics (the quiz server has GET /metrics too)
+# spans nest through a contextvar, which also follows a call onto GeminiClient's loop thread, so the tokens
+# a model call used land on the span that made it (and every span around that one)
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+enabled = False
+exporters = []
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent", "started_at", "duration", "ok", "error", "_start", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_ids)
+        self.parent = None
+        self.started_at = 0.0
+        self.duration = 0.0
+        self.ok = True
+        self.error = None
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass  # closed from another context (a generator finished elsewhere); nothing to undo there
+        if exc is not None:
+            self.fail(type(exc).__name__)
+        for exporter in exporters:
+            exporter.export(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def fail(self, error):
+        self.ok = False
+        self.error = str(error)
+
+    def to_dict(self):
+        return {'span': self.name, 'id': self.span_id, 'parent': self.parent.span_id if self.parent else None,
+                'at': round(self.started_at, 3), 'ms': round(self.duration * 1000, 3), 'ok': self.ok,
+                'error': self.error, **self.attrs}
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name, **attrs):
+    if not enabled:
+        return NO_SPAN
+    return Span(name, attrs)
+
+
+def current():
+    # the innermost open span, or the do-nothing one
+    return (_current.get() or NO_SPAN) if enabled else NO_SPAN
+
+
+def count(name, amount=1, **labels):
+    if not enabled:
+        return
+    for exporter in exporters:
+        exporter.count(name, amount, labels)
+
+
+def record_usage(usage_metadata, operation="generate"):
+    # token counts off a Gemini response's usage_metadata (fake models may not have one)
+    if not enabled or usage_metadata is None:
+        return
+    prompt_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+    response_tokens = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+    # counted on the span that made the call and on every span it's nested in
+    span = _current.get()
+    while span is not None:
+        span.add('prompt_tokens', prompt_tokens)
+        span.add('response_tokens', response_tokens)
+        span = span.parent
+    count("prompt_tokens", prompt_tokens, operation=operation)
+    count("response_tokens", response_tokens, operation=operation)
+
+
+def enable(*new_exporters):
+    global enabled
+    exporters.extend(new_exporters)
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+    for exporter in exporters:
+        exporter.close()
+    exporters.clear()
+
+
+def find(exporter_type):
+    for exporter in exporters:
+        if isinstance(exporter, exporter_type):
+            return exporter
+    return None
+
+
+class Exporter:
+    def export(self, span):
+        pass
+
+    def count(self, name, amount, labels):
+        pass
+
+    def close(self):
+        pass
+
+
+class RingBuffer(Exporter):
+    def __init__(self, size=1024):
+        self.spans = deque(maxlen=size)
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+    def count(self, name, amount, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def recent(self, name=None):
+        return [s for s in list(self.spans) if name is None or s['span'] == name]
+
+
+class JsonLinesExporter(Exporter):
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), separators=(',', ':')) + "\n"
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+# seconds; model calls take anywhere from a few hundred ms to tens of seconds, parsing takes microseconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+
+class PrometheusExporter(Exporter):
+    def __init__(self, prefix="past", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}  # span name -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+        self.server = None
+
+    def export(self, span):
+        with self.lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            if not span.ok:
+                key = ("span_errors", (("span", span.name),))
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def count(self, name, amount, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((name, list(h)) for name, h in self.histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        metric = f"{self.prefix}_span_seconds"
+        if histograms:
+            lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in histograms:
+            for bound, bucket in zip(self.buckets, histogram):
+                lines.append(f"{metric}_bucket{_labels((('span', name), ('le', bound)))} {bucket}")
+            lines.append(f"{metric}_bucket{_labels((('span', name), ('le', '+Inf')))} {histogram[-2]}")
+            lines.append(f"{metric}_sum{_labels((('span', name),))} {histogram[-1]:.6f}")
+            lines.append(f"{metric}_count{_labels((('span', name),))} {histogram[-2]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+def configure_from_env():
+    # PAST_TELEMETRY=1 keeps spans in memory, PAST_TELEMETRY=path.jsonl writes them to a file as well;
+    # PAST_METRICS_PORT serves Prometheus metrics on that port
+    setting = os.environ.get("PAST_TELEMETRY")
+    port = os.environ.get("PAST_METRICS_PORT")
+    if not setting and not port:
+        return
+    new_exporters = [RingBuffer()]
+    if setting and setting != "1":
+        new_exporters.append(JsonLinesExporter(setting))
+    if port:
+        prometheus = PrometheusExporter()
+        prometheus.serve(int(port))
+        new_exporters.append(prometheus)
+    enable(*new_exporters)
@@ -1,28 +1,354 @@
-import google.generativeai as genai
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import groupby
 
-# turn this on if you're just testing stuff (no Gemini calls)
-MOCK_MODE = False  # Set to False when you're ready to demo with Gemini
+import intents
+import prompts
+import telemetry
+from gemini_client import GeminiClient, ModelUnavailableError
+from mastery import LEVELS, Mastery, expected, normalize_difficulty
+from near_dup import NearDuplicateIndex
+from question_format import (BATCH_EXTRAS_SCHEMA, BATCH_SCHEMA, QUESTION_EXTRAS_SCHEMA, QUESTION_SCHEMA, Attempt,
+                             Question, QuestionFormatError, json_config, parse_batch, parse_question,
+                             split_text_batch)
+from scheduler import SessionScheduler
+from scoring import Scorecard
+from seen_questions import SeenQuestions, as_seen, recent
+from session_log import ANSWER_SUBMITTED, HINT_REQUESTED, QUESTION_SERVED, SESSION_STARTED
+
+# prompts go out at DEBUG, parse failures at INFO and API errors at WARNING (main.py --log-level picks)
+log = logging.getLogger(__name__)
+
+# turn this on if you're just testing stuff (no Gemini calls, one canned question); PAST_MOCK_MODE=1 does it too
+# for realistic offline runs use a model backend instead (see MODEL_BACKEND)
+MOCK_MODE = os.environ.get("PAST_MOCK_MODE") == "1"
+
+MODEL_NAME = "models/gemini-1.5-pro-latest"
+
+# ask Gemini for JSON matching a schema instead of free text (streamed requests still use the text format,
+# since the stem/choice events are read line by line as it comes in)
+STRUCTURED_OUTPUT = True
+
+# speculative mode: ask for the hint and a line per wrong choice on why it's wrong in the same request as the
+# question, so "Get Hint" and the wrong-answer feedback don't wait on the model; costs more tokens per question
+#   off           only when the student asks (one request per hint)
+#   always        every question
+#   hard          hard questions only
+#   likely_wrong  when the student's chance of getting it right first try (see mastery.py) is under 1 - LIKELY_WRONG
+# questions that arrive without them (the question bank, older saved ones) get their hint fetched in the
+# background as they're served instead
+SPECULATE_POLICIES = ("off", "always", "hard", "likely_wrong")
+SPECULATE = os.environ.get("PAST_SPECULATE", "off")
+LIKELY_WRONG = 0.35
+
+# tokens one session may spend on the model before new calls are refused (hints and follow-ups then come back
+# as errors and next_question() as None, like when the model is down); None counts without a limit
+TOKEN_BUDGET = int(os.environ.get("PAST_TOKEN_BUDGET", "0")) or None
+
+# which model backend gets built on first use: "gemini", "synthetic", "record:PATH" or "replay:PATH"
+# (see model_backends.py); PAST_MODEL_LATENCY sets the simulated latency of the offline ones
+MODEL_BACKEND = os.environ.get("PAST_MODEL_BACKEND", "gemini")
+
+# set this to swap in a different model object (fake models in benchmarks, etc.)
+# left as None, the backend above gets built the first time something asks for it
+model = None
+
+
+def _build_model():
+    from model_backends import create
+
+    latency = os.environ.get("PAST_MODEL_LATENCY")
+    return create(MODEL_BACKEND, _build_gemini_model, float(latency) if latency else None)
+
+
+def _build_gemini_model():
+    # google.generativeai drags in grpc/protobuf and takes about a second to import,
+    # so it only happens here instead of when the app starts
+    import google.generativeai as genai
 
-if not MOCK_MODE:
     genai.configure(api_key="INSERT YOUR API KEY HERE")
-    model = genai.GenerativeModel(model_name="models/gemini-1.5-pro-latest")
+    # set once here instead of repeated in every prompt (v1 prompts have none)
+    return genai.GenerativeModel(model_name=MODEL_NAME, system_instruction=prompts.system_instruction())
+
+
+# builds the model once, on first use, no matter how many threads ask for it at the same time
+class ModelProvider:
+    def __init__(self, factory):
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+        self.warm_thread = None
+
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    self.instance = self.factory()
+        return self.instance
+
+    def warm_up(self):
+        # start building it in the background so it's ready by the time the first question is asked
+        with self.lock:
+            if self.instance is not None or self.warm_thread is not None:
+                return
+            self.warm_thread = threading.Thread(target=self.get, name="model-warmup", daemon=True)
+            self.warm_thread.start()
+
+
+model_provider = ModelProvider(_build_model)
+
+
+def get_model():
+    return model if model is not None else model_provider.get()
+
+
+def warm_up_model():
+    if not MOCK_MODE and model is None and MODEL_BACKEND == "gemini":
+        model_provider.warm_up()
+
+
+# every model call goes through this one client (shared loop, concurrency limit, retries, circuit breaker)
+client = GeminiClient(get_model)
+
+
+# when several callers send the exact same prompt at the same time, only the first one (the leader) calls
+# the model and everyone else waits on its result; works for threads and event loops alike
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [concurrent.futures.Future of the shared result, callers waiting on it, the leader's task if async]
+        self.in_flight = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def _join(self, key):
+        with self.lock:
+            flight = self.in_flight.get(key)
+            if flight is not None:
+                flight[1] += 1
+                self.stats['coalesced'] += 1
+                telemetry.count("coalesced_calls")
+                return flight, False
+            flight = self.in_flight[key] = [Future(), 1, None]
+            self.stats['calls'] += 1
+            return flight, True
+
+    def _settle(self, key, flight, result=None, error=None):
+        with self.lock:
+            if self.in_flight.get(key) is flight:
+                del self.in_flight[key]
+        if error is not None:
+            flight[0].set_exception(error)
+        else:
+            flight[0].set_result(result)
+
+    def _leave(self, key, flight):
+        # an async caller was cancelled; once nobody is waiting, the shared call has nobody to finish for
+        with self.lock:
+            flight[1] -= 1
+            task = flight[2]
+            if flight[1] > 0 or task is None:
+                return
+            if self.in_flight.get(key) is flight:
+                del self.in_flight[key]
+        task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def do(self, key, fn):
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                self._settle(key, flight, result=fn())
+            except BaseException as e:
+                self._settle(key, flight, error=e)
+        return flight[0].result()
+
+    async def do_async(self, key, make_coro):
+        flight, leader = self._join(key)
+        if leader:
+            # the call runs as a task of its own, so cancelling whoever happened to start it (the gui moving on
+            # from a hint) doesn't cancel it for everyone else, or hand them its CancelledError
+            flight[2] = asyncio.ensure_future(self._lead(key, flight, make_coro))
+        try:
+            return await asyncio.shield(asyncio.wrap_future(flight[0]))
+        except asyncio.CancelledError:
+            self._leave(key, flight)
+            raise
+
+    async def _lead(self, key, flight, make_coro):
+        try:
+            result = await make_coro()
+        except asyncio.CancelledError:
+            with self.lock:
+                if self.in_flight.get(key) is flight:
+                    del self.in_flight[key]
+            flight[0].cancel()
+            raise
+        except Exception as e:
+            self._settle(key, flight, error=e)
+        else:
+            self._settle(key, flight, result=result)
+
+
+# small thread-safe memo cache: least recently used entries go first, and nothing is kept past ttl seconds
+class TTLCache:
+    def __init__(self, max_size=1024, ttl=3600.0, name="cache"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                telemetry.count("cache_misses", cache=self.name)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            telemetry.count("cache_hits", cache=self.name)
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+single_flight = SingleFlight()
+# hint prompts depend only on the question, so the same hint can go to every student who asks for it
+hint_cache = TTLCache(max_size=2048, ttl=6 * 3600, name="hints")
+# follow-up prompts carry the question they're about, so a student asking the same thing twice (or a second
+# student on the same question) gets the earlier answer straight back
+follow_up_cache = TTLCache(max_size=2048, ttl=6 * 3600, name="follow_ups")
+
+
+# one model call per distinct prompt in flight; pass a cache for prompts whose answer is worth reusing
+# (key = what to cache it under when that isn't the prompt itself)
+def generate_shared(prompt, cache=None, generation_config=None, key=None):
+    key = key or prompt
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            telemetry.current().set(cached=True)
+            return cached
+    text = single_flight.do(prompt, lambda: client.generate(prompt, generation_config=generation_config))
+    if cache is not None:
+        cache.put(key, text)
+    return text
+
+
+async def generate_shared_async(prompt, cache=None, key=None):
+    key = key or prompt
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            telemetry.current().set(cached=True)
+            return cached
+    text = await single_flight.do_async(prompt, lambda: client.generate_async(prompt))
+    if cache is not None:
+        cache.put(key, text)
+    return text
+
+
+# streaming versions: a cached reply comes back as one chunk; a stream that gets cut off isn't cached
+def stream_shared(prompt, cache, key=None):
+    key = key or prompt
+    cached = cache.get(key)
+    if cached is not None:
+        telemetry.current().set(cached=True)
+        yield cached
+        return
+    parts = []
+    for chunk in stream_text(prompt):
+        parts.append(chunk)
+        yield chunk
+    cache.put(key, "".join(parts).strip())
+
+
+async def stream_shared_async(prompt, cache, key=None):
+    key = key or prompt
+    cached = cache.get(key)
+    if cached is not None:
+        telemetry.current().set(cached=True)
+        yield cached
+        return
+    parts = []
+    async for chunk in client.stream_async(prompt):
+        parts.append(chunk)
+        yield chunk
+    cache.put(key, "".join(parts).strip())
 
 
-def set_question_difficulty(prompt_level="easy"):
-    prompt_map = {
-        "easy": "on a general knowledge topic for beginners.",
-        "medium": "that requires some critical thinking or background knowledge.",
-        "hard": "that is challenging and requires higher-level reasoning."
-    }
-    return prompt_map.get(prompt_level, prompt_map["easy"])
+def coalescing_stats():
+    return {'model_calls': single_flight.stats['calls'], 'coalesced': single_flight.stats['coalesced'],
+            'hint_cache': hint_cache.stats(), 'follow_up_cache': follow_up_cache.stats()}
 
 
-def generate_quiz_question(topic, difficulty="easy", recent_questions=None):
+# chance_correct = how likely the student is to get it right first try, when we know
+def should_speculate(policy, difficulty, chance_correct=None):
+    if policy == "always":
+        return True
+    if policy == "hard":
+        return normalize_difficulty(difficulty) == "hard"
+    if policy == "likely_wrong":
+        return chance_correct is not None and chance_correct < 1 - LIKELY_WRONG
+    return False
+
+
+def question_schema(extras=False, batch=False):
+    if batch:
+        return BATCH_EXTRAS_SCHEMA if extras else BATCH_SCHEMA
+    return QUESTION_EXTRAS_SCHEMA if extras else QUESTION_SCHEMA
+
+
+# the prompt texts live in prompts.py (PAST_PROMPTS picks the version); these fill them in
+def build_question_prompt(topic, difficulty="easy", recent_questions=None, structured=False, extras=False):
+    version = prompts.VERSION
+    recent_qs = list(recent_questions)[-8:] if recent_questions else []
+    exclusions = ""
+    if recent_qs:
+        item = prompts.template("exclusion", version)
+        exclusions = prompts.render("exclusions", version,
+                                    listed="\n".join(item.render({'text': q}) for q in recent_qs))
+    return prompts.render("question", version, topic=topic,
+                          level=prompts.render(f"level.{normalize_difficulty(difficulty)}", version),
+                          rules=prompts.rules(version, structured, extras), exclusions=exclusions,
+                          example="" if structured else prompts.render("example", version))
+
+
+# on_event (optional) switches to a streamed request and gets ("stem"/"choice", ...) events as lines arrive
+# extras = ask for the hint and why-wrong lines along with the question (see SPECULATE)
+def generate_quiz_question(topic, difficulty="easy", recent_questions=None, on_event=None, extras=False):
     if MOCK_MODE:
         return {
             'question': f"What is a basic concept in {topic}?",
             'choices': ["Option A", "Option B", "Option C", "Option D"],
             'answer': "Option A",
+            'answer_letter': "A",
             'explanation': f"This is a sample explanation related to {topic}.",
             'difficulty': 'easy',
             'question_text': f"What is a basic concept in {topic}?"
@@ -31,97 +357,297 @@ def generate_quiz_question(topic, difficulty="easy", recent_questions=None):
     if not topic:
         raise ValueError("Topic is required to generate a quiz question.")
 
-    difficulty_prompt = set_question_difficulty(difficulty)
-    recent_qs = list(recent_questions)[-3:] if recent_questions else []
-    prompt = f"""
-You are an expert tutor. Generate one unique multiple-choice quiz question on the topic: "{topic}"
-
-Requirements:
-- Ask a clear, academically accurate question.
-- Provide four answer options labeled A, B, C, and D.
-- Only one answer should be correct.
-- Clearly label the correct answer with: Answer: [Correct Letter]
-- Also include a brief explanation after the answer, clearly labeled: Explanation: [your explanation here]
-- Do not repeat any recent questions that begin with: {{recent_questions}}
-
-Example:
-What does CPU stand for?
-A. Central Processing Unit
-B. Computer Program Utility
-C. Central Power Unit
-D. Computer Performance Unit
-Answer: A
-Explanation: The CPU, or Central Processing Unit, is the primary component of a computer that performs most of the processing inside a computer.
-
-The difficulty level should be {difficulty_prompt}
-"""
-    print(f"[Prompt Sent to Gemini]:\n{prompt}")
+    structured = STRUCTURED_OUTPUT and on_event is None
+    prompt = build_question_prompt(topic, difficulty, recent_questions, structured, extras)
+    log.debug("prompt sent to Gemini:\n%s", prompt)
+    config = json_config(question_schema(extras)) if structured else None
 
-    try:
-        response = model.generate_content(prompt)
-        if not hasattr(response, 'text') or not response.text:
-            raise ValueError("Gemini response did not return text.")
-        content = response.text.strip()
-
-        lines = content.split("\n")
-        question = ""
-        choices = []
-        answer_letter = ""
-        explanation = ""
-        question_found = False
-
-        for line in lines:
-            line = line.strip()
-            if not line:
+    # a reply we can't use gets one more try; no placeholder question here, callers treat None as
+    # "couldn't get one" instead of showing it
+    with telemetry.span("generate_quiz_question", difficulty=difficulty, structured=structured, extras=extras) as span:
+        for attempt in range(2):
+            try:
+                content = fetch_question_text(prompt, on_event if attempt == 0 else None, generation_config=config)
+                return parse_question_text(content, difficulty)
+            except QuestionFormatError as e:
+                log.info("unusable question from Gemini: %s", e)
+                span.add('parse_errors', 1)
+                telemetry.count("parse_errors")
+            except Exception as e:
+                log.warning("Gemini API error: %s", e)
+                span.fail(e)
+                return None
+        span.fail("no usable question")
+        return None
+
+
+# yields the model's reply piece by piece as it streams in
+def stream_text(prompt):
+    yield from client.stream(prompt)
+
+
+# reads a question (or a whole batch) as it streams in and reports each piece as soon as its line is done,
+# so the stem can go on screen before the model has even written the choices
+class QuestionStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.index = 0  # which question in the reply we're on
+        self.has_stem = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        events = []
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            events.extend(self._line(line.strip()))
+        return events
+
+    def close(self):
+        line, self.buffer = self.buffer.strip(), ""
+        return self._line(line)
+
+    def _line(self, line):
+        line = line.replace("**", "").strip()
+        if not line:
+            return []
+        if re.match(r"^-{3,}$", line) or (self.has_stem and re.match(r"^Question\s*\d+\s*[:.)]", line)):
+            if self.has_stem:
+                self.index += 1
+                self.has_stem = False
+            if line.startswith("-"):
+                return []
+        choice = re.match(r"^\(?([A-D])\s*[.):\]]\s+(.*)$", line)
+        if choice:
+            return [("choice", self.index, choice.group(1), choice.group(2).strip())]
+        if re.match(r"^(Correct\s+)?(Answer|Explanation)\b", line, re.IGNORECASE) or self.has_stem:
+            return []
+        self.has_stem = True
+        return [("stem", self.index, re.sub(r"^Question\s*\d*\s*[:.)]\s*", "", line))]
+
+
+# plain request when nobody is watching, streamed (and parsed as it goes) when on_event is given
+# shared lets identical prompts in flight at the same moment share one call (see SingleFlight)
+def fetch_question_text(prompt, on_event=None, shared=False, generation_config=None):
+    if on_event is None:
+        if shared:
+            return generate_shared(prompt, generation_config=generation_config)
+        return client.generate(prompt, generation_config=generation_config)
+
+    parser = QuestionStreamParser()
+    parts = []
+    for chunk in stream_text(prompt):
+        parts.append(chunk)
+        for event in parser.feed(chunk):
+            on_event(event)
+    for event in parser.close():
+        on_event(event)
+    content = "".join(parts).strip()
+    if not content:
+        raise ValueError("Gemini response did not return text.")
+    return content
+
+
+# turns one question's worth of model reply (JSON or text) into our question dict
+# raises QuestionFormatError when it isn't a complete, gradeable question
+def parse_question_text(content, difficulty="easy"):
+    return parse_question(content, difficulty).to_dict()
+
+
+# a question is only usable if it has a stem, exactly four choices and an answer that points at one of them
+def is_valid_question(question_data):
+    return (
+        bool(question_data.get('question_text'))
+        and len(question_data.get('choices', [])) == 4
+        and question_data.get('answer_letter') in ("A", "B", "C", "D")
+        and question_data.get('answer') != "Unknown"
+    )
+
+
+def normalize_question_text(text):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split())
+
+
+def split_question_batch(content):
+    return split_text_batch(content)
+
+
+def parse_question_batch(content, difficulty="easy"):
+    # returns (good questions, number of questions that didn't parse or validate)
+    questions, rejected = parse_batch(content, difficulty)
+    return [q.to_dict() for q in questions], rejected
+
+
+# difficulty, or for a batch at several levels, how many questions at each in the order they're wanted
+def batch_level_text(difficulty, version):
+    levels = [difficulty] if isinstance(difficulty, str) else difficulty
+    runs = [(normalize_difficulty(level), len(list(group))) for level, group in groupby(levels)]
+    if len(runs) == 1:
+        return prompts.render(f"level.{runs[0][0]}", version)
+    return prompts.render("level.mixed", version, levels="; ".join(
+        f"{count} {prompts.render(f'level.{level}', version).rstrip('.')}" for level, count in runs))
+
+
+# the levels in levels (in order) that questions doesn't have a question at yet
+def missing_levels(levels, questions):
+    have = Counter(q['difficulty'] for q in questions)
+    missing = []
+    for level in levels:
+        if have[level]:
+            have[level] -= 1
+        else:
+            missing.append(level)
+    return missing
+
+
+# stores a batch in the bank, each question at its own level
+def store_batch(bank, topic, questions):
+    for level in dict.fromkeys(q['difficulty'] for q in questions):
+        bank.add(topic, level, [q for q in questions if q['difficulty'] == level])
+
+
+def build_batch_prompt(topic, count, difficulty="easy", exclude_questions=None, structured=False, extras=False):
+    version = prompts.VERSION
+    exclusions = ""
+    if exclude_questions:
+        item = prompts.template("batch_exclusion", version)
+        exclusions = prompts.render("exclusions", version,
+                                    listed="\n".join(item.render({'text': q}) for q in exclude_questions))
+    return prompts.render("batch", version, topic=topic, count=count, level=batch_level_text(difficulty, version),
+                          rules=prompts.rules(version, structured, extras, batch=True), exclusions=exclusions,
+                          example="" if structured else prompts.render("batch_example", version))
+
+
+# asks for a whole quiz in one call; only the questions that come back broken or repeated get asked for again
+# difficulty can also be a list of count levels, one per question in the order they're wanted (a mixed batch)
+def generate_quiz_batch(topic, count, difficulty="easy", seen_questions=None, retries=2, seen_index=None,
+                        on_event=None, extras=False):
+    if not topic:
+        raise ValueError("Topic is required to generate a quiz question.")
+    levels = [difficulty] * count if isinstance(difficulty, str) else list(difficulty)
+    if MOCK_MODE:
+        return [generate_quiz_question(topic, levels[0])]
+
+    if seen_index is None:
+        seen_index = NearDuplicateIndex()
+        for text in recent(seen_questions):
+            seen_index.add(text)
+    seen_questions = as_seen(seen_questions)
+    seen = set()  # normalized stems of the questions in this batch
+    with telemetry.span("generate_quiz_batch", difficulty=levels[0], count=count, extras=extras) as span:
+        batch_index = NearDuplicateIndex()
+        batch = []
+        attempts = retries + 1
+        while len(batch) < count and attempts > 0:
+            attempts -= 1
+            missing = missing_levels(levels, batch)[:count - len(batch)]
+            exclude = recent(seen_questions, 10) + [q['question_text'] for q in batch]
+            # only the first request streams; retries just fill gaps further down the quiz
+            stream_to = on_event if attempts == retries else None
+            structured = STRUCTURED_OUTPUT and stream_to is None
+            prompt = build_batch_prompt(topic, len(missing), missing, exclude, structured, extras)
+            try:
+                # a whole-quiz prompt is the same for every new student on a topic, so those can share a call
+                # (single-question prompts don't: two prefetch workers with the same prompt want different questions)
+                content = fetch_question_text(prompt, stream_to, shared=True,
+                                              generation_config=json_config(question_schema(extras, batch=True))
+                                              if structured else None)
+                questions, rejected = parse_question_batch(content, missing)
+            except ModelUnavailableError as e:
+                log.warning("Gemini API error: %s", e)
+                break
+            except Exception as e:
+                log.warning("Gemini API error: %s", e)
                 continue
-            if line.startswith(("A.", "B.", "C.", "D.")):
-                choices.append(line[3:].strip())
-            elif line.startswith("Answer:"):
-                answer_letter = line.replace("Answer:", "").strip().upper()
-            elif line.startswith("Explanation:"):
-                explanation = line.replace("Explanation:", "").strip()
-            elif not question_found:
-                question = line
-                question_found = True
-
-        answer_index = ord(answer_letter) - ord('A')
-        answer_text = choices[answer_index] if 0 <= answer_index < len(choices) else "Unknown"
+            for question_data in questions:
+                text = question_data['question_text']
+                key = normalize_question_text(text)
+                if len(batch) >= count or key in seen or text in seen_questions:
+                    continue
+                if seen_index.find(text, question_data['choices']) or batch_index.find(text, question_data['choices']):
+                    span.add('duplicates', 1)
+                    continue
+                seen.add(key)
+                batch_index.add(text, question_data['choices'])
+                batch.append(question_data)
+            if rejected:
+                log.info("%d batch question(s) failed validation, %d still needed", rejected, count - len(batch))
+                telemetry.count("parse_errors", rejected)
+        span.set(returned=len(batch))
+    return batch
 
-        return {
-            'question': question,
-            'choices': choices,
-            'answer': answer_text,
-            'answer_letter': answer_letter,
-            'explanation': explanation,
-            'difficulty': difficulty,
-            'question_text': question
-        }
 
-    except Exception as e:
-        print(f"[Gemini API Error] {e}")
-        return {
-            'question': "Error generating question.",
-            'choices': ["A", "B", "C", "D"],
-            'answer': "A",
-            'explanation': str(e),
-            'difficulty': difficulty,
-            'question_text': "Error generating question."
-        }
+MOCK_HINT = "It's an organelle that produces ATP, often referred to as the energy factory."
 
 
-def generate_hint(question_text):
+# question = the Question on screen; the prompt carries its stem and options (not the answer)
+def build_hint_prompt(question):
+    return prompts.render("hint", question=question.question, options=prompts.options(question.choices),
+                          explanation=question.explanation)
+
+
+def generate_hint(question):
     if MOCK_MODE:
-        return "It's an organelle that produces ATP, often referred to as the energy factory."
+        return MOCK_HINT
+
+    with telemetry.span("generate_hint") as span:
+        try:
+            return generate_shared(build_hint_prompt(question), hint_cache)
+        except Exception as e:
+            span.fail(e)
+            return f"Error fetching hint: {str(e)}"
 
+
+async def generate_hint_async(question):
+    if MOCK_MODE:
+        return MOCK_HINT
+
+    with telemetry.span("generate_hint") as span:
+        try:
+            return await generate_shared_async(build_hint_prompt(question), hint_cache)
+        except Exception as e:
+            span.fail(e)
+            return f"Error fetching hint: {str(e)}"
+
+
+# starts fetching a hint in the background so it's in hint_cache by the time anyone asks
+def warm_hint(question):
+    telemetry.count("hints_warmed")
+    return client.submit(generate_hint_async(question))
+
+
+# an async stream of text we already have
+async def ready_stream(text):
+    yield text
+
+
+# same as generate_hint, but yields the text as it streams in
+def stream_hint(question):
+    if MOCK_MODE:
+        yield MOCK_HINT
+        return
     try:
-        prompt = f"Provide a helpful hint for this quiz question without revealing the answer: {question_text}"
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        yield from stream_shared(build_hint_prompt(question), hint_cache)
     except Exception as e:
-        return f"Error fetching hint: {str(e)}"
+        yield f"Error fetching hint: {str(e)}"
+
+
+async def stream_hint_async(question):
+    if MOCK_MODE:
+        yield MOCK_HINT
+        return
+    with telemetry.span("stream_hint") as span:
+        try:
+            async for chunk in stream_shared_async(build_hint_prompt(question), hint_cache):
+                yield chunk
+        except Exception as e:
+            span.fail(e)
+            yield f"Error fetching hint: {str(e)}"
 
 
-def follow_up_response(followup_prompt, attempt_count=0):
+# the answers we give without asking the model: mock mode, or a follow-up intents.py recognizes (fishing for
+# the answer, asking for a hint or the options again, why their answer was wrong) that it can answer from
+# question, the Question on screen; last_letter = the wrong answer the student last gave, if any
+def canned_follow_up(followup_prompt, attempt_count=0, question=None, last_letter=None):
     if MOCK_MODE:
         if attempt_count < 3:
             return (
@@ -137,37 +663,89 @@ def follow_up_response(followup_prompt, attempt_count=0):
                 "The nucleus handles genetic control, ribosomes build proteins, and chloroplasts handle photosynthesis in plants. But only one organelle is directly responsible for producing ATP—the main energy carrier in the cell. Think about which one that is!"
             )
 
-    lower_prompt = followup_prompt.lower()
-    banned_phrases = [
-        "what's the answer", "what is the answer", "give me the answer",
-        "which one is correct", "is it", "correct answer",
-        "choose the right one", "is the answer", "tell me the answer"
-    ]
-    if any(phrase in lower_prompt for phrase in banned_phrases):
-        if attempt_count < 3:
-            return (
-                "Not just yet! Let's go over the options to help you out:\n\n"
-                "• Nucleus: Directs cell activity and holds DNA, but doesn't create energy.\n"
-                "• Ribosome: Builds proteins—important, but not related to energy.\n"
-                "• Chloroplast: Converts sunlight into food in plants—photosynthesis, not energy for cellular work.\n\n"
-                "Think carefully—which one is actually known for making ATP, the cell’s fuel?"
-            )
-        else:
-            return ("You've made several attempts—keep going!\n\n"
-                    "Nucleus: Stores genetic material and regulates the cell, but does not produce energy.\n"
-                    "Ribosome: Synthesizes proteins, not involved in energy production.\n"
-                    "Chloroplast: Converts sunlight into sugar in plants, not ATP.\n\n"
-                    "Focus on which organelle produces ATP, the cell’s main energy source.")
+    intent = intents.classify(followup_prompt, question)
+    if intent is None:
+        return None
+    hint = ""
+    if question is not None:
+        hint = question.hint or hint_cache.get(build_hint_prompt(question)) or ""
+    reply = intents.respond(intent, question, attempt_count, hint, last_letter)
+    if reply is not None:
+        telemetry.count("canned_follow_ups", intent=intent)
+    return reply
+
+
+# question = the Question the student is asking about, so the answer fits it (and is cached with it);
+# last_letter = the wrong answer they just gave, if any
+def build_follow_up_prompt(followup_prompt, question=None, last_letter=None):
+    context = ""
+    if question is not None:
+        last = prompts.render("follow_up_last", letter=last_letter) if last_letter else ""
+        context = prompts.render("follow_up_context", question=question.question,
+                                 options=prompts.options(question.choices), last=last)
+    return prompts.render("follow_up", prompt=" ".join(followup_prompt.split()), context=context)
+
+
+# the same question asked about the same quiz question, give or take case, spacing and the question mark
+def follow_up_key(followup_prompt, question=None, last_letter=None):
+    question_text = question.question if question else None
+    return question_text, last_letter, " ".join(followup_prompt.lower().split()).rstrip("?!. ")
+
+
+def follow_up_response(followup_prompt, attempt_count=0, question=None, last_letter=None):
+    canned = canned_follow_up(followup_prompt, attempt_count, question, last_letter)
+    if canned is not None:
+        return canned
+    with telemetry.span("follow_up_response") as span:
+        try:
+            return generate_shared(build_follow_up_prompt(followup_prompt, question, last_letter), follow_up_cache,
+                                   key=follow_up_key(followup_prompt, question, last_letter))
+        except Exception as e:
+            span.fail(e)
+            return f"Error fetching follow-up: {str(e)}"
+
+
+async def follow_up_response_async(followup_prompt, attempt_count=0, question=None, last_letter=None):
+    canned = canned_follow_up(followup_prompt, attempt_count, question, last_letter)
+    if canned is not None:
+        return canned
+    with telemetry.span("follow_up_response") as span:
+        try:
+            return await generate_shared_async(build_follow_up_prompt(followup_prompt, question, last_letter),
+                                               follow_up_cache,
+                                               key=follow_up_key(followup_prompt, question, last_letter))
+        except Exception as e:
+            span.fail(e)
+            return f"Error fetching follow-up: {str(e)}"
 
+
+# same as follow_up_response, but yields the text as it streams in
+def stream_follow_up(followup_prompt, attempt_count=0, question=None, last_letter=None):
+    canned = canned_follow_up(followup_prompt, attempt_count, question, last_letter)
+    if canned is not None:
+        yield canned
+        return
     try:
-        formatted = (
-            f"A student asked: '{followup_prompt}'.\n"
-            f"Please provide a helpful explanation or clarification, without revealing the quiz answer directly. Keep the tone friendly and educational."
-        )
-        response = model.generate_content(formatted)
-        return response.text.strip()
+        yield from stream_shared(build_follow_up_prompt(followup_prompt, question, last_letter), follow_up_cache,
+                                 key=follow_up_key(followup_prompt, question, last_letter))
     except Exception as e:
-        return f"Error fetching follow-up: {str(e)}"
+        yield f"Error fetching follow-up: {str(e)}"
+
+
+async def stream_follow_up_async(followup_prompt, attempt_count=0, question=None, last_letter=None):
+    canned = canned_follow_up(followup_prompt, attempt_count, question, last_letter)
+    if canned is not None:
+        yield canned
+        return
+    with telemetry.span("stream_follow_up") as span:
+        try:
+            async for chunk in stream_shared_async(build_follow_up_prompt(followup_prompt, question, last_letter),
+                                                   follow_up_cache,
+                                                   key=follow_up_key(followup_prompt, question, last_letter)):
+                yield chunk
+        except Exception as e:
+            span.fail(e)
+            yield f"Error fetching follow-up: {str(e)}"
 
 
 # some handy functions moved over from gui.py to keep things tidy
@@ -176,7 +754,7 @@ def evaluate_answer(user_answer, correct_answer_letter):
     return is_correct
 
 def generate_final_score_message(score, total):
-    percentage = (score / total) * 100
+    percentage = (score / total) * 100 if total else 0
     if percentage == 100:
         return "Perfect score! You're a quiz master!"
     elif percentage >= 80:
@@ -186,79 +764,674 @@ def generate_final_score_message(score, total):
     else:
         return "Keep studying! Let’s go over the topics again for better retention."
 
-def deduplicate_question(topic, seen_questions, difficulty="easy"):
+# reworded repeats count as repeats too, and whatever a rejected question was close to
+# goes back into the next prompt as an exclusion so the retry doesn't land on it again
+def deduplicate_question(topic, seen_questions, difficulty="easy", seen_index=None, on_event=None, extras=False):
+    if seen_index is None:
+        seen_index = NearDuplicateIndex()
+        for text in recent(seen_questions):
+            seen_index.add(text)
+    seen_questions = as_seen(seen_questions)
     retries = 5
     last_question = None
-    while retries > 0:
-        question_data = generate_quiz_question(topic, difficulty, seen_questions)
-        if question_data and question_data['question_text'] not in seen_questions:
-            return question_data
-        last_question = question_data
-        retries -= 1
-    return last_question or {
-        'question': "Failed to generate a unique question.",
-        'choices': ["A", "B", "C", "D"],
-        'answer': "A",
-        'answer_letter': "A",
-        'explanation': "No explanation available.",
-        'difficulty': difficulty,
-        'question_text': "Failed to generate a unique question."
-    }
-
-def generate_feedback(user_answer, correct_letter, explanation, difficulty="easy"):
+    exclusions = recent(seen_questions, 3)
+    with telemetry.span("deduplicate_question", difficulty=difficulty) as span:
+        while retries > 0:
+            # only the first try streams, a retry would just overwrite what's already on screen
+            with telemetry.span("deduplicate_question.attempt", attempt=6 - retries) as attempt_span:
+                stream_to = on_event if retries == 5 else None
+                question_data = generate_quiz_question(topic, difficulty, exclusions, stream_to, extras)
+                if not question_data:
+                    break  # the client already retried, so the model is down rather than repeating itself
+                text = question_data['question_text']
+                match = text if text in seen_questions else seen_index.find(text, question_data['choices'])
+                attempt_span.set(duplicate=bool(match))
+            if not match:
+                return question_data
+            span.add('retries', 1)
+            telemetry.count("dedup_retries")
+            nearest = [t for t, _ in seen_index.nearest(text, question_data['choices'])] or [match]
+            exclusions = [e for e in exclusions if e not in nearest] + nearest
+            last_question = question_data
+            retries -= 1
+        span.fail("no new question")
+    return last_question
+
+# why_not = why the picked choice is wrong, when the question came with it (speculative mode)
+def generate_feedback(user_answer, correct_letter, explanation, difficulty="easy", why_not=""):
     if user_answer.strip().upper() == correct_letter.strip().upper():
         return "Correct! Here's why: " + explanation
     else:
-        return "Not quite. Here's why that's not correct: " + explanation + " Please try again!"
+        return "Not quite. Here's why that's not correct: " + (why_not or explanation) + " Please try again!"
+
+
+class PrefetcherClosedError(RuntimeError):
+    pass
+
+
+# keeps the next few questions generating in the background so "Next Question" doesn't sit on a Gemini call
+# on_ready gets called from a worker thread whenever a question finishes (the gui bridges it to a Qt signal)
+class QuestionPrefetcher:
+    # on_partial, if given, gets the stem/choice events of whichever question the student is waiting on
+    # extras, if given, is called with a difficulty and says whether to ask for hints with those questions
+    # mix, if given, is called with a difficulty and a batch size and gives the level of each question in a batch
+    # asked for at that difficulty (by default all of them are at it)
+    def __init__(self, topic, difficulty="easy", seen_questions=None, depth=2, workers=2, on_ready=None,
+                 batch_size=1, bank=None, seen_index=None, on_partial=None, extras=None, budget=None, mix=None):
+        self.topic = topic
+        self.budget = budget  # the session's prompts.TokenBudget, charged from the worker threads
+        self.extras = extras or (lambda difficulty: False)
+        self.mix = mix or (lambda difficulty, size: [difficulty] * size)
+        self.bank = bank
+        # near-dup index shared with the session; queued questions go in right away so workers avoid them
+        self.seen_index = seen_index if seen_index is not None else NearDuplicateIndex()
+        self.difficulty = difficulty
+        self.seen_questions = seen_questions if seen_questions is not None else SeenQuestions()
+        self.depth = depth
+        self.batch_size = batch_size
+        self.on_ready = on_ready
+        self.on_partial = on_partial
+        self.ready = {}  # difficulty -> questions that are done and waiting to be served
+        self.pending = []  # (future, the level of each question it will bring) in the order they were asked for
+        self.queued_texts = set()  # question texts already queued or served, so workers don't make repeats
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.closed = False
+
+    def fill(self, limit=None, difficulty=None):
+        # top the queue at difficulty (the level needed next) back up to depth, or fewer if the quiz is almost over
+        # a batch also brings a question at each level around difficulty (see mix), so a student who moves one
+        # level usually finds their next question already there; those count toward the depth, but two have to
+        # be at difficulty itself (the next question and one more in case the student stays), and when there
+        # aren't, the rest of the quiz is asked for at difficulty
+        # jobs that bring nothing at difficulty are dropped if they haven't started; what's done waits in ready
+        # in case the student comes back
+        target = self.depth if limit is None else min(self.depth, limit)
+        difficulty = difficulty or self.difficulty
+        around = set(self.mix(difficulty, self.batch_size)) if self.batch_size > 1 else {difficulty}
+        with self.lock:
+            self.pending = [job for job in self.pending if difficulty in job[1] or not job[0].cancel()]
+            here = self._queued(difficulty)
+            queued = sum(self._queued(level) for level in around)
+            wanted = target - here if here < min(2, target) else target - queued
+            while not self.closed and wanted > 0:
+                size = min(self.batch_size, wanted) if self.batch_size > 1 else 1
+                levels = self.mix(difficulty, size) if size > 1 else [difficulty]
+                # nothing is ahead of this job, so it's the one worth streaming to the screen
+                on_event = self._partial if self.on_partial and here == 0 else None
+                job = self._generate_batch if size > 1 else self._generate
+                future = self.executor.submit(self._charged, job, levels, on_event)
+                future.add_done_callback(self._finished)
+                self.pending.append((future, levels))
+                here += levels.count(difficulty)
+                wanted -= size
+
+    def _charged(self, job, *args):
+        with prompts.charging(self.budget):
+            return job(*args)
+
+    def _partial(self, event):
+        # a job still streaming after shutdown() mustn't call into a window that's gone
+        if not self.closed:
+            self.on_partial(event)
+
+    def _queued(self, difficulty):
+        return len(self.ready.get(difficulty, ())) + sum(levels.count(difficulty) for _, levels in self.pending)
+
+    def _first_pending(self, difficulty):
+        for index, (_, levels) in enumerate(self.pending):
+            if difficulty in levels:
+                return index
+        return None
+
+    def _generate_batch(self, levels, on_event=None):
+        with self.lock:
+            exclude = self.seen_questions.plus(self.queued_texts)
+        questions = []
+        if self.bank:
+            for level, count in Counter(levels).items():
+                questions += [dict(q, difficulty=level) for q in self.bank.take(self.topic, level, exclude, count)]
+        missing = missing_levels(levels, questions)
+        if missing:
+            exclude = exclude.plus(q['question_text'] for q in questions)
+            generated = generate_quiz_batch(self.topic, len(missing), missing, exclude, seen_index=self.seen_index,
+                                            on_event=None if questions else on_event, extras=self.extras(missing[0]))
+            if self.bank:
+                store_batch(self.bank, self.topic, generated)
+            questions += generated
+        with self.lock:
+            questions = [q for q in questions if q['question_text'] not in self.queued_texts]
+            self.queued_texts.update(q['question_text'] for q in questions)
+        for q in questions:
+            self.seen_index.add(q['question_text'], q['choices'])
+        # whatever the batch couldn't produce falls back to the one-at-a-time path
+        for level in missing_levels(levels, questions):
+            more = self._generate([level])
+            if not more:
+                break
+            questions += more
+        return questions
+
+    def _generate(self, levels, on_event=None):
+        difficulty = levels[0]
+        with self.lock:
+            exclude = self.seen_questions.plus(self.queued_texts)
+        cached = self.bank.take(self.topic, difficulty, exclude) if self.bank else []
+        if cached:
+            with self.lock:
+                # another worker may have pulled the same stored question a moment ago
+                if cached[0]['question_text'] not in self.queued_texts:
+                    self.queued_texts.add(cached[0]['question_text'])
+                    self.seen_index.add(cached[0]['question_text'], cached[0]['choices'])
+                    return cached
+                exclude = self.seen_questions.plus(self.queued_texts)
+        extras = self.extras(difficulty)
+        question_data = deduplicate_question(self.topic, exclude, difficulty, self.seen_index, on_event, extras)
+        if question_data is None:
+            return []
+        if self.bank and is_valid_question(question_data):
+            self.bank.add(self.topic, difficulty, [question_data])
+        with self.lock:
+            # two workers can land on the same question at once, so try one more time if we lost that race
+            if question_data['question_text'] in self.queued_texts:
+                exclude = self.seen_questions.plus(self.queued_texts)
+            else:
+                exclude = None
+            self.queued_texts.add(question_data['question_text'])
+        if exclude is not None:
+            question_data = (deduplicate_question(self.topic, exclude, difficulty, self.seen_index, extras=extras)
+                             or question_data)
+            with self.lock:
+                self.queued_texts.add(question_data['question_text'])
+        self.seen_index.add(question_data['question_text'], question_data['choices'])
+        return [question_data]
+
+    def _finished(self, future):
+        if self.on_ready and not future.cancelled() and not self.closed:
+            self.on_ready()
+
+    def has_ready(self, difficulty=None):
+        difficulty = difficulty or self.difficulty
+        with self.lock:
+            if self.ready.get(difficulty):
+                return True
+            index = self._first_pending(difficulty)
+            return index is not None and self.pending[index][0].done()
+
+    def ready_count(self, difficulty=None):
+        difficulty = difficulty or self.difficulty
+        with self.lock:
+            count = len(self.ready.get(difficulty, ()))
+            for future, levels in self.pending:
+                if difficulty not in levels:
+                    continue
+                if not future.done():
+                    break
+                count += levels.count(difficulty)
+            return count
+
+    def get(self, timeout=None, difficulty=None):
+        # hands back the oldest question at difficulty, waiting on it only if it isn't done yet
+        difficulty = difficulty or self.difficulty
+        with self.lock:
+            if self.ready.get(difficulty):
+                return self.ready[difficulty].pop(0)
+        self.fill(1, difficulty)
+        future, _ = self._pop_pending(difficulty)
+        questions = future.result(timeout=timeout)
+        return self._take_first(questions, difficulty)
+
+    async def get_async(self, difficulty=None):
+        # get() for a caller on an event loop (the gui): the wait doesn't hold up the loop's thread, and if the
+        # caller is cancelled the job goes back to the front of the queue for whoever asks next
+        difficulty = difficulty or self.difficulty
+        with self.lock:
+            if self.ready.get(difficulty):
+                return self.ready[difficulty].pop(0)
+        self.fill(1, difficulty)
+        job = self._pop_pending(difficulty)
+        if job[0].done():
+            return self._take_first(job[0].result(), difficulty)
+        try:
+            # shielded, or cancelling the wait would cancel a job that hasn't started yet
+            questions = await asyncio.shield(asyncio.wrap_future(job[0]))
+        except asyncio.CancelledError:
+            with self.lock:
+                if not self.closed:
+                    self.pending.insert(0, job)
+            raise
+        return self._take_first(questions, difficulty)
+
+    def _pop_pending(self, difficulty):
+        with self.lock:
+            index = self._first_pending(difficulty)
+            if index is None:
+                # fill() queues nothing once shutdown() has run
+                raise PrefetcherClosedError("asked for a question after the prefetcher was shut down")
+            return self.pending.pop(index)
+
+    def _take_first(self, questions, difficulty):
+        if not questions:
+            return None  # the model is unavailable right now
+        # the first question at difficulty; the rest wait in ready at their own levels
+        first = next((q for q in questions if q['difficulty'] == difficulty), questions[0])
+        with self.lock:
+            for q in questions:
+                if q is not first:
+                    self.ready.setdefault(q['difficulty'], []).append(q)
+        return first
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            for future, _ in self.pending:
+                future.cancel()
+            self.pending = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# a whole-quiz request never asks for more than this many questions; long sessions get a batch at a time
+MAX_BATCH = 10
+# near-duplicate checks look back this many questions (exact repeats are caught all the way back)
+SEEN_INDEX_SIZE = 500
 
 
 # this class keeps track of the quiz progress, score, hints, and all that jazz
 class QuizSession:
-    def __init__(self, topic, difficulty="easy"):
+    # topics = more topics to interleave with topic (a long practice session); topic then holds the topic of
+    # the question being asked and upcoming_topic the one of the question after it
+    # review = bring back questions the student missed, spaced out (see scheduler.py)
+    def __init__(self, topic, difficulty="easy", prefetch=0, on_question_ready=None, batch=False, bank=None,
+                 on_question_partial=None, event_log=None, session_id=None, adaptive=True, topics=None,
+                 max_questions=5, review=True, speculate=None, token_budget=None):
         self.topic = topic
-        self.difficulty = difficulty
-        self.score = 0
-        self.total_questions = 0
-        self.seen_questions = set()
-        self.max_questions = 5
+        self.topics = [topic] + [t for t in (topics or []) if t != topic]
+        self.difficulty = normalize_difficulty(difficulty)  # where the student asked to start
+        # adaptive = pick each question's difficulty from how the student has been doing (see mastery.py);
+        # otherwise every question is at difficulty
+        self.adaptive = adaptive
+        self.mastery = Mastery(self.difficulty)
+        self.scheduler = SessionScheduler(self.topics, review=review)
+        # when to ask for hints up front (see SPECULATE); None = the module-wide setting
+        self.speculate = speculate or SPECULATE
+        # every model call made for this session is charged here (see prompts.TokenBudget); None = TOKEN_BUDGET
+        self.budget = prompts.TokenBudget(token_budget or TOKEN_BUDGET)
+        self.upcoming_topic = topic
+        self.upcoming_review = None  # (topic, Question) when the next question is a review
+        self.planned = False
+        # accuracy, first tries, hints and answer times per topic and difficulty (see scoring.py)
+        self.scorecard = Scorecard()
+        self.total_questions = 0  # questions served, answered or not
+        self.max_questions = max_questions
+        self.seen_questions = SeenQuestions(capacity=max(64, max_questions))
+        self.seen_index = NearDuplicateIndex(max_entries=SEEN_INDEX_SIZE)
         self.current_question_number = 1
-        self.wrong_attempts = 0
-        self.correct_count = 0
+        self.wrong_attempts = 0  # wrong tries on the current question, reset when the next one is served
+        self.attempts = []  # every Attempt, in order
+        self.current_question = None  # a question_format.Question
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        # event_log = a session_log.SessionEventLog; when set, questions, answers and hints get logged to it
+        self.event_log = event_log
+        self._log(SESSION_STARTED, [topic, self.difficulty, self.max_questions, self.topics])
+        # prefetch = how many questions to keep generating ahead of the student (0 = old blocking behavior)
+        # batch = ask for the whole quiz in one model call instead of one call per question
+        self.batch = batch
+        self.batch_queues = {}  # (topic, difficulty) -> questions left over from a whole-quiz request
+        # bank = a question_bank.QuestionBank, checked for stored questions before we call the model
+        self.bank = bank
+        self.prefetch = prefetch
+        self.on_question_ready = on_question_ready
+        self.on_question_partial = on_question_partial
+        self.prefetchers = {}  # topic -> QuestionPrefetcher
+        self.prefetch_depth = min(self.max_questions, MAX_BATCH) if batch else prefetch
+        if prefetch > 0:
+            # in batch mode the prefetcher grabs everything that's left in one go; an adaptive session gets a
+            # third worker so a question at a new level doesn't queue behind two still going at the old one
+            for t in self.topics:
+                self.prefetchers[t] = QuestionPrefetcher(t, self.difficulty, self.seen_questions,
+                                                         depth=self.prefetch_depth, workers=3 if adaptive else 2,
+                                                         on_ready=on_question_ready,
+                                                         batch_size=self.prefetch_depth if batch else 1, bank=bank,
+                                                         seen_index=self.seen_index, on_partial=on_question_partial,
+                                                         extras=partial(self.wants_extras, t), budget=self.budget,
+                                                         mix=partial(self.batch_levels, t))
+            self.fill_ahead(self.questions_remaining())
+
+    @property
+    def prefetcher(self):
+        # the prefetcher for the topic the next question is on
+        return self.prefetchers.get(self.upcoming_topic)
+
+    def plan(self):
+        # settles what the next question is (a review that's due, or a new one on the topic whose turn it is);
+        # stays put until that question is served
+        if not self.planned:
+            self.upcoming_review, self.upcoming_topic = self.upcoming()
+            self.planned = True
+        return self.upcoming_review
+
+    def upcoming(self):
+        # (review or None, topic) that plan() settles on, without settling it, for reads that mustn't change
+        # what comes next (the server's GET /sessions/<id>)
+        if self.planned:
+            return self.upcoming_review, self.upcoming_topic
+        review = self.scheduler.due()
+        return review, review[0] if review else self.scheduler.next_topic()
+
+    def wants_extras(self, topic, difficulty):
+        # whether questions on topic at difficulty should come with their hint and why-wrong lines
+        chance = expected(self.mastery.ability(topic), normalize_difficulty(difficulty)) if self.adaptive else None
+        return should_speculate(self.speculate, difficulty, chance)
+
+    def questions_remaining(self):
+        return self.max_questions - self.current_question_number + 1
+
+    def next_difficulty(self, topic=None):
+        # the level the next question should be at
+        self.plan()
+        if not self.adaptive:
+            return self.difficulty
+        return self.mastery.level_for(topic or self.upcoming_topic)
+
+    def peek_difficulty(self):
+        # next_difficulty() without planning the next question
+        return self.mastery.level_for(self.upcoming()[1]) if self.adaptive else self.difficulty
+
+    def batch_levels(self, topic, difficulty, count):
+        # the level of each question in a batch of count asked for at difficulty: in an adaptive session one
+        # goes to each level a single answer can move the student to, so the batch still fits if they do
+        if not self.adaptive or count < 3:
+            return [difficulty] * count
+        index = LEVELS.index(difficulty)
+        around = [LEVELS[i] for i in (index - 1, index + 1) if 0 <= i < len(LEVELS)]
+        return [difficulty] * (count - len(around)) + around
+
+    def fill_ahead(self, limit):
+        self.plan()
+        for topic, prefetcher in self.prefetchers.items():
+            prefetcher.fill(limit, self.next_difficulty(topic))
+
+    def question_ready(self):
+        # true when next_question() will come back right away
+        if not self.prefetchers or self.plan():
+            return True
+        self.fill_ahead(self.questions_remaining())
+        return self.prefetcher.has_ready(self.next_difficulty())
 
     def next_question(self):
-        question_data = deduplicate_question(self.topic, self.seen_questions, self.difficulty)
+        with prompts.charging(self.budget):
+            return self._next_question()
+
+    def _next_question(self):
+        review = self.plan()
+        if review:
+            return self.serve_question(review[1])
+        difficulty = self.next_difficulty()
+        if self.prefetcher:
+            question_data = self.prefetcher.get(difficulty=difficulty)
+        else:
+            question_data = self._fetch_question(difficulty)
+        return self._serve_fetched(question_data)
+
+    # next_question for a caller on an event loop (the gui): the wait on a prefetch worker or the model happens
+    # off the loop's thread, and a caller cancelled while waiting leaves the session as it was
+    async def next_question_async(self):
+        with prompts.charging(self.budget):
+            review = self.plan()
+            if review:
+                return self.serve_question(review[1])
+            difficulty = self.next_difficulty()
+            if self.prefetcher:
+                question_data = await self.prefetcher.get_async(difficulty=difficulty)
+            else:
+                question_data = await asyncio.to_thread(self._fetch_question, difficulty)
+            return self._serve_fetched(question_data)
+
+    # the next question when nothing is prefetching: the bank, this session's batch, or one from the model
+    def _fetch_question(self, difficulty):
+        if self.bank:
+            cached = self.bank.take(self.upcoming_topic, difficulty, self.seen_questions)
+            if cached:
+                return cached[0]
+        if not self.batch:
+            return self.generate_and_store(difficulty)
+        # the batch has a question or so at the levels around difficulty too (see batch_levels); a new one is
+        # only asked for once there's nothing left at the level the student is at
+        topic = self.upcoming_topic
+        if not self.batch_queues.get((topic, difficulty)):
+            count = min(self.questions_remaining(), MAX_BATCH)
+            batch = generate_quiz_batch(topic, count, self.batch_levels(topic, difficulty, count), self.seen_questions,
+                                        seen_index=self.seen_index, extras=self.wants_extras(topic, difficulty))
+            if self.bank:
+                store_batch(self.bank, topic, batch)
+            for question_data in batch:
+                self.batch_queues.setdefault((topic, question_data['difficulty']), []).append(question_data)
+        queue = self.batch_queues.get((topic, difficulty))
+        return queue.pop(0) if queue else self.generate_and_store(difficulty)
+
+    def _serve_fetched(self, question_data):
         if not question_data:
             return None  # no more fresh questions from Gemini
+        question = self.serve_question(question_data)
+        if self.prefetchers:
+            # keep generating ahead, but not past the end of the quiz
+            # (after a failure we wait for the next question_ready() instead of retrying straight away)
+            self.fill_ahead(self.questions_remaining())
+        return question
 
-        self.current_question_text = question_data['question_text']
-        self.correct_letter = question_data['answer_letter']
-        self.explanation = question_data['explanation']
+    # makes question_data (a Question or a question dict) the current question, wherever it came from
+    # (the server hands out questions itself); returns it as a Question
+    def serve_question(self, question_data, at=None):
+        question = question_data if isinstance(question_data, Question) else Question.from_dict(question_data)
+        self.current_question = question
+        self.wrong_attempts = 0
         self.current_question_number += 1
         self.total_questions += 1
+        self.plan()
+        self.topic = self.upcoming_topic
+        self.scheduler.served(question)
+        self.scorecard.served(self.topic, normalize_difficulty(question.difficulty), at)
+        self.planned = False
+        self._log(QUESTION_SERVED, [question.question, question.choices, question.answer_letter,
+                                    question.explanation, question.difficulty, self.topic])
+        if not question.hint and not MOCK_MODE and self.wants_extras(self.topic, question.difficulty):
+            # came without its hint (the bank, a shared pool); have it in the cache before the student asks
+            with prompts.charging(self.budget):
+                warm_hint(question)
+        return question
+
+    @property
+    def current_question_text(self):
+        return self.current_question.question if self.current_question else None
+
+    @property
+    def current_choices(self):
+        return list(self.current_question.choices) if self.current_question else []
+
+    @property
+    def correct_letter(self):
+        return self.current_question.answer_letter if self.current_question else None
+
+    @property
+    def explanation(self):
+        return self.current_question.explanation if self.current_question else ""
+
+    @property
+    def score(self):
+        # questions answered correctly (on any try)
+        return self.scorecard.correct
+
+    @property
+    def correct_count(self):
+        return self.scorecard.correct
+
+    @property
+    def answered_count(self):
+        # questions with at least one answer; one that was skipped doesn't count against the score
+        return self.scorecard.answered_count
+
+    def tries_left(self):
+        return self.scorecard.tries_left()
+
+    def _log(self, code, payload):
+        if self.event_log is not None:
+            self.event_log.append(self.session_id, code, payload)
+
+    def generate_and_store(self, difficulty=None):
+        difficulty = difficulty or self.next_difficulty()
+        question_data = deduplicate_question(self.upcoming_topic, self.seen_questions, difficulty, self.seen_index,
+                                             extras=self.wants_extras(self.upcoming_topic, difficulty))
+        if self.bank and question_data and is_valid_question(question_data):
+            self.bank.add(self.upcoming_topic, difficulty, [question_data])
         return question_data
 
-    def submit_answer(self, user_answer, correct_letter):
-        is_correct = evaluate_answer(user_answer, correct_letter)
+    # updates the score for one answer without writing feedback (also how a logged session gets replayed)
+    def record_answer(self, user_answer, correct_letter=None, at=None):
+        is_correct = evaluate_answer(user_answer, correct_letter or self.correct_letter)
+        number = self.current_question_number - 1
+        if not self.attempts or self.attempts[-1].question_number != number:
+            # only the first try at a question says how well the student knows it
+            self.mastery.update(self.topic, self.current_question.difficulty, is_correct)
+            self.scheduler.answered(self.topic, self.current_question, is_correct)
         self.seen_questions.add(self.current_question_text)
-        # note: we only bump total_questions when we load a new question, not here
-        if is_correct:
-            self.score += 1
-            self.correct_count += 1
-        else:
+        self.seen_index.add(self.current_question_text, self.current_choices)
+        if not is_correct:
             self.wrong_attempts += 1
-        feedback = generate_feedback(user_answer, correct_letter, self.explanation, self.difficulty)
-        return is_correct, feedback
+        attempt = Attempt(number, user_answer.strip().upper(), is_correct, time.time() if at is None else at)
+        self.attempts.append(attempt)
+        self.scorecard.answered(is_correct, attempt.at)
+        return attempt
+
+    def submit_answer(self, user_answer, correct_letter):
+        attempt = self.record_answer(user_answer, correct_letter)
+        self._log(ANSWER_SUBMITTED, [attempt.question_number, attempt.letter, attempt.correct])
+        if self.prefetchers and self.adaptive:
+            # the answer may have moved the student to another level; start on it while they read the feedback
+            self.fill_ahead(self.questions_remaining())
+        feedback = generate_feedback(user_answer, correct_letter, self.explanation, self.current_question.difficulty,
+                                     self.current_question.why_not(user_answer.strip().upper()))
+        return attempt.correct, feedback
 
     def get_score_message(self):
-        return generate_final_score_message(self.score, self.total_questions)
+        return generate_final_score_message(self.score, self.answered_count)
 
     def is_finished(self):
         return self.current_question_number > self.max_questions
 
+    def hint_requested(self):
+        self.scorecard.hinted()
+        self._log(HINT_REQUESTED, [self.current_question_number - 1])
+
+    def ready_hint(self):
+        # the hint that came with the question, if it did
+        hint = self.current_question.hint if self.current_question else ""
+        if hint:
+            telemetry.count("speculative_hints")
+        return hint
+
     def get_hint(self):
-        return generate_hint(self.explanation)
+        self.hint_requested()
+        with prompts.charging(self.budget):
+            return self.ready_hint() or generate_hint(self.current_question)
+
+    async def get_hint_async(self):
+        self.hint_requested()
+        with prompts.charging(self.budget):
+            return self.ready_hint() or await generate_hint_async(self.current_question)
+
+    def stream_hint(self):
+        self.hint_requested()
+        hint = self.ready_hint()
+        return iter([hint]) if hint else self._charged(stream_hint(self.current_question))
+
+    def stream_hint_async(self):
+        self.hint_requested()
+        hint = self.ready_hint()
+        return ready_stream(hint) if hint else self._charged_async(stream_hint_async(self.current_question))
+
+    # streams run after the method that made them has returned, so they take the budget along themselves
+    def _charged(self, chunks):
+        with prompts.charging(self.budget):
+            yield from chunks
+
+    async def _charged_async(self, chunks):
+        with prompts.charging(self.budget):
+            async for chunk in chunks:
+                yield chunk
+
+    @property
+    def last_wrong_letter(self):
+        # the student's latest answer to the current question, if it was wrong
+        number = self.current_question_number - 1
+        if self.attempts and self.attempts[-1].question_number == number and not self.attempts[-1].correct:
+            return self.attempts[-1].letter
+        return None
+
+    # a question the student typed about the current quiz question
+    def follow_up(self, prompt):
+        with prompts.charging(self.budget):
+            return follow_up_response(prompt, self.wrong_attempts, self.current_question, self.last_wrong_letter)
+
+    async def follow_up_async(self, prompt):
+        with prompts.charging(self.budget):
+            return await follow_up_response_async(prompt, self.wrong_attempts, self.current_question,
+                                                  self.last_wrong_letter)
+
+    def stream_follow_up_async(self, prompt):
+        return self._charged_async(stream_follow_up_async(prompt, self.wrong_attempts, self.current_question,
+                                                          self.last_wrong_letter))
 
     def score_percentage(self):
-        if self.total_questions == 0:
-            return 0
-        return (self.correct_count / self.total_questions) * 100  # just a simple percentage calculation
\ No newline at end of file
+        return self.scorecard.percentage()
+
+    # plain-data snapshot of the quiz so far, small enough to keep in a session store (see quiz_server.py)
+    def to_state(self):
+        question = self.current_question
+        return {
+            'session_id': self.session_id,
+            'topic': self.topic,
+            'difficulty': self.difficulty,
+            'scorecard': self.scorecard.to_state(),
+            'total_questions': self.total_questions,
+            'wrong_attempts': self.wrong_attempts,
+            'max_questions': self.max_questions,
+            'current_question_number': self.current_question_number,
+            'seen_questions': self.seen_questions.to_state(),
+            'current_question': question.to_list() if question else None,
+            'attempts': [[a.question_number, a.letter, a.correct, a.at] for a in self.attempts],
+            'adaptive': self.adaptive,
+            'speculate': self.speculate,
+            'mastery': self.mastery.to_state(),
+            'scheduler': self.scheduler.to_state(),
+            'budget': self.budget.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state, event_log=None, **kwargs):
+        session = cls(state['topic'], state['difficulty'], session_id=state['session_id'],
+                      adaptive=state.get('adaptive', True), max_questions=state['max_questions'],
+                      speculate=state.get('speculate'), **kwargs)
+        # attached after construction so loading a session doesn't log it as a new one
+        session.event_log = event_log
+        if 'scorecard' in state:
+            session.scorecard = Scorecard.from_state(state['scorecard'])
+        session.total_questions = state['total_questions']
+        session.wrong_attempts = state['wrong_attempts']
+        session.current_question_number = state['current_question_number']
+        session.seen_questions = SeenQuestions.from_state(state['seen_questions'])
+        for text in session.seen_questions.recent():
+            session.seen_index.add(text)
+        if state['current_question']:
+            session.current_question = Question.from_list(state['current_question'])
+        session.attempts = [Attempt(*a) for a in state['attempts']]
+        session.mastery.load_state(state.get('mastery', {}))
+        if 'scheduler' in state:
+            session.scheduler.load_state(state['scheduler'])
+            session.topics = session.scheduler.topics
+        if 'budget' in state:
+            session.budget.load_state(state['budget'])
+        return session
+
+    def close(self):
+        for prefetcher in self.prefetchers.values():
+            prefetcher.shutdown()